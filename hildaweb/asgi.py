@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hildaweb.settings')
+# Pod ASGI serverem obsluhují čtecí stránky asynchronní view (movies.async_urls)
+os.environ.setdefault('MOVIES_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -0,0 +1,128 @@
+""" Obsluha statických souborů a médií v produkčním režimu (HILDAWEB_PRODUCTION=1).
+    Data souborů pokud možno posílá webový server: podle SENDFILE_BACKEND odpověď nese jen hlavičku
+    X-Sendfile (Apache, lighttpd) nebo X-Accel-Redirect (nginx) a Python soubor vůbec nečte.
+    Bez webového serveru se soubor posílá přes FileResponse (WSGI server ho může odeslat
+    systémovým voláním sendfile) včetně podpory dotazů Range pro přehrávání velkých videí.
+    Statické soubory s otiskem v názvu se cachují natrvalo (immutable), předkomprimované
+    varianty .br a .gz se posílají podle hlavičky Accept-Encoding. """
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+# Název s otiskem obsahu od ManifestStaticFilesStorage, např. styles.55e7cbb9ba48.css
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class FileRange:
+    """ Část otevřeného souboru od pozice start o délce length. Metoda fileno() zůstává
+        dostupná, WSGI server tak může úsek odeslat přes sendfile od aktuální pozice souboru. """
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.name = file.name
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """ Jeden rozsah z hlavičky Range jako (start, délka); None, pokud hlavička chybí nebo jí nelze vyhovět """
+    match = RANGE.match(header or '')
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':
+        # poslední N bajtů
+        length = min(int(end), size)
+        return size - length, length
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end:
+        return None
+    return start, end - start + 1
+
+
+def send_file(request, root, url_path, path, cache_control):
+    try:
+        full_path = safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404('Soubor nenalezen')
+    if not os.path.isfile(full_path):
+        raise Http404('Soubor nenalezen')
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    # předkomprimovaná varianta podle Accept-Encoding (jen pro soubory, které ji mají)
+    content_encoding = None
+    accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    for name, suffix in ENCODINGS:
+        if name in accepted and os.path.isfile(full_path + suffix):
+            full_path, url_path, content_encoding = full_path + suffix, url_path + suffix, name
+            break
+    has_variants = content_encoding or any(os.path.isfile(full_path + suffix) for name, suffix in ENCODINGS)
+
+    stat = os.stat(full_path)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime, stat.st_size):
+        response = HttpResponseNotModified()
+    elif settings.SENDFILE_BACKEND == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+    elif settings.SENDFILE_BACKEND == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.SENDFILE_ACCEL_PREFIX + url_path
+    else:
+        file = open(full_path, 'rb')
+        byte_range = None if content_encoding else parse_range(request.META.get('HTTP_RANGE'), stat.st_size)
+        if byte_range is None:
+            response = FileResponse(file, content_type=content_type)
+        else:
+            start, length = byte_range
+            response = FileResponse(FileRange(file, start, length), status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{start + length - 1}/{stat.st_size}'
+            response['Content-Length'] = length
+        response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if content_encoding:
+        response['Content-Encoding'] = content_encoding
+    if has_variants:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    patch_cache_control(response, **cache_control)
+    return response
+
+
+def serve_static(request, path):
+    """ Statické soubory ze STATIC_ROOT (po collectstatic) """
+    if HASHED_NAME.search(path):
+        cache_control = {'public': True, 'max_age': 365 * 24 * 3600, 'immutable': True}
+    else:
+        cache_control = {'public': True, 'max_age': 3600}
+    return send_file(request, settings.STATIC_ROOT, settings.STATIC_URL + path, path, cache_control)
+
+
+def serve_media(request, path):
+    """ Uploadované plakáty a přílohy z MEDIA_ROOT """
+    cache_control = {'public': True, 'max_age': getattr(settings, 'MEDIA_MAX_AGE', 24 * 3600)}
+    return send_file(request, settings.MEDIA_ROOT, settings.MEDIA_URL + path, path, cache_control)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -45,8 +46,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Měření SQL dotazů a času požadavků, zapíná se nastavením MOVIES_REQUEST_PROFILING
+    'movies.profiling.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    # Čtení čtecích stránek z repliky databáze, používá se jen při nastavených MOVIES_READ_REPLICAS
+    'movies.routers.ReplicaRoutingMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -58,7 +63,8 @@ ROOT_URLCONF = 'hildaweb.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, který navíc měří čas vykreslení šablon (movies.profiling)
+        'BACKEND': 'movies.profiling.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -79,11 +85,30 @@ WSGI_APPLICATION = 'hildaweb.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
 
+# Trvalá připojení: připojení se po požadavku nezavírá a použije se znovu, nejvýše CONN_MAX_AGE sekund
+# (0 - zavírá se po každém požadavku); před požadavkem se ověří, že stále funguje (MOVIES_CONN_HEALTH_CHECKS)
+CONN_MAX_AGE = int(os.environ.get('HILDAWEB_CONN_MAX_AGE', '60'))
+MOVIES_CONN_HEALTH_CHECKS = True
+
+# Replika pro čtení (movies/routers.py). Lokálně ji může zastoupit druhý soubor SQLite
+# (kopie db.sqlite3): HILDAWEB_REPLICA_DB=db-replica.sqlite3. V testech replika ukazuje na testovací
+# hlavní databázi (MIRROR), bez HILDAWEB_REPLICA_DB se z ní nečte.
+REPLICA_DB = os.environ.get('HILDAWEB_REPLICA_DB', '')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / (REPLICA_DB or 'db.sqlite3'),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
 
 
     #'default': {
@@ -99,6 +124,44 @@ DATABASES = {
     # }
 }
 
+DATABASE_ROUTERS = ['movies.routers.ReadReplicaRouter']
+
+# Repliky, ze kterých čtou čtecí stránky (MOVIES_REPLICA_VIEWS - názvy URL); zapisuje se vždy do 'default'
+MOVIES_READ_REPLICAS = ['replica'] if REPLICA_DB else []
+MOVIES_REPLICA_VIEWS = [
+    'index', 'films', 'film-genre', 'film-browse', 'film-search', 'film-detail',
+    'api-film-list', 'api-film-detail', 'api-genre-list',
+]
+# Jak dlouho (s) po odeslání formuláře čte session z hlavní databáze (replika mezitím dožene zápisy)
+MOVIES_REPLICA_PIN_SECONDS = 5
+
+# Nastavení SQLite pro každé připojení (movies.signals.tune_sqlite_connection):
+# žurnál WAL (čtení neblokuje zápis), synchronous=NORMAL (bezpečné s WAL) a 256 MB mmap.
+# Režim WAL se zapisuje přímo do souboru databáze, proto se zapíná jen při nasazení
+# (HILDAWEB_SQLITE_TUNING=1) - vývojové příkazy tak nemění db.sqlite3 v repozitáři
+MOVIES_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+} if os.environ.get('HILDAWEB_SQLITE_TUNING') == '1' else {}
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+# Výchozí je cache v paměti procesu (LocMemCache) - každý proces má vlastní, takže změny cache
+# provedené workerem fronty úloh (žurnál faset, generace katalogu) webové procesy nevidí.
+# Pro worker a pro více webových procesů je nutná sdílená cache, např. Memcached nebo Redis
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'hildaweb',
+    }
+}
+
+# Cache, kterou používá aplikace movies (menu žánrů, počty filmů)
+MOVIES_CACHE_ALIAS = 'default'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
@@ -136,12 +199,92 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/3.1/howto/static-files/
 STATIC_URL = '/static/'
-STATIC_ROOT = os.path.join(BASE_DIR, 'static')
+# Cíl příkazu collectstatic
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 # Umístění uploadovaných souborů
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Produkční obsluha statických souborů a médií (hildaweb/storage.py, hildaweb/serving.py):
+# názvy s otiskem obsahu, předkomprimované varianty .gz/.br a trvalé cachování
+PRODUCTION_FILES = os.environ.get('HILDAWEB_PRODUCTION') == '1'
+if PRODUCTION_FILES:
+    STATICFILES_STORAGE = 'hildaweb.storage.CompressedManifestStaticFilesStorage'
+
+# Předání odesílání souborů webovému serveru: '' (posílá Django), 'x-sendfile' (Apache, lighttpd)
+# nebo 'x-accel-redirect' (nginx - interní location SENDFILE_ACCEL_PREFIX + /static/ a /media/)
+SENDFILE_BACKEND = os.environ.get('HILDAWEB_SENDFILE', '')
+SENDFILE_ACCEL_PREFIX = '/internal'
+# Doba cachování médií v prohlížeči (s)
+MEDIA_MAX_AGE = 24 * 3600
+
 LOGIN_REDIRECT_URL = '/'
 
+# Stránkování výpisů filmů pomocí kurzoru místo čísla stránky (rychlé i pro vzdálené stránky)
+MOVIES_KEYSET_PAGINATION = False
+
+# Počet filmů v předpočítaných žebříčcích nejlépe hodnocených filmů
+MOVIES_LEADERBOARD_SIZE = 10
+
+# Počet předpočítaných podobných filmů na detailu filmu (movies/similarity.py)
+MOVIES_SIMILAR_FILMS = 6
+# Slovník TF-IDF podobných filmů se sestaví znovu, když se počet filmů změní o víc než tento podíl
+MOVIES_SIMILARITY_REFIT_RATIO = 0.1
+
+# Hlasy uživatelů se do hodnocení filmů započítávají dávkově nejvýše jednou za tolik sekund (movies/ratings.py)
+MOVIES_RATING_FLUSH_INTERVAL = 5
+
+# Běží testy (python manage.py test)
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
+# Fronta úloh na pozadí (movies/jobs.py) - úlohy provádí worker: python manage.py run_worker.
+# Jen v testech se úlohy provádějí hned v požadavku (lze vynutit MOVIES_JOBS_EAGER=1)
+MOVIES_JOBS_EAGER = os.environ.get('MOVIES_JOBS_EAGER', '1' if TESTING else '0') == '1'
+MOVIES_JOBS_MAX_ATTEMPTS = 5
+MOVIES_JOBS_RETRY_DELAY = 10
+
+# Jak dlouho (s) smí sdílená cache (reverse proxy) vydávat detail filmu nepřihlášeným bez ověření ETagu
+MOVIES_DETAIL_SHARED_MAX_AGE = 60
+
+# Asynchronní čtecí stránky; zapíná je hildaweb/asgi.py při běhu pod ASGI serverem
+MOVIES_ASYNC_VIEWS = os.environ.get('MOVIES_ASYNC_VIEWS') == '1'
+
+# Měření požadavků: hlavička Server-Timing a log pomalých požadavků (slow_requests.log)
+MOVIES_REQUEST_PROFILING = os.environ.get('MOVIES_REQUEST_PROFILING') == '1'
+MOVIES_SLOW_REQUEST_MS = 500
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json_lines': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+        'slow_requests': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': os.path.join(BASE_DIR, 'slow_requests.log'),
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+            'encoding': 'utf-8',
+            'formatter': 'json_lines',
+        },
+    },
+    'loggers': {
+        'movies.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'movies.jobs': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
+}
+
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
\ No newline at end of file
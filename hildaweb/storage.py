@@ -0,0 +1,41 @@
+""" Úložiště statických souborů pro produkční režim (HILDAWEB_PRODUCTION=1).
+    collectstatic uloží soubory pod názvy s otiskem obsahu (styles.55e7cbb9ba48.css), takže je lze
+    cachovat natrvalo, a k textovým souborům připraví i komprimované varianty .gz a .br, které
+    webový server (gzip_static / brotli_static) nebo hildaweb.serving posílá bez komprese za běhu. """
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # varianty .br se vytvoří jen s nainstalovaným balíkem brotli
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.txt', '.html', '.json', '.xml', '.ico', '.eot', '.ttf')
+
+
+def compress(path):
+    """ Vytvoří vedle souboru jeho variantu .gz (a .br), pokud je komprese znatelně menší """
+    with open(path, 'rb') as stream:
+        data = stream.read()
+    variants = [('.gz', gzip.compress(data, 9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data)))
+    created = []
+    for suffix, compressed in variants:
+        if len(compressed) < len(data) * 0.95:
+            with open(path + suffix, 'wb') as stream:
+                stream.write(compressed)
+            created.append(path + suffix)
+    return created
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE) and self.exists(name):
+                compress(self.path(name))
@@ -1,47 +1,86 @@
 from django.contrib import admin
 
 # Import všech modelů, které obsahuje models.py
-from django.db.models import Count
 from django.utils.html import format_html
 
 from .models import *
 
 # Registrace modelů v administraci aplikace
+# Výpisy používají jen předem načtená data (list_select_related, denormalizované počty),
+# počet SQL dotazů stránky tak nezávisí na počtu záznamů. Celkový počet záznamů
+# se při filtrování nezjišťuje (show_full_result_count = False).
 @admin.register(Genre)
 class GenreAdmin(admin.ModelAdmin):
-    list_display = ("name", "film_count")
-
-    def get_queryset(self, request):
-        queryset = super().get_queryset(request)
-        queryset = queryset.annotate(
-            _film_count=Count("film", distinct=True),
-        )
-        return queryset
+    list_display = ("name", "slug", "film_count")
+    search_fields = ("name",)
+    prepopulated_fields = {"slug": ("name",)}
+    show_full_result_count = False
 
     def film_count(self, obj):
-        return obj._film_count
+        # Počet filmů je uložen přímo u žánru (udržují ho signály v movies/signals.py)
+        return obj.num_films
 
-    film_count.admin_order_field = "_film_count"
+    film_count.admin_order_field = "num_films"
     film_count.short_description = "Počet filmů"
 
 
 @admin.register(Film)
 class FilmAdmin(admin.ModelAdmin):
     list_display = ("title", "release_year", "rate_percent")
+    list_filter = ("genres",)
+    search_fields = ("title",)
+    show_full_result_count = False
+
+    def get_readonly_fields(self, request, obj=None):
+        # hodnocení filmu, pro který už hlasovali uživatelé, je průměrem jejich hlasů (movies/ratings.py)
+        # a další započtení hlasů by ruční změnu přepsalo - stejně jako ve FilmModelForm
+        readonly_fields = super().get_readonly_fields(request, obj)
+        if obj is not None and obj.rating_count:
+            readonly_fields = (*readonly_fields, "rate")
+        return readonly_fields
 
     def release_year(self, obj):
-        return obj.release_date.year
+        return obj.release_date.year if obj.release_date else None
 
     def rate_percent(self, obj):
+        if obj.rate is None:
+            return None
         return format_html("<b>{} %</b>", int(obj.rate * 10))
 
     rate_percent.short_description = "Hodnocení filmu"
+    rate_percent.admin_order_field = "rate"
     release_year.short_description = "Rok uvedení"
+    release_year.admin_order_field = "release_date"
 
 
 @admin.register(Attachment)
 class AttachmentAdmin(admin.ModelAdmin):
     list_display = ("title", "type", "filesize", "film_title")
+    list_filter = ("type",)
+    list_select_related = ("film",)
+    search_fields = ("title", "film__title")
+    show_full_result_count = False
+
+    def filesize(self, obj):
+        return obj.filesize
 
     def film_title(self, obj):
         return obj.film.title
+
+    filesize.admin_order_field = "size_bytes"
+    filesize.short_description = "Velikost"
+    film_title.admin_order_field = "film__title"
+    film_title.short_description = "Film"
+
+
+@admin.register(Rating)
+class RatingAdmin(admin.ModelAdmin):
+    # Hlasy se v administraci jen prohlížejí a mažou - smazaný hlas se odečte ze souhrnu filmu (signál)
+    list_display = ("film", "user", "score", "updated_at")
+    list_select_related = ("film", "user")
+    search_fields = ("film__title", "user__username")
+    readonly_fields = ("film", "user", "score")
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,149 @@
+""" JSON API pouze pro čtení - filmy a žánry.
+    Odpovědi nesou silný ETag odvozený z generace katalogu a hlavičku Last-Modified
+    s časem poslední změny katalogu. Klient tak může dotaz podmínit (If-None-Match,
+    If-Modified-Since) a při nezměněném katalogu dostane odpověď 304 bez těla;
+    databáze se v takovém případě vůbec nedotazuje. """
+import datetime
+
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
+
+from movies.caching import catalog_generation, catalog_last_modified, film_count
+from movies.models import Film, Genre
+from movies.pagination import InvalidCursor, KeysetPaginator, RATE_KEYSET, RELEASE_KEYSET
+
+# Pole filmu, která lze vybrat parametrem fields; výchozí výběr neobsahuje děj ani přílohy
+FILM_FIELDS = ('id', 'title', 'plot', 'release_date', 'runtime', 'rate', 'poster', 'genres', 'url', 'attachments')
+DEFAULT_FILM_FIELDS = ('id', 'title', 'release_date', 'runtime', 'rate', 'poster', 'genres', 'url')
+ORDERINGS = {'release': RELEASE_KEYSET, 'rate': RATE_KEYSET}
+PAGE_SIZE, MAX_PAGE_SIZE = 20, 100
+
+
+class ApiError(Exception):
+    pass
+
+
+def catalog_etag(request, *args, **kwargs):
+    return str(catalog_generation())
+
+
+def catalog_modified(request, *args, **kwargs):
+    return datetime.datetime.fromtimestamp(catalog_last_modified(), tz=timezone.utc)
+
+
+def api_view(view):
+    """ Společné chování všech pohledů API: jen GET/HEAD, podmíněné dotazy, chyby jako JSON """
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+    wrapper.__name__, wrapper.__doc__ = view.__name__, view.__doc__
+    decorated = condition(etag_func=catalog_etag, last_modified_func=catalog_modified)(wrapper)
+    decorated = cache_control(public=True, max_age=0, must_revalidate=True)(decorated)
+    return require_GET(decorated)
+
+
+def selected_fields(request, default=DEFAULT_FILM_FIELDS):
+    if 'fields' not in request.GET:
+        return default
+    fields = tuple(name.strip() for name in request.GET['fields'].split(',') if name.strip())
+    unknown = set(fields) - set(FILM_FIELDS)
+    if unknown:
+        raise ApiError(f"Neznámá pole: {', '.join(sorted(unknown))}")
+    return fields
+
+
+def film_queryset(fields):
+    """ Načte jen sloupce potřebné pro vybraná pole, vazby jedním dotazem navíc (prefetch) """
+    columns = {'id', 'title', 'plot', 'release_date', 'runtime', 'rate', 'poster'} & set(fields)
+    queryset = Film.objects.only(*columns | {'id'})
+    if 'genres' in fields:
+        queryset = queryset.prefetch_related('genres')
+    if 'attachments' in fields:
+        queryset = queryset.prefetch_related('attachment_set')
+    return queryset
+
+
+def serialize_film(request, film, fields):
+    data = {}
+    for name in fields:
+        if name == 'poster':
+            data[name] = request.build_absolute_uri(film.poster.url) if film.poster else None
+        elif name == 'genres':
+            data[name] = [genre.name for genre in film.genres.all()]
+        elif name == 'url':
+            data[name] = request.build_absolute_uri(film.get_absolute_url())
+        elif name == 'attachments':
+            data[name] = [{
+                'title': attachment.title,
+                'type': attachment.type,
+                'url': request.build_absolute_uri(attachment.file.url) if attachment.file else None,
+                'size_bytes': attachment.size_bytes,
+                'content_type': attachment.content_type,
+                'width': attachment.width,
+                'height': attachment.height,
+            } for attachment in film.attachment_set.all()]
+        else:
+            data[name] = getattr(film, name)
+    return data
+
+
+def page_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+
+@api_view
+def film_list(request):
+    """ Seznam filmů stránkovaný kurzorem.
+        Parametry: fields, genre (název žánru), ordering (release | rate), page_size, cursor. """
+    fields = selected_fields(request)
+    keyset = ORDERINGS.get(request.GET.get('ordering', 'release'))
+    if keyset is None:
+        raise ApiError(f"Neplatné řazení, povolené hodnoty: {', '.join(ORDERINGS)}")
+    try:
+        page_size = min(int(request.GET.get('page_size', PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        raise ApiError('Parametr page_size musí být celé číslo')
+    queryset = film_queryset(fields)
+    if 'genre' in request.GET:
+        genre = Genre.objects.filter(name=request.GET['genre']).first()
+        queryset = queryset.in_genre(genre) if genre else queryset.none()
+        count = film_count(genre) if genre else 0
+    else:
+        count = film_count()
+    paginator = KeysetPaginator(queryset, max(page_size, 1), keyset, count=count)
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor as e:
+        raise ApiError(str(e))
+    return JsonResponse({
+        'count': paginator.count,
+        'next': page_url(request, page.next_cursor),
+        'previous': page_url(request, page.previous_cursor),
+        'results': [serialize_film(request, film, fields) for film in page],
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+@api_view
+def film_detail(request, pk):
+    """ Údaje jednoho filmu, výchozí výběr polí obsahuje i děj a přílohy """
+    fields = selected_fields(request, default=FILM_FIELDS)
+    film = film_queryset(fields).filter(pk=pk).first()
+    if film is None:
+        return JsonResponse({'error': 'Film nenalezen'}, status=404)
+    return JsonResponse(serialize_film(request, film, fields), json_dumps_params={'ensure_ascii': False})
+
+
+@api_view
+def genre_list(request):
+    """ Seznam žánrů s počty filmů """
+    genres = [{'id': genre.pk, 'name': genre.name, 'num_films': genre.num_films}
+              for genre in Genre.objects.only('id', 'name', 'num_films')]
+    return JsonResponse({'count': len(genres), 'results': genres}, json_dumps_params={'ensure_ascii': False})
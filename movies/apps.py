@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class MoviesConfig(AppConfig):
     name = 'movies'
+
+    def ready(self):
+        # Registrace obsluhy signálů (udržování počtů filmů, invalidace cache)
+        from . import signals  # noqa: F401
@@ -0,0 +1,20 @@
+""" URL mapování pro běh pod ASGI serverem - stejné adresy jako movies.urls,
+    čtecí stránky však obsluhují asynchronní view z movies.async_views """
+from django.urls import URLPattern
+
+from . import async_views
+from .urls import urlpatterns as sync_urlpatterns
+
+ASYNC_VIEWS = {
+    'index': async_views.index,
+    'films': async_views.film_list,
+    'film-genre': async_views.film_list,
+    'film-search': async_views.film_search,
+    'film-detail': async_views.film_detail,
+}
+
+urlpatterns = [
+    URLPattern(pattern.pattern, ASYNC_VIEWS[pattern.name], pattern.default_args, pattern.name)
+    if pattern.name in ASYNC_VIEWS else pattern
+    for pattern in sync_urlpatterns
+]
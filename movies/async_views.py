@@ -0,0 +1,171 @@
+""" Asynchronní varianty čtecích stránek pro běh pod ASGI serverem (uvicorn, daphne).
+    Django 3.1 zatím nemá asynchronní ORM, proto každý dotaz běží ve vlákně s vlastním
+    připojením k databázi. Na sobě nezávislé dotazy (např. nové filmy, žebříček a menu žánrů
+    na úvodní stránce) se tak spouštějí souběžně a čekající pomalí klienti nedrží vlákno. """
+import asyncio
+
+from asgiref.sync import sync_to_async
+
+from django.core.paginator import InvalidPage, Page
+from django.db import close_old_connections
+from django.http import Http404
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from movies.caching import anonymous_page_cache, catalog_generation, film_count, genre_menu
+from movies.models import Film
+from movies.pagination import CountedPaginator
+from movies.profiling import instrument_queries
+from movies.routers import check_connections
+from movies.search import SearchResults
+from movies.forms import RatingForm
+from movies.views import (FilmListView, FilmSearchView, film_detail_etag, film_detail_last_modified,
+                          patch_film_detail_cache_control, user_rating)
+
+
+def instrumented(func, *args, **kwargs):
+    # dotazy vlákna se započítají do měření požadavku (movies.profiling)
+    with instrument_queries():
+        return func(*args, **kwargs)
+
+
+def isolated(func, *args, **kwargs):
+    # vlákno nezpracovává signál request_started, trvalé připojení se proto ověří zde
+    check_connections()
+    try:
+        return instrumented(func, *args, **kwargs)
+    finally:
+        # připojení vlákna se zavře (nebo ponechá podle CONN_MAX_AGE) stejně jako na konci požadavku
+        close_old_connections()
+
+
+def in_thread(func, *args, **kwargs):
+    """ Spustí blokující funkci (dotaz do databáze) v samostatném vlákně, aby mohla běžet souběžně s jinými """
+    return sync_to_async(isolated, thread_sensitive=False)(func, *args, **kwargs)
+
+
+def evaluate(queryset):
+    return list(queryset)
+
+
+async def render_page(request, template_name, context, menu):
+    # menu žánrů je již načtené, context processor ho převezme z požadavku
+    request._genre_menu = menu
+    return await sync_to_async(instrumented)(render, request, template_name, context)
+
+
+@anonymous_page_cache(60 * 15)
+async def index(request):
+    """ Úvodní stránka - počet filmů, nové filmy, žebříček a menu žánrů se načítají souběžně """
+    num_films, new_films, top_films, generation, menu = await asyncio.gather(
+        in_thread(film_count),
+        in_thread(evaluate, Film.objects.for_listing(plot=True)[:3]),
+        in_thread(evaluate, Film.objects.for_listing().leaderboard()[:10]),
+        in_thread(catalog_generation),
+        in_thread(genre_menu),
+    )
+    context = {
+        'num_films': num_films,
+        'new_films': new_films,
+        'top_films': top_films,
+        'catalog_generation': generation,
+    }
+    return await render_page(request, 'index.html', context, menu)
+
+
+async def film_list(request, **kwargs):
+    """ Výpis filmů (případně jednoho žánru); stránka filmů a žebříček žánru se načítají souběžně """
+    view = FilmListView()
+    view.setup(request, **kwargs)
+    genre, menu = await asyncio.gather(in_thread(view.get_genre), in_thread(genre_menu))
+    if 'genre_slug' in kwargs and genre is None:
+        return await in_thread(view.redirect_to_slug)
+
+    def paginate():
+        paginator, page, object_list, is_paginated = view.paginate_queryset(view.get_queryset(), view.paginate_by)
+        page.object_list = list(object_list)
+        return paginator, page, is_paginated
+
+    (paginator, page, is_paginated), best_films = await asyncio.gather(
+        in_thread(paginate),
+        in_thread(evaluate, Film.objects.for_listing().leaderboard(genre)[:3]) if genre else asyncio.sleep(0, []),
+    )
+    context = {
+        'view': view,
+        'paginator': paginator,
+        'page_obj': page,
+        'is_paginated': is_paginated,
+        'object_list': page.object_list,
+        'films_list': page.object_list,
+        'num_films': paginator.count,
+    }
+    if 'genre_slug' in kwargs:
+        context['best_films'] = best_films
+    context['view_title'], context['view_head'] = view.get_headings()
+    return await render_page(request, 'film/list.html', context, menu)
+
+
+def get_film(pk):
+    film = Film.objects.prefetch_related('attachment_set').filter(pk=pk).first()
+    if film is None:
+        raise Http404('Film nenalezen')
+    return film
+
+
+def detail_validators(request, pk):
+    etag, last_modified = film_detail_etag(request, pk), film_detail_last_modified(request, pk)
+    return quote_etag(etag) if etag else None, last_modified
+
+
+async def film_detail(request, pk):
+    """ Detail filmu; podmíněný dotaz se vyřídí odpovědí 304 bez vykreslení,
+        jinak se film s přílohami, podobné filmy a menu žánrů načítají souběžně """
+    etag, last_modified = await in_thread(detail_validators, request, pk)
+    response = None
+    if etag is not None:
+        response = get_conditional_response(request, etag, int(last_modified.timestamp()))
+    if response is None:
+        film, similar, menu = await asyncio.gather(
+            in_thread(get_film, pk), in_thread(evaluate, Film.objects.similar_to(pk).only('id', 'title', 'rate')),
+            in_thread(genre_menu))
+        # hlas uživatele je už načtený při výpočtu ETagu
+        rating = await sync_to_async(user_rating)(request, pk)
+        context = {'film_detail': film, 'film': film, 'object': film, 'similar_films': similar,
+                   'rating_form': RatingForm(initial={'score': rating[0] if rating else None})}
+        response = await render_page(request, 'film/detail.html', context, menu)
+        if etag is not None:
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+    return await in_thread(patch_film_detail_cache_control, request, response)
+
+
+async def film_search(request):
+    """ Výsledky vyhledávání; počet výsledků a požadovaná stránka se zjišťují souběžně """
+    results = SearchResults(request.GET.get('q', '').strip())
+    per_page = FilmSearchView.paginate_by
+    try:
+        number = int(request.GET.get('page') or 1)
+    except ValueError:
+        raise Http404('Neplatné číslo stránky')
+    start = (number - 1) * per_page
+    count, films, menu = await asyncio.gather(
+        in_thread(results.count),
+        in_thread(results.__getitem__, slice(max(start, 0), max(start, 0) + per_page)),
+        in_thread(genre_menu),
+    )
+    paginator = CountedPaginator(results, per_page, count=count)
+    try:
+        page = Page(films, paginator.validate_number(number), paginator)
+    except InvalidPage as e:
+        raise Http404(str(e))
+    context = {
+        'paginator': paginator,
+        'page_obj': page,
+        'is_paginated': paginator.num_pages > 1,
+        'object_list': films,
+        'films_list': films,
+        'q': results.query,
+        'num_films': count,
+    }
+    return await render_page(request, 'film/search.html', context, menu)
@@ -0,0 +1,5 @@
+""" Výkonnostní testy aplikace movies.
+    data      - generátor syntetického katalogu (filmy, žánry, přílohy)
+    scenarios - měřené stránky (úvod, výpisy, žánry, detail, administrace)
+    runner    - měření přes testovacího klienta Django a porovnání se základní linií
+    Spouští se příkazem ``python manage.py benchmark`` nad dočasnou testovací databází. """
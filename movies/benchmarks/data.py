@@ -0,0 +1,51 @@
+""" Generátor syntetického katalogu. Data se vkládají hromadně (bulk_create) a odvozené údaje
+    (počty filmů žánrů, žebříčky, fulltextový index, podobné filmy, fasety) se přepočítají najednou na konci. """
+import datetime
+import random
+
+from movies import catalog, facets, leaderboards, search, similarity
+from movies.models import Attachment, Film, Genre
+
+GENRES_PER_FILM = (1, 1, 2, 2, 2, 3, 4)
+WORDS = ('láska', 'válka', 'noc', 'město', 'cesta', 'tajemství', 'návrat', 'poklad', 'ostrov', 'hvězda',
+         'zločin', 'rodina', 'zima', 'řeka', 'stín', 'král', 'pomsta', 'přítel', 'dům', 'sen')
+
+
+def generate(films=1000, genres=20, attachments=2, seed=42, batch_size=1000):
+    """ Vytvoří katalog se zadaným počtem filmů, žánrů a příloh na film. Oblíbenost žánrů
+        je nerovnoměrná (Zipfovo rozdělení), takže pár žánrů obsahuje většinu filmů. """
+    rng = random.Random(seed)
+    Genre.objects.bulk_create([Genre(name=f'žánr {i:03d}', slug=f'zanr-{i:03d}') for i in range(genres)])
+    genre_ids = list(Genre.objects.order_by('pk').values_list('pk', flat=True))
+    weights = [1 / rank for rank in range(1, len(genre_ids) + 1)]
+    first_date = datetime.date(1930, 1, 1)
+    through = Film.genres.through
+    for batch in catalog.batched(range(films), batch_size):
+        last_pk = Film.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        Film.objects.bulk_create([
+            Film(title=' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).capitalize() + f' {i}',
+                 plot=' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 120))),
+                 release_date=first_date + datetime.timedelta(days=rng.randint(0, 33000)),
+                 runtime=rng.randint(70, 200), rate=round(rng.uniform(1, 10), 1))
+            for i in batch
+        ])
+        # SQLite nevrací z bulk_create primární klíče, proto se nové filmy dohledají
+        film_ids = list(Film.objects.filter(pk__gt=last_pk).values_list('pk', flat=True))
+        links = []
+        for film_id in film_ids:
+            chosen = set()
+            for _ in range(rng.choice(GENRES_PER_FILM)):
+                chosen.add(rng.choices(genre_ids, weights)[0])
+            links.extend(through(film_id=film_id, genre_id=genre_id) for genre_id in chosen)
+        through.objects.bulk_create(links)
+        Attachment.objects.bulk_create([
+            Attachment(film_id=film_id, title=f'Příloha {n + 1}', type='image', file=f'film/{film_id}/still-{n}.jpg',
+                       size_bytes=rng.randint(20000, 900000), content_type='image/jpeg', width=1280, height=720,
+                       _order=n)
+            for film_id in film_ids for n in range(attachments)
+        ])
+    Genre.objects.update_film_counts()
+    leaderboards.rebuild_all()
+    search.rebuild()
+    similarity.rebuild()
+    facets.invalidate()
@@ -0,0 +1,115 @@
+""" Měření scénářů testovacím klientem Django a porovnání výsledků se základní linií.
+    Absolutní časy se mezi stroji i běhy liší, základní linie proto ukládá i čas kalibrační
+    zátěže (calibration_ms) a časy se porovnávají v poměru k němu. Počty dotazů se porovnávají přesně. """
+import hashlib
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.test import Client
+
+from movies.caching import get_cache
+from movies.profiling import RequestProfile, current_profile, instrument_queries
+
+
+# Rozdíl časů, který se za regresi nepovažuje nikdy (šum u rychlých stránek)
+MIN_DIFFERENCE_MS = 2.0
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    index = min(int(round(p / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def measure(client, scenario, requests, warmup):
+    """ Vrátí latence (ms) a maximum počtu dotazů jednoho scénáře """
+    for n in range(warmup):
+        client.get(scenario.url(n))
+    latencies, queries = [], []
+    started = time.perf_counter()
+    for n in range(requests):
+        if scenario.cold:
+            get_cache().clear()
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            with instrument_queries():
+                response = client.get(scenario.url(warmup + n))
+        finally:
+            current_profile.reset(token)
+        if response.status_code != 200:
+            raise AssertionError(f'{scenario.name}: {scenario.url(warmup + n)} vrátil {response.status_code}')
+        latencies.append(profile.duration * 1000)
+        queries.append(profile.queries)
+    elapsed = time.perf_counter() - started
+    return {
+        'requests': requests,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(statistics.mean(latencies), 2),
+        'rps': round(requests / elapsed, 1),
+        'queries': max(queries),
+    }
+
+
+def run(scenarios, requests=50, warmup=5):
+    """ Změří všechny scénáře; každý začíná s prázdnou cache """
+    anonymous = Client()
+    admin = Client()
+    user = User.objects.filter(username='benchmark').first() or User.objects.create_superuser(
+        'benchmark', 'benchmark@example.com', 'benchmark')
+    admin.force_login(user)
+    results = {}
+    for scenario in scenarios:
+        get_cache().clear()
+        results[scenario.name] = measure(admin if scenario.login else anonymous, scenario, requests, warmup)
+    return results
+
+
+def calibrate(rounds=5):
+    """ Medián doby (ms) pevné výpočetní zátěže - měřítko rychlosti stroje pro porovnání časů """
+    durations = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        data = b''
+        for n in range(20000):
+            data = hashlib.sha256(data + str(n).encode()).digest()
+        sorted(str(n) for n in range(50000))
+        durations.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(durations), 2)
+
+
+def compare(results, baseline, tolerance=0.5, calibration=None):
+    """ Seznam regresí oproti základní linii: víc dotazů, nebo medián odezvy (p50) horší o víc
+        než tolerance (poměr). Časy základní linie se přepočtou poměrem kalibrací obou běhů;
+        medián je při několika desítkách požadavků stabilnější než p95. """
+    scale = 1.0
+    if calibration and baseline.get('calibration_ms'):
+        scale = calibration / baseline['calibration_ms']
+    regressions = []
+    for name, current in results.items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        if current['queries'] > previous['queries']:
+            regressions.append(f"{name}: dotazů {current['queries']} (základ {previous['queries']})")
+        expected = previous['p50_ms'] * scale
+        if current['p50_ms'] > max(expected * (1 + tolerance), expected + MIN_DIFFERENCE_MS):
+            regressions.append(f"{name}: p50 {current['p50_ms']} ms (základ {expected:.2f} ms po přepočtu "
+                               f"na rychlost stroje)")
+    return regressions
+
+
+def load_baseline(path):
+    with open(path, encoding='utf-8') as stream:
+        return json.load(stream)
+
+
+def save_baseline(path, results, parameters, calibration):
+    with open(path, 'w', encoding='utf-8') as stream:
+        json.dump({'parameters': parameters, 'calibration_ms': calibration, 'results': results}, stream,
+                  ensure_ascii=False, indent=2)
+        stream.write('\n')
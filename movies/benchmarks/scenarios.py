@@ -0,0 +1,38 @@
+""" Měřené scénáře. Každý scénář vrací pro pořadí požadavku adresu, takže se střídají
+    různé stránky výpisu, žánry a filmy a výsledky nezkresluje jediná stránka v cache.
+    Stránky s jedinou adresou (úvod) se měří s prázdnou cache (cold), jinak by se měřilo
+    jen vrácení uložené stránky. """
+from django.urls import reverse
+
+from movies.models import Film, Genre
+
+
+class Scenario:
+    def __init__(self, name, urls, login=False, cold=False):
+        self.name = name
+        self.urls = urls
+        self.login = login
+        self.cold = cold    # před každým požadavkem vyprázdnit cache
+
+    def url(self, n):
+        return self.urls[n % len(self.urls)]
+
+
+def default_scenarios(variants=20):
+    """ Úvodní stránka, stránkovaný výpis, stránky žánrů, fasetové procházení, detail filmu a výpisy administrace """
+    film_ids = list(Film.objects.order_by('?').values_list('pk', flat=True)[:variants])
+    genre_slugs = list(Genre.objects.order_by('-num_films').values_list('slug', flat=True)[:variants])
+    pages = max(Film.objects.count() // 3, 1)
+    return [
+        Scenario('index', [reverse('index')], cold=True),
+        Scenario('film-list', [f"{reverse('films')}?page={1 + n * pages // variants}" for n in range(variants)]),
+        Scenario('genre', [reverse('film-genre', args=[slug]) for slug in genre_slugs]),
+        Scenario('browse', [f"{reverse('film-browse')}?genre={genre_slugs[n % len(genre_slugs)]}"
+                            f"&genre={genre_slugs[(n + 1) % len(genre_slugs)]}&decade={1930 + n % 9 * 10}&rate_min=5"
+                            for n in range(variants)] if genre_slugs else [reverse('film-browse')]),
+        Scenario('film-detail', [reverse('film-detail', args=[pk]) for pk in film_ids]),
+        Scenario('admin-films', [reverse('admin:movies_film_changelist'),
+                                 f"{reverse('admin:movies_film_changelist')}?q=noc"], login=True),
+        Scenario('admin-attachments', [reverse('admin:movies_attachment_changelist')], login=True),
+        Scenario('admin-genres', [reverse('admin:movies_genre_changelist')], login=True),
+    ]
@@ -0,0 +1,169 @@
+""" Pomocné funkce pro práci s cache aplikace movies.
+    Používá se cache nastavená v MOVIES_CACHE_ALIAS (výchozí je cache 'default'). """
+import asyncio
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import patch_vary_headers
+
+from movies.routers import primary
+
+FILM_COUNT_KEY = 'movies:film-count'
+GENRE_MENU_KEY = 'movies:genre-menu'
+GENRE_MENU_VERSION_KEY = 'movies:genre-menu-version'
+CATALOG_GENERATION_KEY = 'movies:catalog-generation'
+CATALOG_MODIFIED_KEY = 'movies:catalog-modified'
+PAGE_KEY_PREFIX = 'movies:page'
+
+
+def get_cache():
+    return caches[getattr(settings, 'MOVIES_CACHE_ALIAS', 'default')]
+
+
+def film_count(genre=None):
+    """ Vrací celkový počet filmů, případně počet filmů daného žánru.
+        Počet filmů žánru je uložen přímo u žánru (Genre.num_films), celkový počet se drží v cache. """
+    if genre is not None:
+        return genre.num_films
+    from movies.models import Film
+    cache = get_cache()
+    count = cache.get(FILM_COUNT_KEY)
+    if count is None:
+        # hodnota bez expirace se načítá z hlavní databáze, ne ze zpožděné repliky
+        with primary():
+            count = Film.objects.count()
+        cache.set(FILM_COUNT_KEY, count, None)
+    return count
+
+
+def invalidate_film_count():
+    get_cache().delete(FILM_COUNT_KEY)
+
+
+def genre_menu():
+    """ Seznam žánrů pro navigaci a blok se žánry. Načítají se jen pole, která menu zobrazuje,
+        seznam se sestaví znovu až po uložení nebo smazání některého žánru. """
+    from movies.models import Genre
+    cache = get_cache()
+    genres = cache.get(GENRE_MENU_KEY)
+    if genres is None:
+        with primary():
+            genres = list(Genre.objects.only('id', 'name', 'slug'))
+        cache.set(GENRE_MENU_KEY, genres, None)
+    return genres
+
+
+def invalidate_genre_menu():
+    cache = get_cache()
+    # nejdřív smazat menu, pak změnit verzi - mapa slugů se tak nikdy nesestaví ze starého menu pod novou verzí
+    cache.delete(GENRE_MENU_KEY)
+    cache.set(GENRE_MENU_VERSION_KEY, time.time(), None)
+
+
+def genre_menu_version():
+    """ Verze menu žánrů - čas (timestamp) jeho poslední změny. Pokud v cache chybí, bere se aktuální čas. """
+    cache = get_cache()
+    version = cache.get(GENRE_MENU_VERSION_KEY)
+    if version is None:
+        cache.add(GENRE_MENU_VERSION_KEY, time.time(), None)
+        version = cache.get(GENRE_MENU_VERSION_KEY)
+    return version
+
+
+# Mapa slug -> id žánru v paměti procesu spolu s verzí menu, ze které vznikla
+_genre_ids = (None, {})
+
+
+def genre_ids_by_slug():
+    """ Převod slugu žánru na id bez dotazu do databáze. Mapa se drží v paměti procesu a sestaví
+        se znovu z menu žánrů, jen když se změní jeho verze (jedno čtení krátkého klíče z cache). """
+    global _genre_ids
+    version, ids = _genre_ids
+    current = genre_menu_version()
+    if version != current:
+        ids = {genre.slug: genre.pk for genre in genre_menu()}
+        _genre_ids = (current, ids)
+    return ids
+
+
+def catalog_generation():
+    """ Číslo "generace" katalogu - zvyšuje se při každé změně filmu, žánru nebo přílohy.
+        Je součástí klíčů cachovaných fragmentů a stránek, takže změna katalogu je všechny zneplatní.
+        Pokud v cache chybí, začíná se od aktuálního času, aby se nepoužila některá starší hodnota. """
+    cache = get_cache()
+    generation = cache.get(CATALOG_GENERATION_KEY)
+    if generation is None:
+        cache.add(CATALOG_GENERATION_KEY, int(time.time() * 1000), None)
+        generation = cache.get(CATALOG_GENERATION_KEY)
+    return generation
+
+
+def bump_catalog_generation():
+    cache = get_cache()
+    cache.set(CATALOG_MODIFIED_KEY, time.time(), None)
+    try:
+        return cache.incr(CATALOG_GENERATION_KEY)
+    except ValueError:
+        return catalog_generation()
+
+
+def catalog_last_modified():
+    """ Čas poslední změny katalogu (timestamp). Pokud v cache chybí, bere se aktuální čas. """
+    cache = get_cache()
+    modified = cache.get(CATALOG_MODIFIED_KEY)
+    if modified is None:
+        cache.add(CATALOG_MODIFIED_KEY, time.time(), None)
+        modified = cache.get(CATALOG_MODIFIED_KEY)
+    return modified
+
+
+def page_cache_key(request):
+    """ Klíč, pod kterým se ukládá celá stránka; None, pokud se odpověď pro požadavek necachuje """
+    if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+        return None
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'{PAGE_KEY_PREFIX}:{catalog_generation()}:{url}'
+
+
+def store_page(key, response, timeout):
+    patch_vary_headers(response, ('Cookie',))
+    if key is not None and response.status_code == 200:
+        cache = get_cache()
+        if hasattr(response, 'render') and callable(response.render):
+            response.add_post_render_callback(lambda r: cache.set(key, r, timeout))
+        else:
+            cache.set(key, response, timeout)
+
+
+def anonymous_page_cache(timeout):
+    """ Dekorátor view, který nepřihlášeným návštěvníkům vrací celou stránku z cache.
+        Přihlášení uživatelé vidí ovládací prvky navíc, proto se jim stránka vždy generuje
+        a odpověď nese hlavičku Vary: Cookie, aby ji sdílené cache nezaměnily.
+        Dekorovat lze i asynchronní view, práce se session a cache pak běží ve vlákně. """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                key = await sync_to_async(page_cache_key)(request)
+                response = None if key is None else await sync_to_async(get_cache().get)(key)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                    await sync_to_async(store_page)(key, response, timeout)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = page_cache_key(request)
+            response = None if key is None else get_cache().get(key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                store_page(key, response, timeout)
+            return response
+        return wrapper
+    return decorator
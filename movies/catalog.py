@@ -0,0 +1,187 @@
+""" Proudový import a export katalogu filmů ve formátech NDJSON a CSV.
+    Záznamy se čtou i zapisují generátory po dávkách, takže paměťová náročnost nezávisí
+    na velikosti katalogu. Film je určen přirozeným klíčem (název, datum uvedení) - existující
+    filmy se při importu aktualizují, nové se vloží. Žánry se zapisují jejich názvy. """
+import csv
+import datetime
+import json
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from movies import facets, leaderboards, search, similarity
+from movies.caching import bump_catalog_generation, invalidate_film_count, invalidate_genre_menu
+from movies.models import Film, Genre, unique_slug
+
+FIELDS = ['title', 'plot', 'release_date', 'runtime', 'rate', 'poster', 'genres']
+# Oddělovač názvů žánrů ve sloupci genres formátu CSV
+GENRE_SEPARATOR = '|'
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+# Export
+
+def iter_films(batch_size=1000):
+    """ Generátor slovníků s údaji filmů. Filmy se načítají po dávkách podle primárního klíče
+        (bez OFFSET), žánry dávky jedním dotazem do vazební tabulky. """
+    genre_names = dict(Genre.objects.values_list('pk', 'name'))
+    through = Film.genres.through
+    last_pk = 0
+    while True:
+        films = list(Film.objects.filter(pk__gt=last_pk).order_by('pk')
+                     .values('pk', *FIELDS[:-1])[:batch_size])
+        if not films:
+            return
+        genres = {}
+        for film_id, genre_id in through.objects.filter(film__in=[film['pk'] for film in films]) \
+                .order_by('film', 'genre').values_list('film', 'genre'):
+            genres.setdefault(film_id, []).append(genre_names[genre_id])
+        for film in films:
+            last_pk = film.pop('pk')
+            film['release_date'] = film['release_date'].isoformat() if film['release_date'] else None
+            film['poster'] = film['poster'] or None
+            film['genres'] = genres.get(last_pk, [])
+            yield film
+
+
+def write_ndjson(films, stream):
+    count = 0
+    for film in films:
+        stream.write(json.dumps(film, ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+def write_csv(films, stream):
+    writer = csv.DictWriter(stream, fieldnames=FIELDS)
+    writer.writeheader()
+    count = 0
+    for film in films:
+        writer.writerow(dict(film, genres=GENRE_SEPARATOR.join(film['genres'])))
+        count += 1
+    return count
+
+
+# Import
+
+def read_ndjson(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        row['genres'] = [name for name in (row.get('genres') or '').split(GENRE_SEPARATOR) if name]
+        yield row
+
+
+def clean_film(row):
+    """ Převede načtený záznam na hodnoty polí modelu Film (prázdné řetězce z CSV na None) """
+    def value(name):
+        data = row.get(name)
+        return None if data in ('', None) else data
+
+    release_date = value('release_date')
+    runtime, rate = value('runtime'), value('rate')
+    return {
+        'title': row['title'],
+        'plot': value('plot'),
+        'release_date': datetime.date.fromisoformat(release_date) if release_date else None,
+        'runtime': int(runtime) if runtime is not None else None,
+        'rate': float(rate) if rate is not None else None,
+        'poster': value('poster') or '',
+        'genres': [name.strip() for name in row.get('genres') or []],
+    }
+
+
+class Importer:
+    """ Import filmů po dávkách pomocí bulk_create / bulk_update. Žánry se převádějí
+        na id podle mapy název -> id, která se načte jednou a doplňuje o nově založené žánry. """
+
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.genre_ids = dict(Genre.objects.values_list('name', 'pk'))
+        self.created = self.updated = 0
+        self.genres_created = False
+
+    def run(self, rows):
+        try:
+            for batch in batched((clean_film(row) for row in rows), self.batch_size):
+                self.import_batch(batch)
+        finally:
+            # dávky potvrzené před chybou už v databázi zůstanou - odvozená data musí odpovídat i jim
+            refresh_derived_data(genres_changed=self.genres_created)
+        return self.created, self.updated
+
+    def resolve_genres(self, names):
+        missing = set(names) - self.genre_ids.keys()
+        if missing:
+            # hromadné vložení nevolá Genre.save(), slugy se proto doplní zde
+            taken = set(Genre.objects.values_list('slug', flat=True))
+            Genre.objects.bulk_create([Genre(name=name, slug=unique_slug(name, taken)) for name in sorted(missing)],
+                                      ignore_conflicts=True)
+            self.genre_ids.update(Genre.objects.filter(name__in=missing).values_list('name', 'pk'))
+            self.genres_created = True
+        return [self.genre_ids[name] for name in names]
+
+    def existing_ids(self, keys):
+        titles = {title for title, release_date in keys}
+        return {(title, release_date): pk for pk, title, release_date
+                in Film.objects.filter(title__in=titles).values_list('pk', 'title', 'release_date')
+                if (title, release_date) in keys}
+
+    @transaction.atomic
+    def import_batch(self, batch):
+        # v rámci dávky platí poslední výskyt filmu se stejným klíčem
+        films = {(film['title'], film['release_date']): film for film in batch}
+        existing = self.existing_ids(films.keys())
+        fields = [name for name in FIELDS if name != 'genres']
+        # hodnocení filmů, pro které už hlasovali uživatelé, se počítá z hlasů (movies/ratings.py)
+        # a import ho nepřepisuje
+        rated = set(Film.objects.filter(pk__in=existing.values(), rating_count__gt=0).values_list('pk', flat=True))
+        to_update, rated_update = [], []
+        now = timezone.now()
+        for key, pk in existing.items():
+            data = films[key]
+            film = Film(pk=pk, updated_at=now, **{name: data[name] for name in fields})
+            (rated_update if pk in rated else to_update).append(film)
+        new = [Film(**{name: data[name] for name in fields})
+               for key, data in films.items() if key not in existing]
+        # bulk_update nenastavuje auto_now, čas změny se proto aktualizuje výslovně
+        Film.objects.bulk_update(to_update, fields + ['updated_at'], batch_size=self.batch_size)
+        Film.objects.bulk_update(rated_update, [name for name in fields if name != 'rate'] + ['updated_at'],
+                                 batch_size=self.batch_size)
+        Film.objects.bulk_create(new, batch_size=self.batch_size)
+        self.updated += len(existing)
+        self.created += len(new)
+        # SQLite nevrací id vložených řádků - nové filmy se dohledají podle přirozeného klíče
+        film_ids = self.existing_ids(films.keys()) if new else existing
+        through = Film.genres.through
+        through.objects.filter(film__in=film_ids.values()).delete()
+        through.objects.bulk_create([
+            through(film_id=film_ids[key], genre_id=genre_id)
+            for key, data in films.items() for genre_id in set(self.resolve_genres(data['genres']))
+        ], batch_size=self.batch_size)
+
+
+def refresh_derived_data(genres_changed=True):
+    """ Hromadné operace neposílají signály modelů - odvozená data se proto přepočítají najednou """
+    Genre.objects.all().update_film_counts()
+    invalidate_film_count()
+    if genres_changed:
+        invalidate_genre_menu()
+    leaderboards.rebuild_all()
+    search.rebuild()
+    similarity.rebuild()
+    facets.invalidate()
+    bump_catalog_generation()
@@ -1,4 +1,12 @@
-from movies.models import Genre
+from django.utils.functional import SimpleLazyObject
+
+from movies.caching import genre_menu
+
 
 def genres(request):
-    return {'genres': Genre.objects.all()}
\ No newline at end of file
+    """ Žánry pro navigaci. Seznam se načte (z cache) až ve chvíli, kdy ho šablona opravdu použije,
+        a v rámci jednoho požadavku se načítá jen jednou. """
+    menu = getattr(request, '_genre_menu', None)
+    if menu is None:
+        menu = request._genre_menu = SimpleLazyObject(genre_menu)
+    return {'genres': menu}
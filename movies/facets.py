@@ -0,0 +1,328 @@
+""" Fasetové procházení filmů - kombinace žánrů (všechny / kterýkoli), desetiletí uvedení,
+    rozsahu hodnocení a délky filmu, u každé hodnoty s počtem filmů, které by výběr vrátil.
+
+    Pro každou hodnotu fasety se v paměti procesu drží množina filmů jako bitová maska
+    (celé číslo, bit s pořadím id filmu je nastaven, pokud film do množiny patří).
+    Průnik a sjednocení množin jsou pak operace & a |, počet filmů je počet jedniček.
+    Z databáze se načte jen stránka výsledků podle id.
+
+    Index se sestaví jednou při prvním použití. Změny filmů a jejich žánrů zapisují signály
+    (po potvrzení transakce) do žurnálu v cache - očíslovaných klíčů s id změněného filmu.
+    Každý proces si před dotazem přečte čítač žurnálu a dočte z databáze jen změněné filmy;
+    pokud žurnál chybí nebo je změn příliš mnoho, sestaví index znovu celý. """
+import bisect
+import threading
+import time
+from collections import defaultdict
+
+from django.db import transaction
+
+from movies.caching import genre_menu, get_cache
+from movies.models import Film
+from movies.routers import primary
+
+JOURNAL_KEY = 'movies:facets:journal'
+JOURNAL_ENTRY_KEY = 'movies:facets:journal:{}'
+# Jak dlouho (s) se drží záznamy žurnálu a kolik změn nejvýše se dočítá - jinak se index sestaví znovu
+JOURNAL_TIMEOUT = 24 * 3600
+JOURNAL_LIMIT = 500
+# Záznam žurnálu, který znamená nové sestavení celého indexu (id filmu nikdy není 0)
+REBUILD = 0
+
+# Délka filmu: (hodnota v URL, popisek, od minut, do minut - bez horní hranice)
+RUNTIME_BUCKETS = (
+    ('short', 'do 90 min', 0, 90),
+    ('medium', '90 - 120 min', 90, 120),
+    ('long', '120 - 150 min', 120, 150),
+    ('epic', 'nad 150 min', 150, None),
+)
+RATES = range(1, 11)
+
+# Počet jedniček v masce - int.bit_count je až v Pythonu 3.10
+popcount = getattr(int, 'bit_count', lambda bits: bin(bits).count('1'))
+
+
+def decade(release_date):
+    return None if release_date is None else release_date.year // 10 * 10
+
+
+def rate_bucket(rate):
+    """ Hodnocení zaokrouhlené dolů na celé číslo (10.0 patří do skupiny 10) """
+    return None if rate is None else min(max(int(rate), RATES[0]), RATES[-1])
+
+
+def runtime_bucket(runtime):
+    if runtime is None:
+        return None
+    for key, label, lower, upper in RUNTIME_BUCKETS:
+        if runtime >= lower and (upper is None or runtime < upper):
+            return key
+    return None
+
+
+def listing_key(title, release_date, pk):
+    """ Řadicí klíč odpovídající výchozímu řazení filmů (-release_date, title) s id na konci;
+        filmy bez data uvedení jsou při sestupném řazení poslední (NULL je v SQLite nejmenší) """
+    return (release_date is None, -release_date.toordinal() if release_date else 0, title, pk)
+
+
+def members(bits):
+    """ Množina čísel nastavených bitů masky """
+    result = set()
+    for offset, byte in enumerate(bits.to_bytes((bits.bit_length() + 7) // 8, 'little')):
+        while byte:
+            low = byte & -byte
+            result.add(offset * 8 + low.bit_length() - 1)
+            byte ^= low
+    return result
+
+
+class FacetQuery:
+    """ Výběr uživatele v fasetách. Neplatné hodnoty parametrů se ignorují. """
+
+    def __init__(self, genres=(), match_all=False, decades=(), rate_min=None, rate_max=None, runtimes=()):
+        self.genres = set(genres)
+        self.match_all = match_all
+        self.decades = set(decades)
+        self.rate_min, self.rate_max = rate_min, rate_max
+        self.runtimes = set(runtimes)
+
+    @classmethod
+    def from_querydict(cls, data, genre_ids):
+        """ Výběr z parametrů URL (?genre=drama&genre=krimi&match=all&decade=1990&rate_min=7&runtime=long),
+            žánry se zadávají slugem a převádějí se mapou genre_ids (slug -> id) """
+        def integers(values):
+            return [int(value) for value in values if value.lstrip('-').isdigit()]
+
+        def rate(name):
+            values = [value for value in integers(data.getlist(name)) if value in RATES]
+            return values[0] if values else None
+
+        runtime_keys = {key for key, *rest in RUNTIME_BUCKETS}
+        return cls(
+            genres=[genre_ids[slug] for slug in data.getlist('genre') if slug in genre_ids],
+            match_all=data.get('match') == 'all',
+            decades=integers(data.getlist('decade')),
+            rate_min=rate('rate_min'),
+            rate_max=rate('rate_max'),
+            runtimes=[key for key in data.getlist('runtime') if key in runtime_keys],
+        )
+
+    @property
+    def rates(self):
+        if self.rate_min is None and self.rate_max is None:
+            return set()
+        return {rate for rate in RATES
+                if (self.rate_min or RATES[0]) <= rate <= (self.rate_max or RATES[-1])}
+
+    def __bool__(self):
+        return bool(self.genres or self.decades or self.rates or self.runtimes)
+
+
+class FacetIndex:
+    """ Masky filmů pro hodnoty všech faset a seznam filmů ve výchozím pořadí výpisu """
+
+    def __init__(self, position):
+        # pozice v žurnálu změn, do které index odpovídá databázi
+        self.position = position
+        self.all = 0
+        self.sets = defaultdict(int)    # (faseta, hodnota) -> maska filmů
+        self.films = {}                 # id filmu -> (řadicí klíč, hodnoty faset filmu)
+        self.order = []                 # řadicí klíče všech filmů ve výchozím pořadí výpisu
+
+    @classmethod
+    def build(cls, position):
+        index = cls(position)
+        index.order = sorted(index.load(Film.objects.all()))
+        return index
+
+    def load(self, films):
+        """ Přidá filmy do masek, vrací jejich řadicí klíče """
+        rows = films.values_list('pk', 'title', 'release_date', 'rate', 'runtime')
+        genres = defaultdict(list)
+        for film_id, genre_id in Film.genres.through.objects.filter(film__in=films.values('pk')) \
+                .values_list('film_id', 'genre_id'):
+            genres[film_id].append(genre_id)
+        keys = []
+        for pk, title, release_date, rate, runtime in rows:
+            values = [('genre', genre_id) for genre_id in genres[pk]]
+            values += [(facet, value) for facet, value in (
+                ('decade', decade(release_date)), ('rate', rate_bucket(rate)), ('runtime', runtime_bucket(runtime))
+            ) if value is not None]
+            key = listing_key(title, release_date, pk)
+            self.films[pk] = (key, values)
+            self.all |= 1 << pk
+            for value in values:
+                self.sets[value] |= 1 << pk
+            keys.append(key)
+        return keys
+
+    def remove(self, pk):
+        if pk not in self.films:
+            return
+        key, values = self.films.pop(pk)
+        mask = ~(1 << pk)
+        self.all &= mask
+        for value in values:
+            self.sets[value] &= mask
+        del self.order[bisect.bisect_left(self.order, key)]
+
+    def refresh(self, film_ids):
+        """ Znovu načte změněné filmy; smazané filmy z indexu jen odebere """
+        for pk in film_ids:
+            self.remove(pk)
+        for key in self.load(Film.objects.filter(pk__in=film_ids)):
+            bisect.insort(self.order, key)
+
+    def union(self, facet, values):
+        bits = 0
+        for value in values:
+            bits |= self.sets.get((facet, value), 0)
+        return bits
+
+    def search(self, query):
+        """ Filmy odpovídající výběru a počty filmů pro každou hodnotu faset.
+            Počet u hodnoty fasety započítává výběr v ostatních fasetách (u žánrů v režimu
+            "všechny" i ostatní vybrané žánry), takže udává, kolik filmů zbude po jejím zaškrtnutí. """
+        selected = {}
+        if query.genres:
+            if query.match_all:
+                selected['genre'] = self.all
+                for genre_id in query.genres:
+                    selected['genre'] &= self.sets.get(('genre', genre_id), 0)
+            else:
+                selected['genre'] = self.union('genre', query.genres)
+        for facet, values in (('decade', query.decades), ('rate', query.rates), ('runtime', query.runtimes)):
+            if values:
+                selected[facet] = self.union(facet, values)
+
+        def others(facet):
+            bits = self.all
+            for name, mask in selected.items():
+                if name != facet:
+                    bits &= mask
+            return bits
+
+        result = others(None)
+        counts = defaultdict(dict)
+        for (facet, value), mask in self.sets.items():
+            base = result if facet == 'genre' and query.match_all else others(facet)
+            counts[facet][value] = popcount(base & mask)
+        return FacetResults(self, result, counts)
+
+    def page(self, bits, start, stop):
+        """ Id filmů masky v pořadí výpisu, řez [start:stop] """
+        wanted, film_ids = members(bits), []
+        for key in self.order:
+            if stop is not None and len(film_ids) >= stop:
+                break
+            if key[-1] in wanted:
+                film_ids.append(key[-1])
+        return film_ids[start:]
+
+
+class FacetResults:
+    """ Líný seznam nalezených filmů pro Paginator (jako movies.search.SearchResults) -
+        počet je známý z masky, z databáze se načte jen požadovaný řez """
+
+    def __init__(self, index, bits, counts):
+        self.index = index
+        self.bits = bits
+        self.counts = counts
+        self._count = popcount(bits)
+
+    def count(self):
+        return self._count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        with _lock:
+            film_ids = self.index.page(self.bits, key.start or 0, key.stop)
+        films = Film.objects.for_listing().in_bulk(film_ids)
+        # film mohl být mezitím smazán
+        return [films[pk] for pk in film_ids if pk in films]
+
+
+def journal_position():
+    """ Číslo posledního záznamu žurnálu. Pokud čítač v cache chybí, začíná se od aktuálního času,
+        takže se neshoduje s pozicí žádného dříve sestaveného indexu. """
+    cache = get_cache()
+    position = cache.get(JOURNAL_KEY)
+    if position is None:
+        cache.add(JOURNAL_KEY, int(time.time() * 1000), None)
+        position = cache.get(JOURNAL_KEY)
+    return position
+
+
+def record(film_id):
+    cache = get_cache()
+    try:
+        position = cache.incr(JOURNAL_KEY)
+    except ValueError:
+        journal_position()
+        position = cache.incr(JOURNAL_KEY)
+    cache.set(JOURNAL_ENTRY_KEY.format(position), film_id, JOURNAL_TIMEOUT)
+
+
+def films_changed(film_ids):
+    """ Zapíše změněné filmy do žurnálu - až po potvrzení transakce, aby je ostatní procesy
+        nenačetly z databáze dřív, než jsou změny vidět """
+    film_ids = list(film_ids)
+    transaction.on_commit(lambda: [record(pk) for pk in film_ids])
+
+
+def invalidate():
+    """ Po hromadných změnách (import katalogu, smazání žánru) se index všude sestaví znovu """
+    transaction.on_commit(lambda: record(REBUILD))
+
+
+_lock = threading.Lock()
+_index = None
+
+
+def catch_up(index, position):
+    """ Dočte do indexu změny ze žurnálu; vrací False, pokud je třeba index sestavit znovu """
+    if position < index.position or position - index.position > JOURNAL_LIMIT:
+        return False
+    keys = [JOURNAL_ENTRY_KEY.format(number) for number in range(index.position + 1, position + 1)]
+    changes = get_cache().get_many(keys)
+    if len(changes) != len(keys) or REBUILD in changes.values():
+        return False
+    if changes:
+        index.refresh(set(changes.values()))
+    index.position = position
+    return True
+
+
+def facet_index():
+    global _index
+    position = journal_position()
+    # index odpovídá pozici žurnálu, proto se načítá z hlavní databáze - replika může být pozadu
+    with primary():
+        if _index is None or not catch_up(_index, position):
+            _index = FacetIndex.build(position)
+    return _index
+
+
+def search(query):
+    with _lock:
+        return facet_index().search(query)
+
+
+def facet_choices(results, query):
+    """ Hodnoty faset pro šablonu: {faseta: [(hodnota, popisek, počet filmů, vybráno), ...]} """
+    counts = results.counts
+    rates = query.rates
+    return {
+        'genre': [(genre.slug, genre.name, counts['genre'].get(genre.pk, 0), genre.pk in query.genres)
+                  for genre in genre_menu()],
+        'decade': [(value, f'{value} - {value + 9}', count, value in query.decades)
+                   for value, count in sorted(counts['decade'].items(), reverse=True)],
+        'rate': [(value, str(value), counts['rate'].get(value, 0), value in rates) for value in RATES],
+        'runtime': [(key, label, counts['runtime'].get(key, 0), key in query.runtimes)
+                    for key, label, *rest in RUNTIME_BUCKETS],
+    }
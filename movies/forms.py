@@ -6,6 +6,13 @@ from .models import Genre, Film
 
 
 class FilmModelForm(ModelForm):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # hodnocení filmu, pro který už hlasovali uživatelé, je průměrem jejich hlasů (movies/ratings.py)
+        if self.instance.rating_count:
+            self.fields['rate'].disabled = True
+            self.fields['rate'].help_text = 'Průměr hodnocení uživatelů'
+
     def clean_runtime(self):
        data = self.cleaned_data['runtime']
        if data <= 0 or data > 1000:
@@ -23,6 +30,10 @@ class FilmModelForm(ModelForm):
         fields = ['title', 'plot', 'poster', 'genres', 'release_date', 'runtime', 'rate']
         labels = {'title': 'Název filmu', 'plot': 'Stručný děj'}
 
+class RatingForm(forms.Form):
+    score = forms.TypedChoiceField(choices=[(score, score) for score in range(1, 11)], coerce=int,
+                                   label='Vaše hodnocení')
+
 """
 class FilmForm(forms.Form):
     title = forms.CharField(label='Název filmu', help_text='Zadejte název filmu', required=True)
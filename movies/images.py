@@ -0,0 +1,113 @@
+""" Zmenšené varianty plakátů a obrázkových příloh pro responzivní obrázky (srcset).
+    Varianty se ukládají vedle originálu pod názvem <název>.<šířka>w.<webp|jpg>
+    (např. film/posters/2021/03/24/pulp-fiction.320w.webp). Vytvářejí se po uploadu
+    (signály v movies/signals.py), pro existující soubory příkazem generate_image_variants.
+    Seznam vytvořených šířek se drží v cache, takže šablony nemusí sahat na disk. """
+import hashlib
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, UnidentifiedImageError
+
+from movies.caching import get_cache
+
+# (přípona souboru, formát Pillow, MIME typ)
+FORMATS = (
+    ('webp', 'WEBP', 'image/webp'),
+    ('jpg', 'JPEG', 'image/jpeg'),
+)
+# Jak dlouho si pamatovat, že soubor varianty nemá (mohou být doplněny příkazem)
+MISSING_TIMEOUT = 300
+
+
+def variant_widths():
+    return getattr(settings, 'MOVIES_IMAGE_WIDTHS', (160, 320, 640))
+
+
+def variant_name(name, width, extension):
+    root, ext = os.path.splitext(name)
+    return f"{root}.{width}w.{extension}"
+
+
+def _cache_key(name):
+    return 'movies:image-variants:' + hashlib.md5(name.encode()).hexdigest()
+
+
+def generate_variants(field_file):
+    """ Vytvoří varianty obrázku ve všech šířkách menších než originál.
+        Vrací slovník s šířkou originálu a seznamem šířek vytvořených variant. """
+    storage, name = field_file.storage, field_file.name
+    try:
+        with storage.open(name) as f:
+            image = Image.open(f)
+            image.load()
+    except (OSError, UnidentifiedImageError):
+        # soubor není obrázek (nebo chybí) - varianty nemá
+        info = {'width': None, 'widths': []}
+        get_cache().set(_cache_key(name), info, None)
+        return info
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    widths = [width for width in variant_widths() if width < image.width]
+    for width in widths:
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.LANCZOS)
+        for extension, image_format, content_type in FORMATS:
+            buffer = io.BytesIO()
+            resized.save(buffer, image_format, quality=82)
+            target = variant_name(name, width, extension)
+            if storage.exists(target):
+                storage.delete(target)
+            storage.save(target, ContentFile(buffer.getvalue()))
+    info = {'width': image.width, 'widths': widths}
+    get_cache().set(_cache_key(name), info, None)
+    return info
+
+
+def missing_variants(field_file):
+    """ Zjistí, zda obrázku chybí některá z variant. Z originálu se čte jen hlavička s rozměry. """
+    storage, name = field_file.storage, field_file.name
+    try:
+        with storage.open(name) as f:
+            width = Image.open(f).width
+    except (OSError, UnidentifiedImageError):
+        return False
+    return any(not storage.exists(variant_name(name, w, extension))
+               for w in variant_widths() if w < width for extension, image_format, content_type in FORMATS)
+
+
+def variants(field_file):
+    """ Informace o variantách obrázku (viz generate_variants) - z cache, případně zjištěné z úložiště """
+    if not field_file:
+        return None
+    cache = get_cache()
+    info = cache.get(_cache_key(field_file.name))
+    if info is None:
+        storage = field_file.storage
+        widths = [width for width in variant_widths()
+                  if storage.exists(variant_name(field_file.name, width, FORMATS[-1][0]))]
+        info = {'width': None, 'widths': widths}
+        cache.set(_cache_key(field_file.name), info, None if widths else MISSING_TIMEOUT)
+    return info
+
+
+def has_variants(field_file):
+    """ Levná kontrola pro signály: má obrázek vytvořené varianty? Bere údaje z cache, po jejím
+        vyprázdnění je zjistí z úložiště (variants). Obrázek zpracovaný generate_variants (i bez
+        variant, protože je menší než všechny šířky) je hotový i s prázdným seznamem šířek. """
+    info = variants(field_file)
+    return info is not None and (bool(info['widths']) or info['width'] is not None)
+
+
+def srcset(field_file, extension='jpg'):
+    """ Hodnota atributu srcset pro daný formát variant """
+    info = variants(field_file)
+    if not info or not info['widths']:
+        return ''
+    candidates = [f"{field_file.storage.url(variant_name(field_file.name, width, extension))} {width}w"
+                  for width in info['widths']]
+    if info['width'] and extension == 'jpg':
+        candidates.append(f"{field_file.url} {info['width']}w")
+    return ', '.join(candidates)
@@ -0,0 +1,157 @@
+""" Fronta úloh na pozadí uložená v databázi (model Job), bez dalšího serveru.
+    Požadavek jen zapíše řádek úlohy (ve stejné transakci jako změnu dat, takže úloha vznikne,
+    jen pokud se změna potvrdí), práci provede příkaz run_worker v procesech ProcessPoolExecutor.
+    Čekající úloha se stejnou funkcí a klíčem (např. přepočet podobných filmů pro film 12)
+    se do fronty zapíše jen jednou. Neúspěšná úloha se opakuje s exponenciálně rostoucím
+    odstupem, po MOVIES_JOBS_MAX_ATTEMPTS pokusech zůstane ve stavu failed.
+    S nastavením MOVIES_JOBS_EAGER (výchozí jen v testech) se úlohy provádějí hned při zařazení.
+    Worker a webové procesy musí sdílet cache - úlohy v ní zneplatňují data, která webové procesy čtou. """
+import datetime
+import logging
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.apps import apps
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Avg, Count, F, Max, Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from movies.caching import get_cache
+from movies.models import Job
+
+logger = logging.getLogger('movies.jobs')
+
+
+def setting(name, default):
+    return getattr(settings, f'MOVIES_JOBS_{name}', default)
+
+
+def enqueue(task, *args, key='', delay=0):
+    """ Zařadí úlohu - volání funkce task (cesta pro import) s argumenty args (musí jít uložit do JSON).
+        Je-li zadán klíč a stejná úloha se stejným klíčem už čeká, nová se nezapíše. """
+    if setting('EAGER', False):
+        import_string(task)(*args)
+        return None
+    try:
+        with transaction.atomic():
+            return Job.objects.create(task=task, args=list(args), key=key,
+                                      run_after=timezone.now() + datetime.timedelta(seconds=delay))
+    except IntegrityError:
+        return None
+
+
+def retry_delay(attempts):
+    """ Odstup dalšího pokusu v sekundách: základ, dvojnásobek, čtyřnásobek... nejvýše hodina """
+    return min(setting('RETRY_DELAY', 10) * 2 ** (attempts - 1), 3600)
+
+
+def claim(limit):
+    """ Převezme až limit úloh, které mají být provedeny. Úloha se převezme změnou stavu
+        s podmínkou na stav pending, takže ji nepřevezmou dva procesy zároveň. """
+    now = timezone.now()
+    candidates = Job.objects.filter(status=Job.PENDING, run_after__lte=now).values_list('pk', flat=True)[:limit]
+    claimed = [pk for pk in candidates if Job.objects.filter(pk=pk, status=Job.PENDING).update(
+        status=Job.RUNNING, started_at=now, attempts=F('attempts') + 1)]
+    return list(Job.objects.filter(pk__in=claimed))
+
+
+def execute(task, args):
+    """ Provedení úlohy v podřízeném procesu; vrací dobu běhu a případně text chyby """
+    started = time.monotonic()
+    try:
+        import_string(task)(*args)
+        error = ''
+    except Exception:
+        error = traceback.format_exc()
+    return time.monotonic() - started, error
+
+
+def finish(job, duration, error):
+    job.finished_at, job.duration, job.last_error = timezone.now(), duration, error
+    if not error:
+        job.status = Job.DONE
+        logger.info('%s hotovo za %.3f s', job, duration)
+    elif job.attempts < setting('MAX_ATTEMPTS', 5):
+        job.status = Job.PENDING
+        job.run_after = job.finished_at + datetime.timedelta(seconds=retry_delay(job.attempts))
+        logger.warning('%s selhala (pokus %d), opakuje se v %s\n%s', job, job.attempts, job.run_after, error)
+    else:
+        job.status = Job.FAILED
+        logger.error('%s selhala po %d pokusech\n%s', job, job.attempts, error)
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        # mezitím byla zařazena stejná úloha se stejným klíčem - opakování převezme ona
+        job.status = Job.FAILED
+        job.save()
+
+
+def reset_stale():
+    """ Úlohy, které zůstaly ve stavu running (např. po pádu workeru), se vrátí do fronty """
+    limit = timezone.now() - datetime.timedelta(seconds=setting('TIMEOUT', 600))
+    for job in Job.objects.filter(status=Job.RUNNING, started_at__lt=limit):
+        finish(job, None, 'Úloha nebyla dokončena (vypršel čas MOVIES_JOBS_TIMEOUT)')
+
+
+def purge_finished():
+    """ Smaže hotové úlohy starší než MOVIES_JOBS_KEEP_DAYS dní """
+    limit = timezone.now() - datetime.timedelta(days=setting('KEEP_DAYS', 7))
+    return Job.objects.filter(status=Job.DONE, finished_at__lt=limit).delete()[0]
+
+
+def setup_process():
+    # proces vytvořený metodou fork má Django nastavené po rodiči, jinak (spawn) se musí nastavit;
+    # připojení k databázi si podřízený proces otevírá vlastní
+    if not apps.ready:
+        django.setup()
+
+
+def run_worker(processes=2, poll=1.0, once=False, executor=ProcessPoolExecutor):
+    """ Smyčka workeru: převezme tolik úloh, kolik je volných procesů, a zpracovává výsledky.
+        S once=True skončí, jakmile ve frontě nejsou žádné úlohy k provedení. """
+    if isinstance(get_cache(), LocMemCache):
+        logger.warning('Cache v paměti procesu (LocMemCache) není sdílená - změny cache provedené úlohami '
+                       'webové procesy neuvidí. Nastavte sdílenou cache (Memcached, Redis).')
+    reset_stale()
+    purge_finished()
+    # připojení rodičovského procesu se nesmí sdílet s podřízenými procesy (fork)
+    connections.close_all()
+    running = {}
+    with executor(processes, initializer=setup_process) as pool:
+        while True:
+            for job in claim(processes - len(running)) if len(running) < processes else ():
+                running[pool.submit(execute, job.task, job.args)] = job
+            if not running:
+                if once:
+                    return
+                time.sleep(poll)
+                continue
+            done, _ = wait(running, timeout=poll, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                try:
+                    duration, error = future.result()
+                except Exception:
+                    # podřízený proces spadl (BrokenProcessPool) - úloha se zopakuje
+                    duration, error = None, traceback.format_exc()
+                finish(job, duration, error)
+
+
+def metrics():
+    """ Stav fronty: počty úloh podle stavu, stáří nejstarší čekající úlohy a pro každou funkci
+        počet hotových a neúspěšných úloh a průměrnou a nejdelší dobu běhu """
+    now = timezone.now()
+    waiting = Job.objects.filter(status=Job.PENDING, run_after__lte=now).aggregate(oldest=Min('run_after'))['oldest']
+    tasks = Job.objects.filter(status__in=(Job.DONE, Job.FAILED)).order_by().values('task', 'status') \
+        .annotate(count=Count('pk'), avg=Avg('duration'), max=Max('duration'), attempts=Avg('attempts'))
+    return {
+        'statuses': dict(Job.objects.order_by().values_list('status').annotate(count=Count('pk'))),
+        'lag_seconds': (now - waiting).total_seconds() if waiting else 0,
+        'tasks': list(tasks),
+    }
@@ -0,0 +1,60 @@
+""" Předpočítané žebříčky nejlépe hodnocených filmů (celkový a pro každý žánr).
+    Žebříček je uložen v tabulce LeaderboardEntry, takže jeho zobrazení je jen čtením N řádků
+    podle indexu místo řazení celé tabulky filmů. Po změně hodnocení nebo žánrů filmu se
+    přepočítají jen ty žebříčky, do kterých film patří nebo se nově může dostat. """
+from django.conf import settings
+from django.db import transaction
+
+from movies.models import Film, Genre, LeaderboardEntry
+
+
+def leaderboard_size():
+    return getattr(settings, 'MOVIES_LEADERBOARD_SIZE', 10)
+
+
+def rebuild(genre_id=None):
+    """ Sestaví žebříček znovu (genre_id None znamená celkový žebříček) """
+    films = Film.objects.filter(rate__isnull=False)
+    if genre_id is not None:
+        films = films.filter(genres=genre_id)
+    film_ids = films.order_by('-rate', 'id').values_list('pk', flat=True)[:leaderboard_size()]
+    with transaction.atomic():
+        LeaderboardEntry.objects.filter(genre_id=genre_id).delete()
+        LeaderboardEntry.objects.bulk_create([
+            LeaderboardEntry(genre_id=genre_id, film_id=film_id, rank=rank)
+            for rank, film_id in enumerate(film_ids, start=1)
+        ])
+
+
+def rebuild_all():
+    rebuild()
+    for genre_id in Genre.objects.values_list('pk', flat=True):
+        rebuild(genre_id)
+
+
+def boards_of(film_ids):
+    """ Žebříčky (id žánrů, None pro celkový), ve kterých se filmy právě nacházejí """
+    return set(LeaderboardEntry.objects.filter(film__in=film_ids).values_list('genre_id', flat=True))
+
+
+def films_changed(film_ids, genre_ids):
+    """ Aktualizuje žebříčky po změně hodnocení nebo žánrů filmů.
+        Parametr genre_ids určuje žebříčky žánrů, kterých se změna týká; celkový se kontroluje vždy. """
+    films = {pk: (rate, pk) for pk, rate in Film.objects.filter(pk__in=film_ids).values_list('pk', 'rate')}
+    size = leaderboard_size()
+    for genre_id in [None, *genre_ids]:
+        entries = LeaderboardEntry.objects.filter(genre_id=genre_id).values_list('film_id', 'film__rate')
+        ranked = {film_id: (rate, film_id) for film_id, rate in entries}
+        if ranked.keys() & set(film_ids):
+            rebuild(genre_id)
+            continue
+        # film, který v žebříčku není, do něj pronikne, jen pokud je lepší než poslední pozice
+        candidates = [key for key in films.values() if key[0] is not None]
+        if not candidates:
+            continue
+        if len(ranked) < size:
+            rebuild(genre_id)
+            continue
+        worst = min(ranked.values(), key=lambda key: (key[0], -key[1]))
+        if any((rate, -pk) > (worst[0], -worst[1]) for rate, pk in candidates):
+            rebuild(genre_id)
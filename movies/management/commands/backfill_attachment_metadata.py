@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from movies.models import Attachment
+
+
+class Command(BaseCommand):
+    help = 'Doplní u příloh velikost, typ obsahu, rozměry a otisk SHA-256 souboru'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Znovu načíst údaje i u příloh, které je už mají')
+
+    def handle(self, *args, **options):
+        attachments = Attachment.objects.exclude(file='').exclude(file__isnull=True)
+        if not options['all']:
+            attachments = attachments.filter(size_bytes__isnull=True)
+        done = missing = 0
+        for attachment in attachments.iterator():
+            try:
+                attachment.read_file_metadata()
+            except FileNotFoundError:
+                missing += 1
+                self.stderr.write(f'Soubor nenalezen: {attachment.file.name}')
+                continue
+            # update() místo save() - nemění čas poslední aktualizace a nespouští signály
+            Attachment.objects.filter(pk=attachment.pk).update(
+                size_bytes=attachment.size_bytes, content_type=attachment.content_type,
+                width=attachment.width, height=attachment.height, sha256=attachment.sha256,
+            )
+            done += 1
+        self.stdout.write(self.style.SUCCESS(f'Doplněny údaje u {done} příloh, chybějících souborů: {missing}'))
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from movies.benchmarks import data, runner, scenarios
+
+COLUMNS = ('p50_ms', 'p95_ms', 'p99_ms', 'mean_ms', 'rps', 'queries')
+
+
+class Command(BaseCommand):
+    help = ('Změří odezvu hlavních stránek nad syntetickým katalogem v dočasné testovací databázi; '
+            's --baseline selže, pokud je některý scénář pomalejší nebo potřebuje víc dotazů')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--films', type=int, default=2000)
+        parser.add_argument('--genres', type=int, default=25)
+        parser.add_argument('--attachments', type=int, default=3, help='Počet příloh na film')
+        parser.add_argument('--requests', type=int, default=50, help='Počet měřených požadavků na scénář')
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--baseline', help='Porovnat s uloženou základní linií (JSON)')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='Povolené zhoršení p50 oproti základní linii přepočtené na rychlost stroje '
+                                 '(0.5 = o 50 %%)')
+        parser.add_argument('--save-baseline', help='Uložit výsledky jako novou základní linii (JSON)')
+        parser.add_argument('--force', action='store_true',
+                            help='Porovnat se základní linií i při jiných parametrech měření')
+
+    def handle(self, *args, **options):
+        parameters = {name: options[name] for name in ('films', 'genres', 'attachments', 'requests', 'warmup', 'seed')}
+        baseline = None
+        if options['baseline']:
+            # kontroluje se před měřením - výsledky nad jiným katalogem nejsou se základní linií srovnatelné
+            baseline = runner.load_baseline(options['baseline'])
+            if baseline.get('parameters') != parameters and not options['force']:
+                raise CommandError(f"Základní linie byla změřena s jinými parametry ({baseline.get('parameters')}, "
+                                   f"nyní {parameters}); spusťte měření se stejnými parametry nebo použijte --force")
+        setup_test_environment(debug=False)
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stderr.write(f"Generuji katalog: {options['films']} filmů, {options['genres']} žánrů…")
+            data.generate(options['films'], options['genres'], options['attachments'], options['seed'])
+            results = runner.run(scenarios.default_scenarios(), options['requests'], options['warmup'])
+            calibration = runner.calibrate()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        self.stdout.write(f"{'scénář':<20}" + ''.join(f'{column:>10}' for column in COLUMNS))
+        for name, result in results.items():
+            self.stdout.write(f'{name:<20}' + ''.join(f'{result[column]:>10}' for column in COLUMNS))
+        self.stdout.write(f'kalibrace {calibration} ms')
+        if options['save_baseline']:
+            runner.save_baseline(options['save_baseline'], results, parameters, calibration)
+            self.stderr.write(self.style.SUCCESS(f"Základní linie uložena do {options['save_baseline']}"))
+        if baseline is not None:
+            regressions = runner.compare(results, baseline, options['tolerance'], calibration)
+            if regressions:
+                raise CommandError('Výkonnostní regrese:\n  ' + '\n  '.join(regressions))
+            self.stderr.write(self.style.SUCCESS('Bez regresí oproti základní linii'))
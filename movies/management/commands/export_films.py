@@ -0,0 +1,28 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from movies import catalog
+
+
+class Command(BaseCommand):
+    help = 'Exportuje katalog filmů do souboru NDJSON nebo CSV (proudově, po dávkách)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-',
+                            help='Cílový soubor (výchozí "-" je standardní výstup)')
+        parser.add_argument('--format', choices=['ndjson', 'csv'],
+                            help='Formát výstupu (výchozí podle přípony souboru, jinak ndjson)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        output = options['output']
+        data_format = options['format'] or ('csv' if output.endswith('.csv') else 'ndjson')
+        write = catalog.write_csv if data_format == 'csv' else catalog.write_ndjson
+        films = catalog.iter_films(options['batch_size'])
+        if output == '-':
+            count = write(films, sys.stdout)
+        else:
+            with open(output, 'w', encoding='utf-8', newline='') as stream:
+                count = write(films, stream)
+        self.stderr.write(self.style.SUCCESS(f'Exportováno filmů: {count}'))
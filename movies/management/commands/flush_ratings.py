@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from movies import ratings
+
+
+class Command(BaseCommand):
+    help = 'Započte nashromážděné hlasy uživatelů do hodnocení filmů (vhodné spouštět pravidelně, např. z cronu)'
+
+    def handle(self, *args, **options):
+        film_ids = ratings.flush()
+        self.stdout.write(self.style.SUCCESS(f'Aktualizováno hodnocení {len(film_ids)} filmů'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from movies import images
+from movies.models import Attachment, Film
+
+
+class Command(BaseCommand):
+    help = 'Vytvoří zmenšené varianty (WebP/JPEG) plakátů filmů a obrázkových příloh'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Vytvořit varianty i u obrázků, které je už mají')
+
+    def handle(self, *args, **options):
+        files = [film.poster for film in Film.objects.exclude(poster='').exclude(poster__isnull=True)
+                 .only('poster').iterator()]
+        files += [attachment.file for attachment in Attachment.objects.filter(type='image')
+                  .exclude(file='').only('file').iterator()]
+        generated = 0
+        for field_file in files:
+            if options['force'] or images.missing_variants(field_file):
+                info = images.generate_variants(field_file)
+                generated += 1
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"{field_file.name}: {', '.join(map(str, info['widths'])) or '-'}")
+        self.stdout.write(self.style.SUCCESS(f'Zpracováno obrázků: {generated} z {len(files)}'))
@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movies import catalog
+
+
+class Command(BaseCommand):
+    help = 'Importuje filmy ze souboru NDJSON nebo CSV; existující filmy (stejný název a datum) aktualizuje'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Zdrojový soubor ("-" je standardní vstup)')
+        parser.add_argument('--format', choices=['ndjson', 'csv'],
+                            help='Formát vstupu (výchozí podle přípony souboru, jinak ndjson)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        source = options['input']
+        data_format = options['format'] or ('csv' if source.endswith('.csv') else 'ndjson')
+        read = catalog.read_csv if data_format == 'csv' else catalog.read_ndjson
+        importer = catalog.Importer(batch_size=options['batch_size'])
+        try:
+            if source == '-':
+                created, updated = importer.run(read(sys.stdin))
+            else:
+                with open(source, encoding='utf-8', newline='') as stream:
+                    created, updated = importer.run(read(stream))
+        except (OSError, ValueError, KeyError) as e:
+            # dávky zpracované před chybou zůstanou naimportované
+            raise CommandError(f'Import se nezdařil po {importer.created + importer.updated} filmech: {e}')
+        self.stdout.write(self.style.SUCCESS(f'Nové filmy: {created}, aktualizované filmy: {updated}'))
@@ -0,0 +1,17 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from movies.uploads import purge_stale
+
+
+class Command(BaseCommand):
+    help = 'Smaže staré uploady příloh po částech (včetně rozpracovaných souborů .part)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=24,
+                            help='Smazat uploady, do kterých déle než zadaný počet hodin nic nepřišlo')
+
+    def handle(self, *args, **options):
+        count = purge_stale(datetime.timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'Smazáno uploadů: {count}'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from movies import leaderboards
+from movies.models import Genre
+
+
+class Command(BaseCommand):
+    help = 'Znovu sestaví předpočítané žebříčky nejlépe hodnocených filmů'
+
+    def handle(self, *args, **options):
+        leaderboards.rebuild_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Sestaven celkový žebříček a {Genre.objects.count()} žebříčků žánrů'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from movies import search
+
+
+class Command(BaseCommand):
+    help = 'Znovu sestaví fulltextový index filmů (SQLite FTS5)'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('Fulltextový index je k dispozici jen pro databázi SQLite')
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS('Fulltextový index filmů byl znovu sestaven'))
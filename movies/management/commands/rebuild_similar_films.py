@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from movies import similarity
+
+
+class Command(BaseCommand):
+    help = 'Znovu sestaví slovník a vektory filmů a spočítá podobné filmy (tabulka SimilarFilm)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Počet filmů, jejichž podobnosti se počítají najednou')
+
+    def handle(self, *args, **options):
+        count = similarity.rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Podobné filmy spočítány pro {count} filmů'))
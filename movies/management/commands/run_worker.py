@@ -0,0 +1,24 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from movies import jobs
+
+
+class Command(BaseCommand):
+    help = 'Zpracovává frontu úloh na pozadí (movies/jobs.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help='Počet procesů, které provádějí úlohy')
+        parser.add_argument('--poll', type=float, default=1.0, help='Jak často (s) hledat nové úlohy')
+        parser.add_argument('--once', action='store_true', help='Skončit, jakmile ve frontě nejsou úlohy k provedení')
+        parser.add_argument('--stats', action='store_true', help='Jen vypsat stav fronty (JSON)')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(jobs.metrics(), ensure_ascii=False, indent=2))
+            return
+        try:
+            jobs.run_worker(options['processes'], options['poll'], options['once'])
+        except KeyboardInterrupt:
+            self.stdout.write('Worker ukončen')
@@ -0,0 +1,26 @@
+# Generated by Django 3.1.7 on 2026-10-18 01:08
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_films(apps, schema_editor):
+    Genre = apps.get_model('movies', 'Genre')
+    for genre in Genre.objects.annotate(count=Count('film')):
+        Genre.objects.filter(pk=genre.pk).update(num_films=genre.count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0005_auto_20210422_0924'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='genre',
+            name='num_films',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Number of films'),
+        ),
+        migrations.RunPython(count_films, migrations.RunPython.noop),
+    ]
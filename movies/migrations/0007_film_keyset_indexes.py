@@ -0,0 +1,25 @@
+# Generated by Django 3.1.7 on 2026-10-18 01:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0006_genre_num_films'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['-release_date', 'title', 'id'], name='film_release_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['release_date', 'title', 'id'], name='film_newest_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['-rate', 'id'], name='film_rate_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.1.7 on 2026-10-18 01:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_leaderboards(apps, schema_editor):
+    Film = apps.get_model('movies', 'Film')
+    Genre = apps.get_model('movies', 'Genre')
+    LeaderboardEntry = apps.get_model('movies', 'LeaderboardEntry')
+    for genre_id in [None, *Genre.objects.values_list('pk', flat=True)]:
+        films = Film.objects.filter(rate__isnull=False)
+        if genre_id is not None:
+            films = films.filter(genres=genre_id)
+        LeaderboardEntry.objects.bulk_create([
+            LeaderboardEntry(genre_id=genre_id, film_id=film_id, rank=rank)
+            for rank, film_id in enumerate(films.order_by('-rate', 'id').values_list('pk', flat=True)[:10], start=1)
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0007_film_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Rank')),
+                ('film', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='movies.film')),
+                ('genre', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='leaderboard_entries', to='movies.genre')),
+            ],
+            options={
+                'ordering': ['genre', 'rank'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='leaderboardentry',
+            index=models.Index(fields=['genre', 'rank'], name='leaderboard_rank_idx'),
+        ),
+        migrations.RunPython(build_leaderboards, migrations.RunPython.noop),
+    ]
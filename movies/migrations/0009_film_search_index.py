@@ -0,0 +1,33 @@
+# Generated by Django 3.1.7 on 2026-10-18 01:15
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # Fulltextový index FTS5 je jen pro SQLite, ostatní databáze hledají bez něj
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE movies_film_fts USING fts5(title, plot, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO movies_film_fts (rowid, title, plot) "
+        "SELECT id, title, COALESCE(plot, '') FROM movies_film"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS movies_film_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0008_leaderboard'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
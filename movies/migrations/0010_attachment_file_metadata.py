@@ -0,0 +1,66 @@
+# Generated by Django 3.1.7 on 2026-10-18 01:16
+
+import hashlib
+import mimetypes
+
+from django.core.files.images import get_image_dimensions
+from django.db import migrations, models
+
+
+def read_file_metadata(apps, schema_editor):
+    Attachment = apps.get_model('movies', 'Attachment')
+    for attachment in Attachment.objects.exclude(file='').exclude(file__isnull=True).iterator():
+        f = attachment.file
+        content_type = mimetypes.guess_type(f.name)[0] or ''
+        width = height = None
+        try:
+            digest = hashlib.sha256()
+            with f.open('rb'):
+                for chunk in f.chunks():
+                    digest.update(chunk)
+                # rozměry jen u obrázků - Pillow by jiný soubor načetl do paměti celý
+                if attachment.type == 'image' or content_type.startswith('image/'):
+                    width, height = get_image_dimensions(f, close=False)
+        except FileNotFoundError:
+            # chybějící soubor doplní později příkaz backfill_attachment_metadata
+            continue
+        Attachment.objects.filter(pk=attachment.pk).update(
+            size_bytes=f.size, content_type=content_type,
+            width=width, height=height, sha256=digest.hexdigest(),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0009_film_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachment',
+            name='content_type',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='Content type'),
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Height'),
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='sha256',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='SHA-256'),
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='size_bytes',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='Size (bytes)'),
+        ),
+        migrations.AddField(
+            model_name='attachment',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Width'),
+        ),
+        migrations.RunPython(read_file_metadata, migrations.RunPython.noop),
+    ]
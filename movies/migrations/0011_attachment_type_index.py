@@ -0,0 +1,17 @@
+# Generated by Django 3.1.7 on 2026-10-18 01:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0010_attachment_file_metadata'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attachment',
+            index=models.Index(fields=['type'], name='attachment_type_idx'),
+        ),
+    ]
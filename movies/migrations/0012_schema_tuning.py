@@ -0,0 +1,35 @@
+# Generated by Django 3.1.7 on 2026-10-18 01:26
+
+from django.db import migrations, models
+
+GENRE_FILM_INDEX = models.Index(fields=['genre', 'film'], name='film_genres_genre_film_idx')
+
+
+def film_genres(apps):
+    return apps.get_model('movies', 'Film')._meta.get_field('genres').remote_field.through
+
+
+# SQL indexu sestaví schema editor databáze - např. MySQL maže index příkazem DROP INDEX ... ON tabulka
+def add_genre_film_index(apps, schema_editor):
+    schema_editor.add_index(film_genres(apps), GENRE_FILM_INDEX)
+
+
+def remove_genre_film_index(apps, schema_editor):
+    schema_editor.remove_index(film_genres(apps), GENRE_FILM_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0011_attachment_type_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attachment',
+            index=models.Index(fields=['film', '_order'], name='attachment_film_order_idx'),
+        ),
+        # Vazební tabulka M:N nemá vlastní Meta; krycí index (žánr, film) slouží přepočtu počtů filmů
+        # žánrů (GenreQuerySet.update_film_counts) a výběru filmů žánru bez čtení řádků tabulky
+        migrations.RunPython(add_genre_film_index, remove_genre_film_index),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.1.7 on 2026-10-18 01:31
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def fill_slugs(apps, schema_editor):
+    Genre = apps.get_model('movies', 'Genre')
+    taken = set()
+    for genre in Genre.objects.order_by('pk'):
+        base = slugify(genre.name)[:50] or 'zanr'
+        slug, number = base, 2
+        while slug in taken:
+            slug, number = f'{base}-{number}', number + 1
+        taken.add(slug)
+        Genre.objects.filter(pk=genre.pk).update(slug=slug)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0012_schema_tuning'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='genre',
+            name='slug',
+            field=models.SlugField(blank=True, default='', max_length=60, verbose_name='Slug',
+                                   help_text='Part of the genre page address, generated from the name if empty'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_slugs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.1.7 on 2026-10-18 01:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0013_genre_slug'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='genre',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=60, unique=True, verbose_name='Slug',
+                                   help_text='Part of the genre page address, generated from the name if empty'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.1.7 on 2026-10-18 01:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0016_attachment_upload'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarFilm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Rank')),
+                ('score', models.FloatField(verbose_name='Score')),
+                ('film', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_entries', to='movies.film')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='movies.film')),
+            ],
+            options={
+                'ordering': ['film', 'rank'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='similarfilm',
+            index=models.Index(fields=['film', 'rank'], name='similar_film_rank_idx'),
+        ),
+    ]
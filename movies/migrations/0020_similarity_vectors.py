@@ -0,0 +1,34 @@
+# Generated by Django 3.1.7 on 2026-10-18 02:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0019_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FilmVector',
+            fields=[
+                ('film', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='vector', serialize=False, to='movies.film')),
+                ('indices', models.BinaryField()),
+                ('values', models.BinaryField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SimilarityVocabulary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('genres', models.JSONField(default=list, verbose_name='Genres')),
+                ('terms', models.JSONField(default=list, verbose_name='Terms')),
+                ('idf', models.JSONField(default=list, verbose_name='IDF')),
+                ('decades', models.JSONField(default=list, verbose_name='Decades')),
+                ('film_count', models.PositiveIntegerField(default=0, verbose_name='Film count')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.1.7 on 2026-10-18 02:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0020_similarity_vectors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attachmentupload',
+            name='attachment',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload', to='movies.attachment'),
+        ),
+        migrations.AddField(
+            model_name='attachmentupload',
+            name='error',
+            field=models.CharField(blank=True, max_length=200, verbose_name='Error'),
+        ),
+        migrations.AlterField(
+            model_name='attachmentupload',
+            name='sha256',
+            field=models.CharField(max_length=64, verbose_name='SHA-256'),
+        ),
+    ]
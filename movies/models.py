@@ -1,7 +1,16 @@
+import hashlib
+import mimetypes
+import uuid
+
+from django.conf import settings
+from django.core.files.images import get_image_dimensions
 from django.db import models
+from django.db.models import Count, Exists, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.urls import reverse
 from django.utils.html import format_html
+from django.utils.text import slugify
 
 """ Metoda vrací cestu k uploadovaným souborů - přílohám filmů.
     Cesta má obecnou podobu: film/id-filmu/attachments/nazev-souboru.
@@ -11,9 +20,37 @@ def attachment_path(instance, filename):
     return "film/" + str(instance.film.id) + "/attachments/" + filename
 
 
+def unique_slug(name, taken):
+    """ Slug žánru odvozený z názvu (bez diakritiky a mezer, např. "dobrodružný" -> "dobrodruzny").
+        Je-li slug již v množině taken, doplní se pořadové číslo. Nový slug se do množiny přidá. """
+    base = slugify(name)[:50] or 'zanr'
+    slug, number = base, 2
+    while slug in taken:
+        slug, number = f'{base}-{number}', number + 1
+    taken.add(slug)
+    return slug
+
+
+class GenreQuerySet(models.QuerySet):
+    def update_film_counts(self):
+        """ Přepočítá denormalizovaný počet filmů u vybraných žánrů.
+            Počítá se jen nad vazební tabulkou filmů a žánrů (indexovaný sloupec genre_id). """
+        through = Genre.film_set.through
+        counts = through.objects.filter(genre=OuterRef('pk')).order_by().values('genre') \
+            .annotate(count=Count('pk')).values('count')
+        return self.update(num_films=Coalesce(Subquery(counts), 0))
+
+
 class Genre(models.Model):
     name = models.CharField(max_length=50, unique=True, verbose_name="Genre name",
                             help_text='Enter a film genre (e.g. sci-fi, comedy)')
+    # Část adresy stránky žánru (/movies/films/genres/<slug>/), při prázdné hodnotě se odvodí z názvu
+    slug = models.SlugField(max_length=60, unique=True, blank=True, verbose_name="Slug",
+                            help_text='Part of the genre page address, generated from the name if empty')
+    # Denormalizovaný počet filmů daného žánru - udržují ho signály v movies/signals.py
+    num_films = models.PositiveIntegerField(default=0, editable=False, verbose_name="Number of films")
+
+    objects = GenreQuerySet.as_manager()
 
     class Meta:
         # atribut ordering definuje upřednostňovaný způsob řazení - zde vzestupně podle pole/sloupce name
@@ -26,8 +63,57 @@ class Genre(models.Model):
         V našem případě bude objekt (žánr) reprezentován výpisem obsahu pole name """
         return self.name
 
-    def film_count(self, obj):
-        return obj.film_set.count()
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            base = slugify(self.name)[:50]
+            taken = set(Genre.objects.exclude(pk=self.pk).filter(slug__startswith=base).values_list('slug', flat=True))
+            self.slug = unique_slug(self.name, taken)
+        super().save(*args, **kwargs)
+
+    def get_absolute_url(self):
+        """ Adresa stránky s filmy žánru """
+        return reverse('film-genre', args=[self.slug])
+
+class FilmQuerySet(models.QuerySet):
+    """ Vlastní QuerySet pro model Film - sdružuje často používané dotazy výpisových stránek """
+
+    def for_listing(self, plot=False):
+        """ Připraví filmy pro výpis: žánry všech filmů se načtou jedním dotazem navíc (prefetch)
+            místo samostatného dotazu pro každý film. Pole plot se nenačítá, pokud ho šablona nezobrazuje. """
+        queryset = self.prefetch_related('genres')
+        if not plot:
+            queryset = queryset.defer('plot')
+        return queryset
+
+    def in_genre(self, genre):
+        """ Filmy žánru zadaného objektem nebo id. Poddotaz (EXISTS) čte jen vazební tabulku
+            podle jejího indexu (film_id, genre_id), tabulka žánrů se nespojuje - výpis tak prochází
+            index filmů v pořadí řazení a skončí po načtení jedné stránky bez třídění všech filmů žánru. """
+        links = Film.genres.through.objects.filter(film=OuterRef('pk'), genre=genre)
+        return self.filter(Exists(links))
+
+    def similar_to(self, film):
+        """ Filmy nejpodobnější zadanému filmu podle předpočítané tabulky SimilarFilm """
+        return self.filter(similar_to__film=film).order_by('similar_to__rank')
+
+    def top_rated(self):
+        """ Filmy seřazené sestupně podle hodnocení """
+        return self.order_by('-rate')
+
+    def newest(self):
+        """ Filmy seřazené podle data uvedení """
+        return self.order_by('release_date')
+
+    def leaderboard(self, genre=None):
+        """ Nejlépe hodnocené filmy podle předpočítaného žebříčku (model LeaderboardEntry).
+            Bez žánru vrací celkový žebříček, jinak žebříček daného žánru. """
+        if genre is None:
+            # podmínka na rank vynutí spojení INNER JOIN, jinak by isnull vybralo i filmy mimo žebříček
+            queryset = self.filter(leaderboard_entries__rank__isnull=False, leaderboard_entries__genre__isnull=True)
+        else:
+            queryset = self.filter(leaderboard_entries__genre=genre)
+        return queryset.order_by('leaderboard_entries__rank')
+
 
 class Film(models.Model):
     # Fields
@@ -56,12 +142,26 @@ class Film(models.Model):
                              verbose_name="Rate")
     # Vytvoří vztah mezi modely Film a Genre typu M:N
     genres = models.ManyToManyField(Genre, help_text='Select a genre for this film')
+    # Denormalizovaný počet a součet hlasů uživatelů (model Rating) - z nich se počítá rate,
+    # udržuje je movies/ratings.py
+    rating_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="Number of ratings")
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name="Sum of ratings")
+    # Čas poslední změny filmu nebo jeho příloh - validátor podmíněných dotazů na detail filmu
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Updated at")
+
+    objects = FilmQuerySet.as_manager()
 
     # Metadata
     class Meta:
         # Záznamy budou řazeny primárně sestupně (znaménko mínus) podle data uvedení,
         # sekundárně vzestupně podle názvu
         ordering = ["-release_date", "title"]
+        # Složené indexy pro stránkování kurzorem (movies/pagination.py) - každá stránka je průchodem rozsahu indexu
+        indexes = [
+            models.Index(fields=['-release_date', 'title', 'id'], name='film_release_keyset_idx'),
+            models.Index(fields=['release_date', 'title', 'id'], name='film_newest_keyset_idx'),
+            models.Index(fields=['-rate', 'id'], name='film_rate_keyset_idx'),
+        ]
 
     # Methods
     def __str__(self):
@@ -79,6 +179,70 @@ class Film(models.Model):
         return format_html("{} %", int(self.rate * 10))
 
 
+class LeaderboardEntry(models.Model):
+    """ Jedna pozice v předpočítaném žebříčku nejlépe hodnocených filmů.
+        Záznamy s prázdným žánrem tvoří celkový žebříček, ostatní žebříčky jednotlivých žánrů.
+        Žebříčky udržuje modul movies/leaderboards.py. """
+    genre = models.ForeignKey(Genre, on_delete=models.CASCADE, null=True, blank=True,
+                              related_name='leaderboard_entries')
+    film = models.ForeignKey(Film, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    rank = models.PositiveSmallIntegerField(verbose_name="Rank")
+
+    class Meta:
+        ordering = ["genre", "rank"]
+        indexes = [
+            models.Index(fields=['genre', 'rank'], name='leaderboard_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.genre or 'Celkově'}: {self.rank}. {self.film.title}"
+
+
+class SimilarFilm(models.Model):
+    """ Jeden z nejpodobnějších filmů k danému filmu (pořadí rank, podobnost score).
+        Tabulku počítá a udržuje modul movies/similarity.py, detail filmu z ní jen čte. """
+    film = models.ForeignKey(Film, on_delete=models.CASCADE, related_name='similar_entries')
+    similar = models.ForeignKey(Film, on_delete=models.CASCADE, related_name='similar_to')
+    rank = models.PositiveSmallIntegerField(verbose_name="Rank")
+    score = models.FloatField(verbose_name="Score")
+
+    class Meta:
+        ordering = ["film", "rank"]
+        indexes = [
+            models.Index(fields=['film', 'rank'], name='similar_film_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.film.title}: {self.rank}. {self.similar.title}"
+
+
+class SimilarityVocabulary(models.Model):
+    """ Sloupce vektorů filmů pro výpočet podobných filmů (movies/similarity.py): žánry, slova
+        slovníku TF-IDF s jejich vahou IDF a desetiletí. Drží se jediný záznam, sestavuje se znovu
+        jen při přepočtu celé tabulky podobných filmů. """
+    genres = models.JSONField(default=list, verbose_name="Genres")
+    terms = models.JSONField(default=list, verbose_name="Terms")
+    idf = models.JSONField(default=list, verbose_name="IDF")
+    decades = models.JSONField(default=list, verbose_name="Decades")
+    # počet filmů, ze kterých byl slovník sestaven
+    film_count = models.PositiveIntegerField(default=0, verbose_name="Film count")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Created at")
+
+    def __str__(self):
+        return f"Slovník podobných filmů ({len(self.terms)} slov, {self.film_count} filmů)"
+
+
+class FilmVector(models.Model):
+    """ Normalizovaný vektor filmu ve sloupcích SimilarityVocabulary, uložený řídce -
+        čísla nenulových sloupců (int32) a jejich hodnoty (float32) """
+    film = models.OneToOneField(Film, on_delete=models.CASCADE, primary_key=True, related_name='vector')
+    indices = models.BinaryField()
+    values = models.BinaryField()
+
+    def __str__(self):
+        return f"Vektor filmu {self.film_id}"
+
+
 """ Třída Attachment je modelem pro databázový objekt (tabulku), který bude obsahovat údaje o přílohách filmů """
 
 class Attachment(models.Model):
@@ -106,29 +270,167 @@ class Attachment(models.Model):
     # Parametr on_delete slouží k zajištění tzv. referenční integrity - v případě odstranění filmu
     # budou odstraněny i všechny jeho přílohy (models.CASCADE)
     film = models.ForeignKey(Film, on_delete=models.CASCADE)
+    # Údaje o souboru zjištěné jednou při uploadu (viz read_file_metadata) - výpisy pak nemusí sahat na disk
+    size_bytes = models.BigIntegerField(blank=True, null=True, editable=False, verbose_name="Size (bytes)")
+    content_type = models.CharField(max_length=100, blank=True, editable=False, verbose_name="Content type")
+    width = models.PositiveIntegerField(blank=True, null=True, editable=False, verbose_name="Width")
+    height = models.PositiveIntegerField(blank=True, null=True, editable=False, verbose_name="Height")
+    sha256 = models.CharField(max_length=64, blank=True, editable=False, verbose_name="SHA-256")
 
     # Metadata
     class Meta:
         # Primární seřazeno podle poslední aktualizace souborů, sekundárně podle typu přílohy
         # ordering = ["-last_update", "type"]
         order_with_respect_to = 'film'
+        # Index pro filtrování podle typu přílohy v administraci
+        indexes = [
+            models.Index(fields=['type'], name='attachment_type_idx'),
+            # přílohy filmu v pořadí order_with_respect_to bez dodatečného třídění
+            models.Index(fields=['film', '_order'], name='attachment_film_order_idx'),
+        ]
 
     # Methods
     def __str__(self):
         """ Textová reprezentace objektu """
         return f"{self.title}, ({self.type})"
 
+    def read_file_metadata(self, digest=True):
+        """ Zjistí velikost, typ obsahu, rozměry (u obrázků) a otisk SHA-256 souboru přílohy.
+            Funguje pro nově uploadovaný i pro již uložený soubor. S digest=False se soubor
+            nečte celý a otisk zůstane prázdný (spočítá ho úloha na pozadí, movies/tasks.py). """
+        f = self.file
+        committed = f._committed
+        self.size_bytes = f.size
+        self.content_type = mimetypes.guess_type(f.name)[0] or ''
+        sha256 = hashlib.sha256()
+        f.open('rb')
+        try:
+            if digest:
+                for chunk in f.chunks():
+                    sha256.update(chunk)
+            # Pillow by u jiného souboru než obrázku (video, zvuk) načetl do paměti celý soubor
+            if self.is_image:
+                self.width, self.height = get_image_dimensions(f, close=False)
+            else:
+                self.width = self.height = None
+            f.seek(0)
+        finally:
+            # nově uploadovaný soubor musí zůstat otevřený, aby ho šlo uložit
+            if committed:
+                f.close()
+        self.sha256 = sha256.hexdigest() if digest else ''
+
+    @property
+    def is_image(self):
+        return self.type == 'image' or self.content_type.startswith('image/')
+
     @property
     def filesize(self):
-        x = self.file.size
-        y = 512000
-        if x < y * 1000:
-            value = round(x/1024, 2)
+        x = self.size_bytes if self.size_bytes is not None else self.file.size
+        y = 1024
+        if x < y ** 2:
+            value = round(x / y, 2)
             ext = ' KB'
-        elif x < y * 1000**2:
-            value = round(x/1024*2, 2)
+        elif x < y ** 3:
+            value = round(x / y ** 2, 2)
             ext = ' MB'
         else:
-            value = round(x/1024**3, 2)
+            value = round(x / y ** 3, 2)
             ext = ' GB'
-        return str(value)+ext
\ No newline at end of file
+        return str(value)+ext
+
+
+class AttachmentUpload(models.Model):
+    """ Rozpracovaný upload přílohy po částech (movies/uploads.py). Data se zapisují přímo do cílového
+        umístění přílohy (název se sufixem .part); po přijetí posledního bajtu úloha ve frontě ověří
+        otisk SHA-256, soubor přejmenuje a vytvoří záznam Attachment. """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    film = models.ForeignKey(Film, on_delete=models.CASCADE, related_name='uploads')
+    title = models.CharField(max_length=200, verbose_name="Title")
+    type = models.CharField(max_length=5, choices=Attachment.TYPE_OF_ATTACHMENT, default='video',
+                            verbose_name="Attachment type")
+    # Cílový název souboru v úložišti médií (film/<id>/attachments/<soubor>)
+    name = models.CharField(max_length=255, verbose_name="File name")
+    size = models.BigIntegerField(verbose_name="Size (bytes)")
+    sha256 = models.CharField(max_length=64, verbose_name="SHA-256")
+    received = models.BigIntegerField(default=0, verbose_name="Received (bytes)")
+    # výsledek ověření přijatého souboru (úloha ve frontě): vytvořená příloha, nebo chyba
+    attachment = models.OneToOneField('Attachment', on_delete=models.SET_NULL, null=True, blank=True,
+                                      related_name='upload')
+    error = models.CharField(max_length=200, blank=True, verbose_name="Error")
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.received}/{self.size} B)"
+
+    @property
+    def part_name(self):
+        return self.name + '.part'
+
+
+class Rating(models.Model):
+    """ Hodnocení filmu jedním uživatelem (1 - 10). Každý uživatel hodnotí film nejvýše jednou,
+        opakovaný hlas hodnocení jen změní. Souhrnné hodnoty filmu udržuje movies/ratings.py. """
+    film = models.ForeignKey(Film, on_delete=models.CASCADE, related_name='ratings')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='film_ratings')
+    score = models.PositiveSmallIntegerField(validators=[MinValueValidator(1), MaxValueValidator(10)],
+                                             verbose_name="Score")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['film', 'user'], name='rating_film_user_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user}: {self.film.title} ({self.score})"
+
+
+class RatingDelta(models.Model):
+    """ Změna souhrnného hodnocení filmu, která ještě nebyla započtena (počet a součet hlasů).
+        Hlasy se zapisují jen sem a do Film se přičítají hromadně (movies.ratings.flush), takže
+        ani při mnoha hlasech pro jeden film se jeho řádek neaktualizuje s každým hlasem.
+        Film může být mezitím smazán, vazba proto nemá databázové omezení. """
+    film = models.ForeignKey(Film, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    count = models.IntegerField(verbose_name="Count change")
+    score = models.IntegerField(verbose_name="Sum change")
+
+    def __str__(self):
+        return f"{self.film_id}: {self.count:+d} / {self.score:+d}"
+
+
+class Job(models.Model):
+    """ Úloha ve frontě na pozadí (movies/jobs.py). Úloha je funkce zadaná cestou pro import
+        (např. movies.search.index_film) s argumenty v JSON. Čekající úloha se stejnou funkcí
+        a klíčem (typicky id filmu) smí být ve frontě jen jednou. """
+    PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+    STATUSES = ((PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed'))
+
+    task = models.CharField(max_length=200, verbose_name="Task")
+    args = models.JSONField(default=list, verbose_name="Arguments")
+    key = models.CharField(max_length=100, blank=True, verbose_name="Deduplication key")
+    status = models.CharField(max_length=7, choices=STATUSES, default=PENDING, verbose_name="Status")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Attempts")
+    run_after = models.DateTimeField(verbose_name="Run after")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # doba posledního běhu v sekundách - pro metriky fronty
+    duration = models.FloatField(null=True, blank=True, verbose_name="Duration")
+    last_error = models.TextField(blank=True, verbose_name="Last error")
+
+    class Meta:
+        ordering = ["run_after", "id"]
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_queue_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['task', 'key'], condition=Q(status='pending') & ~Q(key=''),
+                                    name='job_pending_key_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.task}({', '.join(map(repr, self.args))}) [{self.status}]"
@@ -0,0 +1,216 @@
+""" Stránkování výpisů filmů """
+import collections.abc
+import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from django.db.models import F, Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+
+class CountedPaginator(Paginator):
+    """ Paginator, kterému lze předat předem známý počet záznamů.
+        Nemusí pak nad výpisem spouštět vlastní dotaz COUNT(*). """
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.known_count = count
+
+    @cached_property
+    def count(self):
+        if self.known_count is None:
+            return super().count
+        return self.known_count
+
+
+""" Klíče pro stránkování pomocí kurzoru (keyset pagination).
+    Každý klíč je n-tice (název pole, sestupně). Poslední pole musí záznam jednoznačně určovat.
+    Hodnota NULL se řadí jako nejmenší (stejně jako v SQLite a MySQL). """
+RELEASE_KEYSET = (('release_date', True), ('title', False), ('id', False))
+NEWEST_KEYSET = (('release_date', False), ('title', False), ('id', False))
+RATE_KEYSET = (('rate', True), ('id', False))
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class KeysetPage(collections.abc.Sequence):
+    """ Stránka výpisu stránkovaného kurzorem. Kvůli kompatibilitě se značkou bootstrap_pager
+        vrací metody next_page_number a previous_page_number kurzor sousední stránky. """
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Page (keyset)>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def next_page_number(self):
+        return self.next_cursor
+
+    def previous_page_number(self):
+        return self.previous_cursor
+
+
+class KeysetPaginator:
+    """ Stránkování pomocí kurzoru. Místo OFFSET n se další stránka vybírá podmínkou
+        na hodnoty klíče posledního zobrazeného záznamu, takže je každá stránka jen
+        průchodem rozsahu indexu. Kurzor je podepsaný, takže ho nelze podvrhnout ani upravit,
+        ale není šifrovaný - hodnoty klíče (např. hodnocení a id filmu) z něj lze přečíst. """
+    is_keyset = True
+    salt = 'movies.pagination.cursor'
+
+    def __init__(self, queryset, per_page, keyset, count=None):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.keyset = keyset
+        self.known_count = count
+
+    @cached_property
+    def count(self):
+        if self.known_count is None:
+            return self.queryset.count()
+        return self.known_count
+
+    def _field(self, name):
+        return self.queryset.model._meta.get_field(name)
+
+    def encode_cursor(self, obj, backward=False):
+        """ Hodnoty klíče záznamu obj podepsané pomocí SECRET_KEY (django.core.signing). Obsah
+            kurzoru je jen zakódovaný, ne zašifrovaný - nesmí proto obsahovat nic, co je
+            v zobrazeném výpisu skryté. """
+        values = []
+        for name, descending in self.keyset:
+            value = getattr(obj, self._field(name).attname)
+            if isinstance(value, datetime.date):
+                value = value.isoformat()
+            values.append(value)
+        return signing.dumps({'k': values, 'b': int(backward)}, salt=self.salt, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            data = signing.loads(cursor, salt=self.salt)
+            if len(data['k']) != len(self.keyset):
+                raise ValueError
+            values = [None if value is None else self._field(name).to_python(value)
+                      for (name, descending), value in zip(self.keyset, data['k'])]
+            return values, bool(data['b'])
+        except (signing.BadSignature, ValidationError, KeyError, TypeError, ValueError):
+            raise InvalidCursor('Neplatný kurzor stránkování')
+
+    def _ordering(self, backward):
+        ordering = []
+        for name, descending in self.keyset:
+            if descending != backward:
+                ordering.append(F(name).desc(nulls_last=True))
+            else:
+                ordering.append(F(name).asc(nulls_first=True))
+        return ordering
+
+    def _seek(self, keyset, values, backward):
+        """ Podmínka vybírající záznamy, které ve zvoleném směru následují za hodnotami kurzoru.
+            Vrací None, pokud za kurzorem nemůže nic následovat. """
+        equal = Q()
+        condition = None
+        for (name, descending), value in zip(keyset, values):
+            if descending != backward:
+                # sestupně: následují menší hodnoty a NULL
+                after = None if value is None else Q(**{f'{name}__lt': value}) | Q(**{f'{name}__isnull': True})
+            else:
+                # vzestupně: následují větší hodnoty; NULL je nejmenší
+                after = Q(**{f'{name}__isnull': False}) if value is None else Q(**{f'{name}__gt': value})
+            if after is not None:
+                condition = equal & after if condition is None else condition | (equal & after)
+            equal &= Q(**{f'{name}__isnull': True}) if value is None else Q(**{name: value})
+        return condition
+
+    def _segments(self, values, backward):
+        """ Podmínky pro výběr záznamů za kurzorem rozdělené podle prvního klíče na úsek
+            s hodnotami a úsek s NULL. Každý úsek je pak jednoduchým rozsahem indexu
+            (podmínka s OR přes NULL by databázi donutila řadit výsledek mimo index). """
+        (name, descending), value = self.keyset[0], values[0]
+        descending = descending != backward
+        rest = self._seek(self.keyset[1:], values[1:], backward)
+        if value is None:
+            current = None if rest is None else Q(**{f'{name}__isnull': True}) & rest
+            following = None if descending else Q(**{f'{name}__isnull': False})
+        else:
+            op = 'lt' if descending else 'gt'
+            after = Q(**{f'{name}__{op}': value})
+            if rest is not None:
+                after |= Q(**{name: value}) & rest
+            # nadbytečná mez typu <= / >= určuje rozsah indexu, ve kterém databáze hledá
+            current = Q(**{f'{name}__{op}e': value}) & after
+            following = Q(**{f'{name}__isnull': True}) if descending and self._field(name).null else None
+        return [segment for segment in (current, following) if segment is not None]
+
+    def page(self, cursor=None):
+        backward = False
+        limit = self.per_page + 1
+        ordering = self._ordering(backward)
+        if cursor:
+            values, backward = self.decode_cursor(cursor)
+            ordering = self._ordering(backward)
+            rows = []
+            for segment in self._segments(values, backward):
+                rows += self.queryset.filter(segment).order_by(*ordering)[:limit - len(rows)]
+                if len(rows) >= limit:
+                    break
+        else:
+            rows = list(self.queryset.order_by(*ordering)[:limit])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backward:
+            rows.reverse()
+        if not rows:
+            return KeysetPage(rows, self)
+        next_cursor = previous_cursor = None
+        if has_more or backward:
+            next_cursor = self.encode_cursor(rows[-1])
+        if cursor and (has_more or not backward):
+            previous_cursor = self.encode_cursor(rows[0], backward=True)
+        return KeysetPage(rows, self, next_cursor, previous_cursor)
+
+
+class KeysetPaginationMixin:
+    """ Mixin pro ListView, který při nastavení MOVIES_KEYSET_PAGINATION = True
+        nahradí stránkování podle čísla stránky stránkováním pomocí kurzoru """
+    keyset = None
+    cursor_kwarg = 'cursor'
+
+    def keyset_pagination_enabled(self):
+        return self.keyset is not None and getattr(settings, 'MOVIES_KEYSET_PAGINATION', False)
+
+    def get_keyset_paginator(self, queryset, per_page):
+        return KeysetPaginator(queryset, per_page, self.keyset)
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.keyset_pagination_enabled():
+            return super().paginate_queryset(queryset, page_size)
+        paginator = self.get_keyset_paginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,158 @@
+""" Měření nákladů požadavků: počet a čas SQL dotazů, čas vykreslení šablon a opakované dotazy (N+1).
+    Middleware RequestProfilingMiddleware se zapíná nastavením MOVIES_REQUEST_PROFILING = True.
+    Dotazy se neukládají (na rozdíl od connection.queries při DEBUG = True), počítají se jen
+    součty a otisky SQL, takže měření lze nechat zapnuté i v produkci. Výsledek nese hlavička
+    Server-Timing a požadavky delší než MOVIES_SLOW_REQUEST_MS se zapisují jako JSON řádky
+    do logu 'movies.slow_requests'. """
+import asyncio
+import contextvars
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends import django as django_backend
+
+logger = logging.getLogger('movies.slow_requests')
+
+# Měření právě zpracovávaného požadavku; přenáší se i do vláken spuštěných přes sync_to_async
+current_profile = contextvars.ContextVar('movies_request_profile', default=None)
+
+# Seznam parametrů IN (%s, %s, ...) se v otisku dotazu zkracuje, aby se dotazy lišící se počtem hodnot shodovaly
+IN_LIST = re.compile(r'\((?:%s, )*%s\)')
+
+
+class RequestProfile:
+    """ Souhrnné údaje o jednom požadavku """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        """ Obal provádění dotazů (connection.execute_wrapper) """
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+            self.fingerprints[IN_LIST.sub('(...)', sql)] += 1
+
+    @property
+    def duration(self):
+        return time.perf_counter() - self.started
+
+    def duplicates(self, limit=5):
+        """ Nejčastěji opakované dotazy - typický příznak problému N+1 """
+        return [{'sql': sql, 'count': count} for sql, count in self.fingerprints.most_common(limit) if count > 1]
+
+    def server_timing(self, duration):
+        return (f'db;desc="SQL ({self.queries})";dur={self.db_time * 1000:.1f}, '
+                f'tpl;desc="Templates";dur={self.template_time * 1000:.1f}, '
+                f'total;dur={duration * 1000:.1f}')
+
+
+@contextmanager
+def instrument_queries():
+    """ Připojí měření aktuálního požadavku k databázovým připojením tohoto vlákna """
+    profile = current_profile.get()
+    with ExitStack() as stack:
+        if profile is not None:
+            for connection in connections.all():
+                if profile not in connection.execute_wrappers:
+                    stack.enter_context(connection.execute_wrapper(profile))
+        yield profile
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        profile = current_profile.get()
+        if profile is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.template_time += time.perf_counter() - start
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """ Šablonový backend, který započítává čas vykreslení šablon do měření požadavku.
+        Vložené šablony ({% include %}) se vykreslují v rámci nadřazené, počítají se tedy jen jednou. """
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return Template(template.template, self)
+
+
+class RequestProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'MOVIES_REQUEST_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'MOVIES_SLOW_REQUEST_MS', 500) / 1000
+        if asyncio.iscoroutinefunction(get_response):
+            # stejně jako django.utils.deprecation.MiddlewareMixin - Django pozná asynchronní middleware
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            with instrument_queries():
+                response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        stack = ExitStack()
+        try:
+            # synchronní view běží ve vlákně pro synchronní kód, měří se jeho připojení;
+            # dotazy asynchronních view v dalších vláknech se připojují v movies.async_views.isolated
+            await sync_to_async(stack.enter_context)(instrument_queries())
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            current_profile.reset(token)
+        return self.finish(request, response, profile)
+
+    def finish(self, request, response, profile):
+        duration = profile.duration
+        response['Server-Timing'] = profile.server_timing(duration)
+        if duration >= self.threshold:
+            match = getattr(request, 'resolver_match', None)
+            logger.warning(json.dumps({
+                'time': time.time(),
+                'method': request.method,
+                'path': request.path,
+                'view': match.view_name if match else None,
+                'status': response.status_code,
+                'duration_ms': round(duration * 1000, 1),
+                'queries': profile.queries,
+                'db_ms': round(profile.db_time * 1000, 1),
+                'template_ms': round(profile.template_time * 1000, 1),
+                'duplicates': profile.duplicates(),
+            }, ensure_ascii=False))
+        return response
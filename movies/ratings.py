@@ -0,0 +1,104 @@
+""" Hodnocení filmů uživateli. Film drží počet a součet hlasů (rating_count, rating_sum)
+    a z nich odvozené průměrné hodnocení rate; průměr se nikdy nepočítá dotazem AVG() nad hlasy.
+    Po odebrání posledního hlasu film hodnocení nemá (rate je NULL).
+    Hlas uloží záznam Rating a změnu počtu a součtu do tabulky RatingDelta. Změny se do filmů
+    přičítají úlohou ve frontě (movies/jobs.py) zařazenou nejvýše jednou za MOVIES_RATING_FLUSH_INTERVAL
+    sekund a spuštěnou po uplynutí intervalu - jeden příkaz UPDATE s výrazy F() na film za celou
+    dávku hlasů. Nezapočtené změny zpracuje i příkaz flush_ratings. """
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, FloatField, Max, Value, When
+from django.db.models.functions import Cast, Round
+from django.utils import timezone
+
+from movies import facets, jobs, leaderboards, similarity
+from movies.caching import bump_catalog_generation, get_cache
+from movies.models import Film, Rating, RatingDelta
+
+FLUSH_KEY = 'movies:ratings-flush'
+SCORES = range(1, 11)
+
+
+def flush_interval():
+    return getattr(settings, 'MOVIES_RATING_FLUSH_INTERVAL', 5)
+
+
+def vote(film_id, user, score):
+    """ Uloží hlas uživatele (nový nebo změněný) a případně započte nashromážděné hlasy """
+    with transaction.atomic():
+        rating = Rating.objects.select_for_update().filter(film_id=film_id, user=user).first()
+        if rating is None:
+            try:
+                with transaction.atomic():
+                    Rating.objects.create(film_id=film_id, user=user, score=score)
+                RatingDelta.objects.create(film_id=film_id, count=1, score=score)
+            except IntegrityError:
+                # souběžný první hlas téhož uživatele - hlas se uloží jako změna
+                rating = Rating.objects.select_for_update().get(film_id=film_id, user=user)
+        if rating is not None and rating.score != score:
+            RatingDelta.objects.create(film_id=film_id, count=0, score=score - rating.score)
+            rating.score = score
+            rating.save(update_fields=['score', 'updated_at'])
+    schedule_flush()
+
+
+def rating_deleted(rating):
+    """ Odebrání hlasu (smazání hodnocení nebo uživatele) """
+    RatingDelta.objects.create(film_id=rating.film_id, count=-1, score=-rating.score)
+    schedule_flush()
+
+
+def schedule_flush():
+    """ Zařadí započtení hlasů za MOVIES_RATING_FLUSH_INTERVAL sekund. Klíč v cache s touto
+        expirací zajistí, že během intervalu úlohu zařadí jen jeden z požadavků. """
+    interval = flush_interval()
+    if interval <= 0 or get_cache().add(FLUSH_KEY, True, interval):
+        transaction.on_commit(lambda: jobs.enqueue('movies.ratings.flush', key='flush', delay=interval))
+
+
+def flush():
+    """ Přičte nezapočtené změny hlasů k filmům. Vrací id filmů, jejichž hodnocení se změnilo. """
+    totals = defaultdict(lambda: [0, 0])
+    with transaction.atomic():
+        last = RatingDelta.objects.aggregate(last=Max('pk'))['last']
+        if last is None:
+            return []
+        pending = RatingDelta.objects.filter(pk__lte=last)
+        rows = list(pending.select_for_update().values_list('film_id', 'count', 'score'))
+        if pending.delete()[0] != len(rows):
+            # stejné změny mezitím započetl jiný proces
+            transaction.set_rollback(True)
+            return []
+        now = timezone.now()
+        for film_id, count, score in rows:
+            totals[film_id][0] += count
+            totals[film_id][1] += score
+        for film_id, (count, score) in totals.items():
+            if count or score:
+                # na pravé straně UPDATE jsou hodnoty před změnou, proto se k nim změna přičítá i v průměru
+                average = When(rating_count__gt=-count,
+                               then=Round(Cast(F('rating_sum') + score, FloatField()) * 10 /
+                                          Cast(F('rating_count') + count, FloatField())) / 10)
+                # odebrán poslední hlas - průměr hlasů, které už neexistují, nezůstane
+                cleared = [When(rating_count__lte=-count, then=Value(None))] if count < 0 else []
+                Film.objects.filter(pk=film_id).update(
+                    rating_count=F('rating_count') + count,
+                    rating_sum=F('rating_sum') + score,
+                    rate=Case(average, *cleared, default=F('rate'), output_field=FloatField()),
+                    updated_at=now,
+                )
+    film_ids = [film_id for film_id, (count, score) in totals.items() if count or score]
+    if film_ids:
+        ratings_changed(film_ids)
+    return film_ids
+
+
+def ratings_changed(film_ids):
+    """ Hromadný UPDATE neposílá signály - odvozená data se proto aktualizují zde """
+    genre_ids = set(Film.genres.through.objects.filter(film__in=film_ids).values_list('genre_id', flat=True))
+    leaderboards.films_changed(film_ids, genre_ids)
+    facets.films_changed(film_ids)
+    similarity.schedule(film_ids)
+    bump_catalog_generation()
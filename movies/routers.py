@@ -0,0 +1,160 @@
+""" Rozdělení dotazů mezi hlavní databázi (default) a repliky pro čtení (MOVIES_READ_REPLICAS).
+    Zápisy jdou vždy do hlavní databáze. Z repliky se čte jen v požadavcích GET a HEAD na čtecí
+    stránky (MOVIES_REPLICA_VIEWS - úvod, výpisy, detail filmu, API); administrace, formuláře,
+    příkazy a worker čtou z hlavní databáze.
+    Replika se za hlavní databází zpožďuje. Aby uživatel hned viděl své změny, čte jeho session
+    po odeslání formuláře (POST a další nebezpečné metody) ještě MOVIES_REPLICA_PIN_SECONDS sekund
+    z hlavní databáze; stejně tak zbytek požadavku, ve kterém se už něco zapsalo.
+
+    Součástí je i kontrola trvalých připojení (CONN_MAX_AGE) - Django 3.1 ještě nemá
+    nastavení CONN_HEALTH_CHECKS. """
+import asyncio
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Směrování právě zpracovávaného požadavku; přenáší se i do vláken spuštěných přes sync_to_async
+current_routing = contextvars.ContextVar('movies_db_routing', default=None)
+
+PIN_SESSION_KEY = '_movies_db_pinned_until'
+# Aplikace, jejichž modely se čtou vždy z hlavní databáze (session nese přihlášení i čas PIN_SESSION_KEY)
+PRIMARY_APPS = {'sessions'}
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def read_replicas():
+    return [alias for alias in getattr(settings, 'MOVIES_READ_REPLICAS', ()) if alias in settings.DATABASES]
+
+
+class RequestRouting:
+    """ Stav směrování jednoho požadavku """
+
+    def __init__(self):
+        self.replica = None     # alias repliky, ze které požadavek čte (None - hlavní databáze)
+        self.wrote = False      # požadavek už zapisoval
+        self.primary = 0        # hloubka vnoření bloků primary()
+
+    @property
+    def read_alias(self):
+        if self.replica is None or self.wrote or self.primary:
+            return DEFAULT_DB_ALIAS
+        return self.replica
+
+
+@contextmanager
+def primary():
+    """ Dotazy uvnitř bloku čtou z hlavní databáze i na čtecí stránce - pro data, která se
+        ukládají do cache bez expirace (ze zpožděné repliky by v ní zůstala stará data) """
+    routing = current_routing.get()
+    if routing is None:
+        yield
+        return
+    routing.primary += 1
+    try:
+        yield
+    finally:
+        routing.primary -= 1
+
+
+class ReadReplicaRouter:
+    """ Router databází (DATABASE_ROUTERS) """
+
+    def db_for_read(self, model, **hints):
+        routing = current_routing.get()
+        if routing is None or model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        return routing.read_alias
+
+    def db_for_write(self, model, **hints):
+        routing = current_routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # repliky obsahují stejná data jako hlavní databáze
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # repliky se nemigrují, schéma i data přebírají z hlavní databáze
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """ Označí požadavky na čtecí stránky ke čtení z repliky a po zápisu připne session
+        k hlavní databázi. Musí být v MIDDLEWARE za SessionMiddleware. Bez nastavených replik
+        se nepoužije. """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.replicas = read_replicas()
+        if not self.replicas:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.views = set(getattr(settings, 'MOVIES_REPLICA_VIEWS', ()))
+        self.pin_seconds = getattr(settings, 'MOVIES_REPLICA_PIN_SECONDS', 5)
+        if asyncio.iscoroutinefunction(get_response):
+            # stejně jako django.utils.deprecation.MiddlewareMixin - Django pozná asynchronní middleware
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = current_routing.set(RequestRouting())
+        try:
+            response = self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        if request.method not in SAFE_METHODS:
+            self.pin(request)
+        return response
+
+    async def __acall__(self, request):
+        token = current_routing.set(RequestRouting())
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_routing.reset(token)
+        if request.method not in SAFE_METHODS:
+            # zápis do session načítá session z databáze
+            await sync_to_async(self.pin)(request)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = current_routing.get()
+        match = request.resolver_match
+        if routing is None or request.method not in SAFE_METHODS or match is None:
+            return None
+        if match.url_name in self.views and not self.pinned(request):
+            routing.replica = random.choice(self.replicas)
+        return None
+
+    def pin(self, request):
+        if hasattr(request, 'session'):
+            request.session[PIN_SESSION_KEY] = time.time() + self.pin_seconds
+
+    def pinned(self, request):
+        session = getattr(request, 'session', None)
+        return session is not None and session.get(PIN_SESSION_KEY, 0) > time.time()
+
+
+def check_connections(**kwargs):
+    """ Před požadavkem ověří trvalá připojení (MOVIES_CONN_HEALTH_CHECKS) - připojení, které
+        server mezitím zavřel (restart, wait_timeout v MySQL), se zavře a první dotaz otevře nové.
+        Místo chyby při prvním dotazu požadavku tak stojí jen ping otevřeného připojení. """
+    if not getattr(settings, 'MOVIES_CONN_HEALTH_CHECKS', False):
+        return
+    for connection in connections.all():
+        if connection.connection is None or not connection.settings_dict['CONN_MAX_AGE'] \
+                or connection.in_atomic_block:
+            continue
+        if not connection.is_usable():
+            connection.close()
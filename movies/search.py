@@ -0,0 +1,131 @@
+""" Fulltextové vyhledávání filmů podle názvu a děje.
+    Na SQLite se používá index FTS5 (virtuální tabulka movies_film_fts, vytváří ji migrace 0009)
+    s tokenizérem unicode61,
+    který odstraňuje diakritiku - dotaz "hori ma panenko" tak najde film "Hoří, má panenko".
+    Index se aktualizuje signály při uložení a smazání filmu, celý ho znovu sestaví příkaz
+    rebuild_search_index. Na ostatních databázích se hledá pomalejším porovnáním icontains. """
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from movies.models import Film
+
+FTS_TABLE = 'movies_film_fts'
+# Značky zvýraznění - v textu filmu se nevyskytují, po escapování se nahradí elementem <mark>
+MARK_START, MARK_END = '\x02', '\x03'
+
+
+def is_available(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def rebuild():
+    """ Znovu naplní celý index z tabulky filmů """
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, plot) "
+            f"SELECT id, title, COALESCE(plot, '') FROM {Film._meta.db_table}"
+        )
+
+
+def index_film(pk):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [pk])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, plot) "
+            f"SELECT id, title, COALESCE(plot, '') FROM {Film._meta.db_table} WHERE id = %s", [pk]
+        )
+
+
+def remove_film(pk):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [pk])
+
+
+def match_expression(query):
+    """ Převede dotaz uživatele na výraz FTS5: všechna slova musí být nalezena, poslední
+        i jako začátek slova. Ze vstupu se berou jen slova, takže nemůže vzniknout chybný výraz. """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def highlight(text):
+    """ Escapuje text a značky zvýraznění z FTS5 nahradí elementem <mark> """
+    return mark_safe(escape(text).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+class SearchResults:
+    """ Líný seznam výsledků vyhledávání seřazených podle relevance (bm25, název má větší váhu).
+        Paginator z něj přes count() a řez načte jen jednu stránku filmů. Nalezené filmy mají
+        navíc atributy title_highlight a plot_snippet se zvýrazněnými výskyty hledaných slov. """
+
+    def __init__(self, query):
+        self.query = query
+        self.match = match_expression(query)
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            if self.match is None:
+                self._count = 0
+            elif is_available():
+                with connection.cursor() as cursor:
+                    cursor.execute(f"SELECT COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [self.match])
+                    self._count = cursor.fetchone()[0]
+            else:
+                self._count = self._fallback().count()
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        start, stop = key.start or 0, key.stop
+        if self.match is None or (stop is not None and stop <= start):
+            return []
+        if not is_available():
+            films = list(self._fallback()[start:stop])
+            for film in films:
+                film.title_highlight, film.plot_snippet = escape(film.title), None
+            return films
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, highlight({FTS_TABLE}, 0, %s, %s), "
+                f"snippet({FTS_TABLE}, 1, %s, %s, '…', 24) "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}, 10.0, 1.0) LIMIT %s OFFSET %s",
+                [MARK_START, MARK_END, MARK_START, MARK_END, self.match,
+                 -1 if stop is None else stop - start, start]
+            )
+            rows = cursor.fetchall()
+        films = Film.objects.for_listing().in_bulk([pk for pk, title, plot in rows])
+        results = []
+        for pk, title, plot in rows:
+            # index může krátce obsahovat film, který už byl smazán
+            if pk in films:
+                film = films[pk]
+                film.title_highlight, film.plot_snippet = highlight(title), highlight(plot) if plot else None
+                results.append(film)
+        return results
+
+    def _fallback(self):
+        condition = Q()
+        for word in re.findall(r'\w+', self.query):
+            condition &= Q(title__icontains=word) | Q(plot__icontains=word)
+        return Film.objects.for_listing().filter(condition)
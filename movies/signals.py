@@ -0,0 +1,143 @@
+""" Obsluha signálů modelů aplikace movies.
+    Udržuje denormalizované a cachované údaje v souladu s obsahem databáze. """
+from django.conf import settings
+from django.core.signals import request_started
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from movies import facets, images, jobs, leaderboards, ratings, routers, search, similarity
+from movies.caching import bump_catalog_generation, invalidate_film_count, invalidate_genre_menu
+from movies.models import Attachment, Film, Genre, Rating, SimilarFilm
+
+
+@receiver(post_save, sender=Film)
+@receiver(post_delete, sender=Film)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(post_save, sender=Attachment)
+@receiver(post_delete, sender=Attachment)
+@receiver(m2m_changed, sender=Film.genres.through)
+def catalog_changed(sender, **kwargs):
+    # Každá změna katalogu zneplatní cachované fragmenty a stránky
+    bump_catalog_generation()
+
+
+@receiver(post_save, sender=Film)
+def film_saved(sender, instance, created, **kwargs):
+    if created:
+        invalidate_film_count()
+    # nový film ještě nemá žánry - do žebříčků žánrů se dostane až signálem m2m_changed
+    genre_ids = [] if created else instance.genres.values_list('pk', flat=True)
+    leaderboards.films_changed([instance.pk], genre_ids)
+    facets.films_changed([instance.pk])
+    # náročnější práce běží ve frontě úloh (movies/jobs.py), požadavek jen zapíše úlohy
+    jobs.enqueue('movies.search.index_film', instance.pk, key=f'film:{instance.pk}')
+    similarity.schedule([instance.pk])
+    if instance.poster and not images.has_variants(instance.poster):
+        jobs.enqueue('movies.tasks.generate_image_variants', 'movies.Film', instance.pk, 'poster',
+                     key=f'film:{instance.pk}')
+
+
+@receiver(pre_delete, sender=Film)
+def film_deleting(sender, instance, **kwargs):
+    # Vazby na žánry zmizí spolu s filmem bez signálu m2m_changed - je třeba si je poznamenat předem
+    instance._genre_ids = list(instance.genres.values_list('pk', flat=True))
+    instance._leaderboards = leaderboards.boards_of([instance.pk])
+    # filmy, mezi jejichž podobnými filmy mazaný film je - jejich seznam se doplní
+    instance._similar_to = list(SimilarFilm.objects.filter(similar=instance).values_list('film_id', flat=True))
+
+
+@receiver(post_delete, sender=Film)
+def film_deleted(sender, instance, **kwargs):
+    invalidate_film_count()
+    search.remove_film(instance.pk)
+    facets.films_changed([instance.pk])
+    Genre.objects.filter(pk__in=getattr(instance, '_genre_ids', [])).update_film_counts()
+    for genre_id in getattr(instance, '_leaderboards', ()):
+        leaderboards.rebuild(genre_id)
+    similarity.schedule(refresh=getattr(instance, '_similar_to', ()))
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def genre_changed(sender, instance, **kwargs):
+    invalidate_genre_menu()
+
+
+@receiver(post_delete, sender=Genre)
+def genre_deleted(sender, instance, **kwargs):
+    # vazby filmů na smazaný žánr zmizí bez signálu m2m_changed
+    facets.invalidate()
+
+
+@receiver(pre_save, sender=Attachment)
+def attachment_saving(sender, instance, **kwargs):
+    # Údaje o souboru se zjistí jednou při uploadu nového souboru, otisk SHA-256 (čtení celého souboru)
+    # až ve frontě úloh. Upload po částech otisk ověřuje sám a předává ho rovnou.
+    if instance.file and (not instance.file._committed or instance.size_bytes is None):
+        instance.read_file_metadata(digest=False)
+
+
+@receiver(post_save, sender=Attachment)
+@receiver(post_delete, sender=Attachment)
+def attachment_changed(sender, instance, **kwargs):
+    # Přílohy jsou součástí detailu filmu - změna příloh mění i čas změny filmu (ETag detailu)
+    Film.objects.filter(pk=instance.film_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Attachment)
+def attachment_saved(sender, instance, **kwargs):
+    if instance.file and not instance.sha256:
+        jobs.enqueue('movies.tasks.hash_attachment', instance.pk, key=f'attachment:{instance.pk}')
+    if instance.type == 'image' and instance.file and not images.has_variants(instance.file):
+        jobs.enqueue('movies.tasks.generate_image_variants', 'movies.Attachment', instance.pk, 'file',
+                     key=f'attachment:{instance.pk}')
+
+
+@receiver(m2m_changed, sender=Film.genres.through)
+def film_genres_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # reverse=True znamená změnu z pohledu žánru (genre.film_set), pk_set pak obsahuje id filmů
+    if action == 'pre_clear':
+        instance._cleared_genre_ids = [instance.pk] if reverse else \
+            list(instance.genres.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        Genre.objects.filter(pk__in=instance._cleared_genre_ids).update_film_counts()
+        if reverse:
+            leaderboards.rebuild(instance.pk)
+            facets.invalidate()
+            jobs.enqueue('movies.similarity.rebuild', key='all')
+        else:
+            leaderboards.films_changed([instance.pk], instance._cleared_genre_ids)
+            facets.films_changed([instance.pk])
+            similarity.schedule([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        genre_ids = [instance.pk] if reverse else pk_set
+        Genre.objects.filter(pk__in=genre_ids).update_film_counts()
+        leaderboards.films_changed(pk_set if reverse else [instance.pk], genre_ids)
+        facets.films_changed(pk_set if reverse else [instance.pk])
+        similarity.schedule(pk_set if reverse else [instance.pk])
+
+
+@receiver(post_delete, sender=Rating)
+def rating_deleted(sender, instance, **kwargs):
+    # hlas smazaný v administraci nebo spolu s uživatelem se odečte ze souhrnu filmu
+    ratings.rating_deleted(instance)
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    """ Nastavení SQLite pro každé nové připojení (MOVIES_SQLITE_PRAGMAS) - typicky žurnál WAL,
+        při kterém čtení neblokuje zápis, synchronous=NORMAL a čtení souboru přes mmap """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'MOVIES_SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(request_started)
+def check_persistent_connections(sender, **kwargs):
+    # trvalé připojení (CONN_MAX_AGE), které mezitím přestalo fungovat, se před požadavkem zavře
+    routers.check_connections()
@@ -0,0 +1,315 @@
+""" Předpočítané podobné filmy pro blok "Podobné filmy" na detailu filmu.
+    Každý film je vektor složený ze žánrů, TF-IDF slov děje, desetiletí uvedení a hodnocení;
+    každá část se normalizuje zvlášť a násobí svou vahou, celý vektor má délku 1.
+    Podobnost filmů je skalární součin vektorů (kosinová podobnost). Pro každý film se uloží
+    nejpodobnějších MOVIES_SIMILAR_FILMS filmů do tabulky SimilarFilm, detail filmu ji jen čte podle indexu.
+
+    Sloupce vektorů (slovník a IDF, žánry, desetiletí) se ukládají do SimilarityVocabulary a vektory
+    filmů řídce do FilmVector. Po změně filmu (úloha ve frontě) se tak přepočítá jen vektor změněného
+    filmu, seznam změněného filmu a seznamy, ve kterých je; do ostatních seznamů se změněný film
+    jen doplní, pokud je podobnější než jejich poslední položka. Vektory se při tom čtou z databáze
+    po skupinách, v paměti je vždy jen jedna skupina.
+    Slovník se sestaví znovu (spolu s celou tabulkou) příkazem rebuild_similar_films, nebo sám,
+    když se počet filmů změní o víc než MOVIES_SIMILARITY_REFIT_RATIO nebo film dostane žánr
+    či desetiletí, pro které ve vektorech není sloupec. """
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+import numpy as np
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from movies import jobs
+from movies.models import Film, FilmVector, SimilarFilm, SimilarityVocabulary
+
+# Váhy částí vektoru filmu
+WEIGHTS = {'genres': 1.0, 'plot': 1.0, 'decade': 0.4, 'rate': 0.4}
+# Nejvyšší počet slov ve slovníku TF-IDF (nejčastější slova, která se vyskytují aspoň ve dvou dějích)
+MAX_TERMS = 2000
+MIN_TERM_LENGTH = 3
+
+
+def similar_count():
+    return getattr(settings, 'MOVIES_SIMILAR_FILMS', 6)
+
+
+def refit_ratio():
+    return getattr(settings, 'MOVIES_SIMILARITY_REFIT_RATIO', 0.1)
+
+
+def terms(text):
+    """ Slova textu malými písmeny a bez diakritiky (stejně jako fulltextový index) """
+    text = unicodedata.normalize('NFKD', (text or '').lower())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return [word for word in re.findall(r'\w+', text) if len(word) >= MIN_TERM_LENGTH and not word.isdigit()]
+
+
+def decade(release_date):
+    return None if release_date is None else release_date.year // 10
+
+
+def film_rows(films):
+    """ (id, děj, datum uvedení, hodnocení, id žánrů) filmů querysetu """
+    rows = list(films.values_list('pk', 'plot', 'release_date', 'rate'))
+    genres = defaultdict(list)
+    for film_id, genre_id in Film.genres.through.objects.filter(film__in=[row[0] for row in rows]) \
+            .values_list('film_id', 'genre_id'):
+        genres[film_id].append(genre_id)
+    return [(pk, plot, release_date, rate, genres[pk]) for pk, plot, release_date, rate in rows]
+
+
+class VectorSpace:
+    """ Sloupce vektorů filmů: žánry, slova slovníku (s vahou IDF), desetiletí a dva sloupce hodnocení """
+
+    def __init__(self, genres, terms, idf, decades, film_count, pk=None):
+        self.genres, self.terms, self.decades = list(genres), list(terms), list(decades)
+        self.idf = dict(zip(self.terms, idf))
+        self.film_count = film_count
+        self.pk = pk
+        columns = [('genre', genre_id) for genre_id in self.genres] + [('term', term) for term in self.terms] \
+            + [('decade', value) for value in self.decades]
+        self.columns = {key: column for column, key in enumerate(columns)}
+        self.rate_column = len(columns)
+        self.dimension = len(columns) + 2
+
+    @classmethod
+    def fit(cls):
+        """ Sestaví slovník a sloupce z celého katalogu - filmy se čtou postupně, drží se jen četnosti slov """
+        frequency, decades, count = Counter(), set(), 0
+        for plot, release_date in Film.objects.values_list('plot', 'release_date').iterator():
+            frequency.update(set(terms(plot)))
+            if release_date is not None:
+                decades.add(decade(release_date))
+            count += 1
+        vocabulary = [term for term, documents in frequency.most_common(MAX_TERMS) if documents > 1]
+        idf = [math.log((1 + count) / (1 + frequency[term])) + 1 for term in vocabulary]
+        genres = sorted(set(Film.genres.through.objects.values_list('genre_id', flat=True)))
+        return cls(genres, vocabulary, idf, sorted(decades), count)
+
+    @classmethod
+    def load(cls):
+        vocabulary = SimilarityVocabulary.objects.order_by('-pk').first()
+        if vocabulary is None:
+            return None
+        return cls(vocabulary.genres, vocabulary.terms, vocabulary.idf, vocabulary.decades,
+                   vocabulary.film_count, vocabulary.pk)
+
+    def save(self):
+        SimilarityVocabulary.objects.all().delete()
+        self.pk = SimilarityVocabulary.objects.create(
+            genres=self.genres, terms=self.terms, idf=[self.idf[term] for term in self.terms],
+            decades=self.decades, film_count=self.film_count,
+        ).pk
+
+    def covers(self, row):
+        """ Má film sloupce pro všechny své žánry a desetiletí? """
+        pk, plot, release_date, rate, genre_ids = row
+        return all(('genre', genre_id) in self.columns for genre_id in genre_ids) and \
+            (release_date is None or ('decade', decade(release_date)) in self.columns)
+
+    def vector(self, row):
+        """ Řídký vektor filmu: (čísla sloupců, hodnoty) """
+        pk, plot, release_date, rate, genre_ids = row
+        blocks = [
+            (WEIGHTS['genres'], {self.columns[key]: 1.0 for key in (('genre', genre_id) for genre_id in genre_ids)
+                                 if key in self.columns}),
+            # útlumená četnost slova v ději krát vzácnost slova v katalogu
+            (WEIGHTS['plot'], {self.columns[('term', term)]: (1 + math.log(count)) * self.idf[term]
+                               for term, count in Counter(terms(plot)).items() if term in self.idf}),
+            (WEIGHTS['decade'], {self.columns[key]: 1.0 for key in [('decade', decade(release_date))]
+                                 if key in self.columns}),
+            (WEIGHTS['rate'], self.rate_block(rate)),
+        ]
+        values = {}
+        for weight, block in blocks:
+            norm = math.sqrt(sum(value * value for value in block.values()))
+            for column, value in block.items():
+                if norm > 0:
+                    values[column] = weight * value / norm
+        norm = math.sqrt(sum(value * value for value in values.values()))
+        columns = sorted(column for column, value in values.items() if value)
+        return (np.array(columns, dtype=np.int32),
+                np.array([values[column] / norm for column in columns], dtype=np.float32))
+
+    def rate_block(self, rate):
+        """ Hodnocení jako jednotkový vektor pod úhlem 0 až 90° - skalární součin je kosinus
+            rozdílu úhlů, filmy s blízkým hodnocením jsou si tedy podobné """
+        if rate is None:
+            return {}
+        angle = (min(max(rate, 1.0), 10.0) - 1) / 9 * math.pi / 2
+        return {self.rate_column: math.cos(angle), self.rate_column + 1: math.sin(angle)}
+
+    def store_vectors(self, rows):
+        FilmVector.objects.filter(film__in=[row[0] for row in rows]).delete()
+        vectors = []
+        for row in rows:
+            indices, values = self.vector(row)
+            vectors.append(FilmVector(film_id=row[0], indices=indices.tobytes(), values=values.tobytes()))
+        FilmVector.objects.bulk_create(vectors)
+
+    def dense(self, rows):
+        """ Matice z uložených řídkých vektorů [(indices, values), ...] """
+        matrix = np.zeros((len(rows), self.dimension), dtype=np.float64)
+        for row, (indices, values) in enumerate(rows):
+            matrix[row, np.frombuffer(indices, dtype=np.int32)] = np.frombuffer(values, dtype=np.float32)
+        return matrix
+
+    def matrix(self, film_ids):
+        """ Id filmů, které mají vektor, a matice jejich vektorů """
+        rows = list(FilmVector.objects.filter(film__in=film_ids).order_by('pk')
+                    .values_list('film_id', 'indices', 'values'))
+        return np.array([row[0] for row in rows], dtype=np.int64), self.dense([row[1:] for row in rows])
+
+    def chunks(self, chunk_size):
+        """ Postupně všechny uložené vektory po chunk_size filmech: (id filmů, matice) """
+        last = 0
+        while True:
+            rows = list(FilmVector.objects.filter(film__gt=last).order_by('pk')
+                        .values_list('film_id', 'indices', 'values')[:chunk_size])
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield np.array([row[0] for row in rows], dtype=np.int64), self.dense([row[1:] for row in rows])
+
+
+class TopSimilar:
+    """ Nejpodobnější filmy skupiny filmů, průběžně doplňované po skupinách ostatních filmů """
+
+    def __init__(self, film_ids, matrix):
+        self.film_ids, self.matrix = film_ids, matrix
+        self.best_ids = np.zeros((len(film_ids), 0), dtype=np.int64)
+        self.best_scores = np.zeros((len(film_ids), 0), dtype=np.float64)
+
+    def add(self, other_ids, other):
+        """ Započte další skupinu filmů; vrací matici podobností skupiny s těmito filmy """
+        scores = self.matrix @ other.T
+        scores[self.film_ids[:, None] == other_ids[None, :]] = -1
+        ids = np.concatenate([self.best_ids, np.broadcast_to(other_ids, scores.shape)], axis=1)
+        merged = np.concatenate([self.best_scores, scores], axis=1)
+        # řazení podle podobnosti sestupně, při shodě podle id - výsledek nezávisí na pořadí skupin
+        order = np.lexsort((ids, -merged), axis=1)[:, :similar_count()]
+        self.best_ids = np.take_along_axis(ids, order, axis=1)
+        self.best_scores = np.take_along_axis(merged, order, axis=1)
+        return scores
+
+    def result(self):
+        """ {id filmu: [(id podobného filmu, podobnost), ...]} """
+        return {
+            film_id: [(similar_id, round(score, 6)) for similar_id, score in zip(ids, scores) if score > 0]
+            for film_id, ids, scores in zip(self.film_ids.tolist(), self.best_ids.tolist(), self.best_scores.tolist())
+        }
+
+
+def store(neighbors):
+    """ Uloží seznamy podobných filmů. Filmům, jejichž seznam se změnil, se posune čas změny,
+        aby se změnil i ETag jejich detailu. """
+    existing = {}
+    for film_id, similar_id in SimilarFilm.objects.filter(film__in=neighbors).values_list('film_id', 'similar_id'):
+        existing.setdefault(film_id, []).append(similar_id)
+    changed = [film_id for film_id, similar in neighbors.items()
+               if existing.get(film_id, []) != [similar_id for similar_id, score in similar]]
+    with transaction.atomic():
+        SimilarFilm.objects.filter(film__in=neighbors).delete()
+        SimilarFilm.objects.bulk_create([
+            SimilarFilm(film_id=film_id, similar_id=similar_id, rank=rank, score=score)
+            for film_id, similar in neighbors.items()
+            for rank, (similar_id, score) in enumerate(similar, start=1)
+        ])
+        Film.objects.filter(pk__in=changed).update(updated_at=timezone.now())
+    return changed
+
+
+def refit(chunk_size=500):
+    """ Sestaví znovu slovník a vektory všech filmů """
+    space = VectorSpace.fit()
+    with transaction.atomic():
+        space.save()
+        FilmVector.objects.all().delete()
+        last = 0
+        while True:
+            rows = film_rows(Film.objects.filter(pk__gt=last).order_by('pk')[:chunk_size])
+            if not rows:
+                break
+            space.store_vectors(rows)
+            last = rows[-1][0]
+    return space
+
+
+def rebuild(chunk_size=500, refit_vocabulary=True):
+    """ Přepočítá podobné filmy všech filmů. Podobnosti se počítají po blocích chunk_size x chunk_size
+        filmů, v paměti jsou vždy jen dvě skupiny vektorů. S refit_vocabulary=False se použijí
+        uložené vektory. Vrací počet filmů. """
+    space = None if refit_vocabulary else VectorSpace.load()
+    if space is None:
+        space = refit(chunk_size)
+    count = 0
+    for film_ids, matrix in space.chunks(chunk_size):
+        top = TopSimilar(film_ids, matrix)
+        for other_ids, other in space.chunks(chunk_size):
+            top.add(other_ids, other)
+        store(top.result())
+        count += len(film_ids)
+    return count
+
+
+def films_changed(film_ids, refresh=(), chunk_size=500):
+    """ Aktualizace po změně filmů: přepočítá se vektor a seznam změněných filmů a seznamy, ve kterých
+        změněné filmy jsou; do seznamů ostatních filmů se změněný film doplní, pokud je podobnější
+        než jejich poslední položka nebo seznam není plný.
+        Parametr refresh jsou další filmy, jejichž seznam se má přepočítat (např. po smazání filmu). """
+    space = VectorSpace.load()
+    rows = film_rows(Film.objects.filter(pk__in=film_ids))
+    if space is None or abs(Film.objects.count() - space.film_count) > refit_ratio() * space.film_count \
+            or not all(space.covers(row) for row in rows):
+        rebuild(chunk_size)
+        return
+    space.store_vectors(rows)
+    changed = {row[0] for row in rows}
+    recompute = changed | set(refresh) | set(
+        SimilarFilm.objects.filter(similar__in=film_ids).values_list('film_id', flat=True))
+    recompute_ids, matrix = space.matrix(recompute)
+    if not len(recompute_ids):
+        return
+    top = TopSimilar(recompute_ids, matrix)
+    changed_rows = np.flatnonzero(np.isin(recompute_ids, list(changed)))
+    size = similar_count()
+    candidates = defaultdict(list)
+    for other_ids, other in space.chunks(chunk_size):
+        scores = top.add(other_ids, other)[changed_rows]
+        # filmy, do jejichž seznamu může změněný film nově proniknout
+        columns = [column for column in np.flatnonzero((scores > 0).any(axis=0)).tolist()
+                   if other_ids[column] not in recompute]
+        if not columns:
+            continue
+        worst = {film_id: (count, score) for film_id, count, score in
+                 SimilarFilm.objects.filter(film__in=other_ids[columns].tolist()).order_by().values('film')
+                 .annotate(count=Count('pk'), score=Min('score')).values_list('film', 'count', 'score')}
+        for column in columns:
+            film_id = int(other_ids[column])
+            count, lowest = worst.get(film_id, (0, 0))
+            for row, score in zip(recompute_ids[changed_rows].tolist(), scores[:, column].tolist()):
+                if score > 0 and (count < size or round(score, 6) > lowest):
+                    candidates[film_id].append((row, round(score, 6)))
+    neighbors = top.result()
+    existing = defaultdict(list)
+    for film_id, similar_id, score in SimilarFilm.objects.filter(film__in=candidates) \
+            .values_list('film_id', 'similar_id', 'score'):
+        existing[film_id].append((similar_id, score))
+    for film_id, additions in candidates.items():
+        merged = sorted(existing[film_id] + additions, key=lambda item: (-item[1], item[0]))
+        neighbors[film_id] = merged[:size]
+    store(neighbors)
+
+
+def schedule(film_ids=(), refresh=()):
+    """ Zařadí aktualizaci po změně filmů do fronty úloh - pro každý film zvlášť, takže se
+        opakované změny téhož filmu před zpracováním úlohy sloučí do jednoho přepočtu """
+    for pk in film_ids:
+        jobs.enqueue('movies.similarity.films_changed', [pk], key=f'film:{pk}')
+    if refresh:
+        jobs.enqueue('movies.similarity.films_changed', [], list(refresh))
@@ -0,0 +1,25 @@
+""" Úlohy pro frontu na pozadí (movies/jobs.py), které pracují s uloženými objekty.
+    Argumenty úloh jsou jen id a názvy, objekty se načtou až při provedení úlohy -
+    mezitím mohly být změněny nebo smazány. """
+from django.apps import apps
+
+from movies import images
+from movies.models import Attachment
+
+
+def generate_image_variants(model, pk, field):
+    """ Varianty obrázku v poli field objektu modelu model (např. movies.Film, poster). Rozhoduje
+        stav úložiště, ne cache - existující varianty se znovu nevytvářejí. """
+    instance = apps.get_model(model).objects.filter(pk=pk).only(field).first()
+    field_file = getattr(instance, field, None)
+    if field_file and images.missing_variants(field_file):
+        images.generate_variants(field_file)
+
+
+def hash_attachment(pk):
+    """ Dopočítá otisk SHA-256 souboru přílohy (ostatní údaje o souboru se zjistí už při uložení) """
+    attachment = Attachment.objects.filter(pk=pk).first()
+    if attachment is None or not attachment.file or not attachment.file.storage.exists(attachment.file.name):
+        return
+    attachment.read_file_metadata()
+    Attachment.objects.filter(pk=pk, file=attachment.file.name).update(sha256=attachment.sha256)
@@ -0,0 +1,24 @@
+from django import template
+
+from movies import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def image_srcset(field_file, extension='jpg'):
+    """ Atribut srcset se zmenšenými variantami obrázku, např. {% image_srcset film.poster 'webp' %} """
+    return images.srcset(field_file, extension)
+
+
+@register.inclusion_tag('blocks/responsive_image.html')
+def responsive_image(field_file, alt='', css_class='img-fluid', sizes='100vw'):
+    """ Element <picture> s variantami WebP a JPEG; prohlížeč si vybere nejmenší dostatečnou """
+    return {
+        'src': field_file.url,
+        'webp_srcset': images.srcset(field_file, 'webp'),
+        'jpeg_srcset': images.srcset(field_file, 'jpg'),
+        'alt': alt,
+        'css_class': css_class,
+        'sizes': sizes,
+    }
@@ -1,3 +1,1293 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from PIL import Image as PILImage
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.models import Session
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.models import F
+from django.http import Http404
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from hildaweb import serving, storage
+from movies import (async_urls, async_views, facets, images, jobs, leaderboards, profiling, ratings, routers,
+                    search, signals, similarity, tasks, uploads)
+from movies.benchmarks import data as benchmark_data, runner as benchmark_runner, scenarios as benchmark_scenarios
+from movies.caching import catalog_generation, film_count, get_cache
+from movies.context_processors import genres
+from movies.models import (Attachment, AttachmentUpload, Film, FilmVector, Genre, Job, LeaderboardEntry, Rating,
+                           RatingDelta, SimilarFilm, SimilarityVocabulary)
+from movies.pagination import KeysetPaginator, NEWEST_KEYSET, RATE_KEYSET, RELEASE_KEYSET
+
+
+def create_films(count, genres=()):
+    """ Pomocná funkce pro testy - vytvoří zadaný počet filmů a přiřadí jim žánry """
+    last_pk = Film.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    Film.objects.bulk_create([
+        Film(title=f"Film {last_pk + i:05d}", plot=f"Děj filmu číslo {last_pk + i}",
+             release_date=datetime.date(1950, 1, 1) + datetime.timedelta(days=last_pk + i),
+             runtime=90 + i % 60, rate=1 + (i % 90) / 10)
+        for i in range(count)
+    ])
+    # SQLite nevrací z bulk_create primární klíče, proto se nové filmy dohledají
+    films = list(Film.objects.filter(pk__gt=last_pk))
+    through = Film.genres.through
+    through.objects.bulk_create([
+        through(film_id=film.pk, genre_id=genre.pk) for film in films for genre in genres
+    ])
+    return films
+
+
+class FilmListingQueryTests(TestCase):
+    """ Počet SQL dotazů výpisových stránek nesmí záviset na počtu zobrazených filmů """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.genres = [Genre.objects.create(name=name) for name in ('sci-fi', 'komedie', 'drama')]
+        create_films(60, cls.genres)
+
+    def setUp(self):
+        get_cache().clear()
+
+    def count_queries(self, url, warm=True, **params):
+        # první požadavek naplní cache, měří se až ustálený stav
+        if warm:
+            self.client.get(url, params)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_film_list_query_count_does_not_depend_on_page_size(self):
+        from movies.views import FilmListView
+        counts = set()
+        for page_size in (1, 3, 30):
+            FilmListView.paginate_by = page_size
+            try:
+                counts.add(self.count_queries(reverse('films')))
+            finally:
+                FilmListView.paginate_by = 3
+        self.assertEqual(len(counts), 1)
+
+    def test_genre_list_query_count_does_not_depend_on_catalog_size(self):
+        url = reverse('film-genre', args=['sci-fi'])
+        before = self.count_queries(url)
+        create_films(60, self.genres)
+        self.assertEqual(self.count_queries(url), before)
+
+    def test_index_query_count_does_not_depend_on_catalog_size(self):
+        # měří se vykreslení bez cache stránky a fragmentů
+        before = self.count_queries(reverse('index'), warm=False)
+        get_cache().clear()
+        create_films(60, self.genres)
+        self.assertEqual(self.count_queries(reverse('index'), warm=False), before)
+
+    def test_listing_defers_plot(self):
+        film = Film.objects.for_listing().first()
+        self.assertIn('plot', film.get_deferred_fields())
+        film = Film.objects.for_listing(plot=True).first()
+        self.assertNotIn('plot', film.get_deferred_fields())
+
+
+class FilmCountTests(TestCase):
+    """ Počty filmů ve výpisech se čtou z počítadel udržovaných signály """
+
+    def setUp(self):
+        get_cache().clear()
+        self.scifi = Genre.objects.create(name='sci-fi')
+        self.comedy = Genre.objects.create(name='komedie')
+
+    def test_genre_counts_follow_m2m_changes(self):
+        film = Film.objects.create(title='Vetřelec', release_date=datetime.date(1979, 5, 25))
+        film.genres.add(self.scifi, self.comedy)
+        self.assertEqual(Genre.objects.get(pk=self.scifi.pk).num_films, 1)
+        film.genres.remove(self.comedy)
+        self.assertEqual(Genre.objects.get(pk=self.comedy.pk).num_films, 0)
+        self.scifi.film_set.clear()
+        self.assertEqual(Genre.objects.get(pk=self.scifi.pk).num_films, 0)
+        self.comedy.film_set.add(film)
+        self.assertEqual(Genre.objects.get(pk=self.comedy.pk).num_films, 1)
+        film.delete()
+        self.assertEqual(Genre.objects.get(pk=self.comedy.pk).num_films, 0)
+
+    def test_global_count_is_invalidated(self):
+        self.assertEqual(film_count(), 0)
+        film = Film.objects.create(title='Vetřelec', release_date=datetime.date(1979, 5, 25))
+        self.assertEqual(film_count(), 1)
+        film.delete()
+        self.assertEqual(film_count(), 0)
+
+    def test_listing_pages_do_not_count_rows(self):
+        create_films(5, [self.scifi])
+        Genre.objects.all().update_film_counts()
+        for url in (reverse('films'), reverse('film-genre', args=['sci-fi'])):
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.context['num_films'], 5)
+            self.assertFalse([q for q in queries if 'COUNT(' in q['sql']])
+
+
+
+class GenreSlugTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.adventure = Genre.objects.create(name='dobrodružný')
+        create_films(4, [self.adventure])
+        Genre.objects.update_film_counts()
+
+    def test_slug_is_generated_without_diacritics(self):
+        self.assertEqual(self.adventure.slug, 'dobrodruzny')
+        self.assertEqual(Genre.objects.create(name='Dobrodružný').slug, 'dobrodruzny-2')
+        self.assertEqual(self.adventure.get_absolute_url(), '/movies/films/genres/dobrodruzny/')
+
+    def test_name_urls_redirect_to_slug(self):
+        response = self.client.get('/movies/films/genres/dobrodružný/', {'page': 2})
+        self.assertEqual(response.status_code, 301)
+        self.assertEqual(response['Location'], '/movies/films/genres/dobrodruzny/?page=2')
+        self.assertEqual(self.client.get('/movies/films/genres/neexistuje/').status_code, 404)
+
+    def test_genre_page_does_not_join_genres(self):
+        url = self.adventure.get_absolute_url()
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.context['num_films'], 4)
+        film_queries = [q['sql'] for q in queries if 'FROM "movies_film"' in q['sql']]
+        self.assertTrue(film_queries)
+        self.assertFalse([sql for sql in film_queries if '"movies_genre"' in sql.split('FROM', 1)[1].split('ORDER BY')[0]])
+
+    def test_renamed_genre_updates_slug_map(self):
+        self.client.get(self.adventure.get_absolute_url())
+        self.adventure.slug = 'dobrodruzne'
+        self.adventure.save()
+        self.assertEqual(self.client.get('/movies/films/genres/dobrodruzne/').status_code, 200)
+        self.assertEqual(self.client.get('/movies/films/genres/dobrodruzny/').status_code, 404)
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        films = create_films(10)
+        # filmy se stejným datem i bez data a hodnocení prověří řazení podle dalších klíčů a hodnoty NULL
+        Film.objects.filter(pk__in=[film.pk for film in films[:3]]) \
+            .update(release_date=datetime.date(2000, 1, 1), title='Stejný')
+        Film.objects.filter(pk__in=[film.pk for film in films[3:5]]).update(release_date=None, rate=None)
+
+    def walk(self, keyset, ordering):
+        queryset = Film.objects.all()
+        expected = list(queryset.order_by(*ordering).values_list('pk', flat=True))
+        paginator = KeysetPaginator(queryset, 3, keyset)
+        page, pages = paginator.page(), []
+        while True:
+            pages.append([film.pk for film in page])
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_page_number())
+        self.assertEqual(sum(pages, []), expected)
+        # cesta zpět musí projít stejné stránky v opačném pořadí
+        for previous in reversed(pages[:-1]):
+            page = paginator.page(page.previous_page_number())
+            self.assertEqual([film.pk for film in page], previous)
+        self.assertFalse(page.has_previous())
+
+    def test_release_keyset_matches_offset_ordering(self):
+        self.walk(RELEASE_KEYSET, [F('release_date').desc(nulls_last=True), 'title', 'id'])
+
+    def test_newest_keyset_matches_offset_ordering(self):
+        self.walk(NEWEST_KEYSET, [F('release_date').asc(nulls_first=True), 'title', 'id'])
+
+    def test_rate_keyset_matches_offset_ordering(self):
+        self.walk(RATE_KEYSET, [F('rate').desc(nulls_last=True), 'id'])
+
+    def test_tampered_cursor_is_rejected(self):
+        cursor = KeysetPaginator(Film.objects.all(), 3, RELEASE_KEYSET).page().next_page_number()
+        with override_settings(MOVIES_KEYSET_PAGINATION=True):
+            response = self.client.get(reverse('films'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.context['page_obj'].has_previous())
+            response = self.client.get(reverse('films'), {'cursor': cursor[:-2] + 'xx'})
+            self.assertEqual(response.status_code, 404)
+
+
+class GenreMenuTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        Genre.objects.create(name='sci-fi')
+        self.request = RequestFactory().get('/')
+
+    def test_menu_is_lazy_and_cached(self):
+        with self.assertNumQueries(0):
+            menu = genres(self.request)['genres']
+        with self.assertNumQueries(1):
+            self.assertEqual([genre.name for genre in menu], ['sci-fi'])
+        # další požadavek už dostane menu z cache
+        with self.assertNumQueries(0):
+            self.assertEqual(len(genres(RequestFactory().get('/'))['genres']), 1)
+
+    def test_menu_is_shared_within_request(self):
+        self.assertIs(genres(self.request)['genres'], genres(self.request)['genres'])
+
+    def test_menu_is_rebuilt_after_genre_change(self):
+        list(genres(self.request)['genres'])
+        genre = Genre.objects.create(name='komedie')
+        self.assertEqual(len(genres(RequestFactory().get('/'))['genres']), 2)
+        genre.delete()
+        self.assertEqual(len(genres(RequestFactory().get('/'))['genres']), 1)
+
+
+class HomepageCacheTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        self.genre = Genre.objects.create(name='sci-fi')
+        create_films(3, [self.genre])
+
+    def test_anonymous_visitors_get_cached_page(self):
+        self.client.get(reverse('index'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Cookie', response['Vary'])
+
+    def test_catalog_change_invalidates_page(self):
+        self.client.get(reverse('index'))
+        generation = catalog_generation()
+        Film.objects.create(title='Nový film', release_date=datetime.date(2030, 1, 1), rate=10)
+        self.assertGreater(catalog_generation(), generation)
+        self.assertContains(self.client.get(reverse('index')), 'Nový film', count=2)
+
+    def test_logged_in_users_are_not_served_cached_page(self):
+        self.client.get(reverse('index'))
+        user = User.objects.create_user('hilda', password='heslo')
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('index'))
+        self.assertTrue(queries)
+        self.assertIn('Cookie', response['Vary'])
+
+
+class LeaderboardTests(TestCase):
+
+    def setUp(self):
+        self.scifi = Genre.objects.create(name='sci-fi')
+        self.comedy = Genre.objects.create(name='komedie')
+        self.films = create_films(15, [self.scifi])
+        leaderboards.rebuild_all()
+
+    def assertBoard(self, genre=None):
+        films = Film.objects.filter(rate__isnull=False)
+        if genre is not None:
+            films = films.filter(genres=genre)
+        expected = list(films.order_by('-rate', 'id').values_list('pk', flat=True)[:10])
+        self.assertEqual(list(Film.objects.leaderboard(genre).values_list('pk', flat=True)), expected)
+
+    def test_rebuild(self):
+        self.assertBoard()
+        self.assertBoard(self.scifi)
+        self.assertBoard(self.comedy)
+
+    def test_rate_change_updates_boards(self):
+        film = self.films[0]
+        film.rate = 10
+        film.save()
+        self.assertEqual(Film.objects.leaderboard().first(), film)
+        self.assertBoard(self.scifi)
+        film.rate = 1
+        film.save()
+        self.assertBoard()
+        self.assertBoard(self.scifi)
+
+    def test_genre_change_updates_boards(self):
+        film = Film.objects.leaderboard(self.scifi).first()
+        film.genres.set([self.comedy])
+        self.assertBoard(self.scifi)
+        self.assertBoard(self.comedy)
+        self.comedy.film_set.clear()
+        self.assertBoard(self.comedy)
+
+    def test_delete_refills_boards(self):
+        Film.objects.leaderboard().first().delete()
+        self.assertBoard()
+        self.assertBoard(self.scifi)
+
+    def test_top_ten_is_read_from_board(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(len(Film.objects.leaderboard()[:10]), 10)
+
+
+class FilmSearchTests(TestCase):
+
+    def setUp(self):
+        self.film = Film.objects.create(title='Hoří, má panenko', release_date=datetime.date(1967, 12, 15),
+                                        plot='Hasičský bál v malém městě se vymkne kontrole.')
+        Film.objects.create(title='Vetřelec', release_date=datetime.date(1979, 5, 25),
+                            plot='Posádka vesmírné lodi Nostromo narazí na <neznámý> organismus.')
+
+    def search(self, q):
+        return self.client.get(reverse('film-search'), {'q': q})
+
+    def test_diacritics_are_folded(self):
+        for q in ('hori ma panenko', 'HOŘÍ', 'hasicsky bal', 'pane'):
+            response = self.search(q)
+            self.assertEqual([film.pk for film in response.context['films_list']], [self.film.pk], q)
+
+    def test_results_are_highlighted_and_escaped(self):
+        response = self.search('organismus')
+        self.assertContains(response, '<mark>organismus</mark>')
+        self.assertContains(response, '&lt;neznámý&gt;')
+
+    def test_index_follows_saves_and_deletes(self):
+        self.film.title = 'Requiem pro panenku'
+        self.film.save()
+        self.assertEqual(self.search('hori').context['num_films'], 0)
+        self.assertEqual(self.search('requiem').context['num_films'], 1)
+        self.film.delete()
+        self.assertEqual(self.search('requiem').context['num_films'], 0)
+
+    def test_query_syntax_is_not_passed_through(self):
+        self.assertEqual(self.search('xyz" NOT (*').context['num_films'], 0)
+        self.assertEqual(self.search('').status_code, 200)
+
+
+class FacetTests(TransactionTestCase):
+    """ Žurnál změn se zapisuje po potvrzení transakce, data proto musí být potvrzená (TransactionTestCase) """
+
+    def setUp(self):
+        get_cache().clear()
+        self.drama = Genre.objects.create(name='drama')
+        self.krimi = Genre.objects.create(name='krimi')
+        self.films = [
+            Film.objects.create(title='Obecná škola', release_date=datetime.date(1991, 1, 1), rate=8.4, runtime=100),
+            Film.objects.create(title='Pelíšky', release_date=datetime.date(1999, 1, 1), rate=9.0, runtime=115),
+            Film.objects.create(title='Vrchní, prchni!', release_date=datetime.date(1981, 1, 1), rate=7.5, runtime=87),
+            Film.objects.create(title='Bez data', rate=None, runtime=None),
+        ]
+        self.films[0].genres.set([self.drama])
+        self.films[1].genres.set([self.drama, self.krimi])
+        self.films[2].genres.set([self.krimi])
+
+    def browse(self, **params):
+        return self.client.get(reverse('film-browse'), params)
+
+    def titles(self, response):
+        return [film.title for film in response.context['films_list']]
+
+    def test_combined_filters_and_counts(self):
+        self.assertEqual(self.titles(self.browse()), ['Pelíšky', 'Obecná škola', 'Vrchní, prchni!', 'Bez data'])
+        self.assertEqual(self.titles(self.browse(genre=['drama', 'krimi'])),
+                         ['Pelíšky', 'Obecná škola', 'Vrchní, prchni!'])
+        response = self.browse(genre=['drama', 'krimi'], match='all')
+        self.assertEqual(self.titles(response), ['Pelíšky'])
+        self.assertEqual(self.titles(self.browse(decade='1990', rate_min='9')), ['Pelíšky'])
+        response = self.browse(genre='krimi', runtime='short')
+        self.assertEqual(self.titles(response), ['Vrchní, prchni!'])
+        # počet u hodnoty fasety započítává výběr ostatních faset, ne vlastní
+        runtimes = {value: count for value, label, count, checked in response.context['facets']['runtime']}
+        self.assertEqual(runtimes, {'short': 1, 'medium': 1, 'long': 0, 'epic': 0})
+        genres = {value: count for value, label, count, checked in response.context['facets']['genre']}
+        self.assertEqual(genres, {'drama': 0, 'krimi': 1})
+
+    def test_index_is_updated_incrementally(self):
+        self.browse()
+        index = facets._index
+        self.films[3].release_date, self.films[3].rate = datetime.date(2001, 1, 1), 6.0
+        self.films[3].save()
+        self.films[3].genres.add(self.drama)
+        self.films[0].delete()
+        response = self.browse(genre='drama', decade='2000')
+        self.assertIs(facets._index, index)
+        self.assertEqual(self.titles(response), ['Bez data'])
+        self.assertEqual(self.titles(self.browse(genre='drama')), ['Bez data', 'Pelíšky'])
+        # smazání žánru znamená nové sestavení indexu
+        self.krimi.delete()
+        self.assertEqual(self.browse(genre='krimi').context['num_films'], 3)
+        self.assertIsNot(facets._index, index)
+
+    def test_counts_are_computed_in_memory(self):
+        self.browse()
+        query = facets.FacetQuery(genres=[self.drama.pk], rate_min=8)
+        with self.assertNumQueries(0):
+            results = facets.search(query)
+            self.assertEqual(results.count(), 2)
+            self.assertEqual(results.counts['genre'][self.krimi.pk], 1)
+        with self.assertNumQueries(2):
+            self.assertEqual([film.title for film in results[1:2]], ['Obecná škola'])
+
+
+@override_settings(MOVIES_SIMILAR_FILMS=2)
+class SimilarFilmTests(TestCase):
+
+    def setUp(self):
+        self.drama, self.scifi = Genre.objects.create(name='drama'), Genre.objects.create(name='sci-fi')
+        self.films = {}
+        for title, genre, year, rate, plot in (
+            ('Hoří, má panenko', self.drama, 1967, 8.0, 'Hasiči pořádají bál, tombola zmizí a hasiči hledají zloděje.'),
+            ('Vesničko má středisková', self.drama, 1985, 8.5, 'Vesnice, hasiči a bál v malém družstvu.'),
+            ('Obecná škola', self.drama, 1991, 8.4, 'Nový učitel přijde do třídy po válce.'),
+            ('Vetřelec', self.scifi, 1979, 8.5, 'Posádka vesmírné lodi narazí na vetřelce.'),
+            ('Návrat Vetřelce', self.scifi, 1986, 8.2, 'Posádka vesmírné lodi a mariňáci proti vetřelcům.'),
+        ):
+            film = Film.objects.create(title=title, release_date=datetime.date(year, 1, 1), rate=rate, plot=plot)
+            film.genres.add(genre)
+            self.films[title] = film
+
+    def similar(self, title):
+        return [film.title for film in Film.objects.similar_to(self.films[title])]
+
+    def test_nearest_films(self):
+        self.assertEqual(self.similar('Hoří, má panenko'), ['Vesničko má středisková', 'Obecná škola'])
+        self.assertEqual(self.similar('Vetřelec')[0], 'Návrat Vetřelce')
+
+    def test_incremental_update_matches_rebuild(self):
+        vocabulary = SimilarityVocabulary.objects.get()
+        with override_settings(MOVIES_SIMILARITY_REFIT_RATIO=1.0):
+            film = self.films['Obecná škola']
+            film.genres.set([self.scifi])
+            self.assertNotIn('Obecná škola', self.similar('Vesničko má středisková'))
+            self.films['Návrat Vetřelce'].delete()
+            self.assertEqual(len(self.similar('Vetřelec')), 2)
+        # změny filmů nesestavují slovník znovu, přepočítají se jen dotčené vektory a seznamy
+        self.assertEqual(SimilarityVocabulary.objects.get().pk, vocabulary.pk)
+        incremental = list(SimilarFilm.objects.values_list('film', 'similar', 'rank'))
+        similarity.rebuild(chunk_size=2, refit_vocabulary=False)
+        self.assertEqual(list(SimilarFilm.objects.values_list('film', 'similar', 'rank')), incremental)
+        call_command('rebuild_similar_films', chunk_size=2, stdout=io.StringIO())
+        self.assertNotEqual(SimilarityVocabulary.objects.get().pk, vocabulary.pk)
+        self.assertEqual(FilmVector.objects.count(), 4)
+
+    def test_detail_reads_precomputed_table(self):
+        film = self.films['Vetřelec']
+        response = self.client.get(film.get_absolute_url())
+        self.assertContains(response, 'Podobné filmy')
+        self.assertEqual([f.title for f in response.context['similar_films']], self.similar('Vetřelec'))
+        space = similarity.VectorSpace.load()
+        film_ids, matrix = space.matrix(Film.objects.values('pk'))
+        # vektory mají délku 1 - skalární součin je kosinová podobnost
+        self.assertEqual(len(film_ids), len(self.films))
+        self.assertTrue(all(abs(float(norm) - 1) < 1e-5 for norm in (matrix ** 2).sum(axis=1)))
+
+
+class RatingTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        self.film = Film.objects.create(title='Pelíšky', release_date=datetime.date(1999, 1, 1), rate=5.0)
+        self.users = [User.objects.create_user(f'divak{i}', password='heslo') for i in range(3)]
+
+    def test_votes_update_aggregates_in_batches(self):
+        for user, score in zip(self.users, (8, 9, 10)):
+            ratings.vote(self.film.pk, user, score)
+        ratings.vote(self.film.pk, self.users[0], 7)
+        self.film.refresh_from_db()
+        self.assertEqual((self.film.rating_count, self.film.rate), (0, 5.0))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(ratings.flush(), [self.film.pk])
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "movies_film"')]
+        self.assertEqual(len(updates), 1)
+        self.assertFalse(any('AVG(' in q['sql'] for q in queries))
+        self.film.refresh_from_db()
+        self.assertEqual((self.film.rating_count, self.film.rating_sum, self.film.rate), (3, 26, 8.7))
+        self.assertFalse(RatingDelta.objects.exists())
+
+    def test_deleted_votes_are_subtracted(self):
+        ratings.vote(self.film.pk, self.users[0], 4)
+        ratings.vote(self.film.pk, self.users[1], 6)
+        ratings.flush()
+        self.users[1].delete()
+        ratings.flush()
+        self.film.refresh_from_db()
+        self.assertEqual((self.film.rating_count, self.film.rate), (1, 4.0))
+        Rating.objects.all().delete()
+        ratings.flush()
+        self.film.refresh_from_db()
+        # bez hlasů film hodnocení nemá
+        self.assertEqual((self.film.rating_count, self.film.rating_sum, self.film.rate), (0, 0, None))
+
+    def test_vote_then_delete_clears_rate(self):
+        ratings.vote(self.film.pk, self.users[0], 9)
+        ratings.flush()
+        self.film.refresh_from_db()
+        self.assertEqual(self.film.rate, 9.0)
+        Rating.objects.get().delete()
+        self.assertEqual(ratings.flush(), [self.film.pk])
+        self.film.refresh_from_db()
+        self.assertEqual((self.film.rating_count, self.film.rating_sum, self.film.rate), (0, 0, None))
+        self.assertFalse(LeaderboardEntry.objects.filter(film=self.film).exists())
+
+    def test_admin_cannot_edit_rate_computed_from_votes(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'heslo'))
+        url = reverse('admin:movies_film_change', args=[self.film.pk])
+        self.assertContains(self.client.get(url), 'name="rate"')
+        Film.objects.filter(pk=self.film.pk).update(rating_count=1, rating_sum=9, rate=9.0)
+        self.assertNotContains(self.client.get(url), 'name="rate"')
+        genre = Genre.objects.create(name='komedie')
+        response = self.client.post(url, {'title': 'Pelíšky (1999)', 'release_date': '1999-01-01', 'rate': 2.0,
+                                          'genres': [genre.pk], 'runtime': '', 'plot': ''})
+        self.assertEqual(response.status_code, 302)
+        self.film.refresh_from_db()
+        self.assertEqual((self.film.title, self.film.rate), ('Pelíšky (1999)', 9.0))
+
+    def test_rate_view(self):
+        url = reverse('film-rate', args=[self.film.pk])
+        self.assertRedirects(self.client.post(url, {'score': 9}), f"{reverse('login')}?next={url}",
+                             fetch_redirect_response=False)
+        self.client.force_login(self.users[0])
+        detail = self.client.get(self.film.get_absolute_url())
+        self.assertContains(detail, 'Hodnotit')
+        self.assertRedirects(self.client.post(url, {'score': 9}), self.film.get_absolute_url(),
+                             fetch_redirect_response=False)
+        self.assertEqual(Rating.objects.get().score, 9)
+        # hlas mění ETag detailu, aby se uživateli nevrátila stránka s předchozím hlasem
+        response = self.client.get(self.film.get_absolute_url(), HTTP_IF_NONE_MATCH=detail['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.post(url, {'score': 11}).status_code, 302)
+        self.assertEqual(Rating.objects.get().score, 9)
+
+
+FLAKY_CALLS = []
+
+
+def flaky_task(name, failures):
+    """ Testovací úloha, která prvních failures volání selže """
+    FLAKY_CALLS.append(name)
+    if FLAKY_CALLS.count(name) <= failures:
+        raise RuntimeError(f'{name} selhala')
+
+
+@override_settings(MOVIES_JOBS_EAGER=False, MOVIES_JOBS_RETRY_DELAY=0, MOVIES_JOBS_MAX_ATTEMPTS=3)
+class JobQueueTests(TransactionTestCase):
+    """ Worker provádí úlohy v jiných vláknech, data proto musí být potvrzená (TransactionTestCase).
+        Testovací databáze je v paměti, proto se místo procesů používají vlákna. """
+
+    def setUp(self):
+        get_cache().clear()
+        FLAKY_CALLS.clear()
+
+    def run_worker(self, processes=2):
+        with self.assertLogs('movies.jobs', 'INFO') as logs:
+            jobs.run_worker(processes=processes, poll=0.01, once=True, executor=ThreadPoolExecutor)
+        return logs.output
+
+    def test_saving_film_only_enqueues_jobs(self):
+        film = Film.objects.create(title='Vetřelec', release_date=datetime.date(1979, 5, 25))
+        film.title = 'Vetřelec (režisérská verze)'
+        film.save()
+        pending = Job.objects.filter(status=Job.PENDING)
+        # opakovaná změna téhož filmu se sloučí do jedné čekající úlohy
+        self.assertEqual(sorted(pending.values_list('task', flat=True)),
+                         ['movies.search.index_film', 'movies.similarity.films_changed'])
+        self.assertEqual(search.SearchResults('rezisersk').count(), 0)
+        # obě úlohy zapisují v transakci; sdílená databáze v paměti souběžné zápisy z vláken
+        # nečeká (database table is locked), proto se provedou postupně
+        self.run_worker(processes=1)
+        self.assertEqual(search.SearchResults('rezisersk').count(), 1)
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 2)
+        self.assertIsNotNone(jobs.enqueue('movies.search.index_film', film.pk, key=f'film:{film.pk}'))
+
+    def test_retries_with_backoff(self):
+        jobs.enqueue('movies.tests.flaky_task', 'jednou', 1, key='jednou')
+        jobs.enqueue('movies.tests.flaky_task', 'vzdy', 10)
+        output = self.run_worker()
+        self.assertEqual(FLAKY_CALLS.count('jednou'), 2)
+        self.assertEqual(FLAKY_CALLS.count('vzdy'), 3)
+        done, failed = Job.objects.get(key='jednou'), Job.objects.get(status=Job.FAILED)
+        self.assertEqual((done.status, done.attempts), (Job.DONE, 2))
+        self.assertIn('RuntimeError: vzdy selhala', failed.last_error)
+        self.assertTrue(any('selhala po 3 pokusech' in line for line in output))
+        with override_settings(MOVIES_JOBS_RETRY_DELAY=10):
+            self.assertEqual([jobs.retry_delay(attempt) for attempt in (1, 2, 3, 20)], [10, 20, 40, 3600])
+        metrics = jobs.metrics()
+        self.assertEqual(metrics['statuses'], {'done': 1, 'failed': 1})
+        self.assertEqual({row['task'] for row in metrics['tasks']}, {'movies.tests.flaky_task'})
+
+    def test_stale_jobs_are_requeued(self):
+        job = jobs.enqueue('movies.tests.flaky_task', 'zaseknuta', 0)
+        Job.objects.filter(pk=job.pk).update(status=Job.RUNNING, attempts=1,
+                                             started_at=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+        self.run_worker()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.DONE, 2))
+
+
+@override_settings(MOVIES_IMAGE_WIDTHS=(160, 320))
+class ImageVariantTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        self.override = override_settings(MEDIA_ROOT=self.media)
+        self.override.enable()
+        self.addCleanup(self.override.disable)
+
+    def upload(self, width):
+        buffer = io.BytesIO()
+        PILImage.new('RGB', (width, width // 2), 'red').save(buffer, 'PNG')
+        return SimpleUploadedFile('plakat.png', buffer.getvalue(), content_type='image/png')
+
+    def test_variants_are_generated_on_upload(self):
+        film = Film.objects.create(title='Vetřelec', release_date=datetime.date(1979, 5, 25),
+                                   poster=self.upload(400))
+        for width in (160, 320):
+            for extension in ('webp', 'jpg'):
+                self.assertTrue(film.poster.storage.exists(images.variant_name(film.poster.name, width, extension)))
+        self.assertIn('.320w.jpg 320w', images.srcset(film.poster))
+        self.assertIn(f'{film.poster.url} 400w', images.srcset(film.poster))
+        html = Template('{% load film_images %}{% responsive_image poster %}').render(Context({'poster': film.poster}))
+        self.assertIn('type="image/webp"', html)
+
+    def test_small_images_get_no_variants(self):
+        film = Film.objects.create(title='Vetřelec', release_date=datetime.date(1979, 5, 25),
+                                   poster=self.upload(100))
+        self.assertEqual(images.srcset(film.poster), '')
+
+    def test_existing_variants_are_not_regenerated(self):
+        film = Film.objects.create(title='Vetřelec', release_date=datetime.date(1979, 5, 25),
+                                   poster=self.upload(400))
+        variant = film.poster.storage.path(images.variant_name(film.poster.name, 160, 'jpg'))
+        with open(variant, 'wb') as stream:
+            stream.write(b'puvodni')
+        # po vyprázdnění cache se varianty zjistí z úložiště, uložení filmu úlohu nezařadí
+        get_cache().clear()
+        with override_settings(MOVIES_JOBS_EAGER=False):
+            film.save()
+        self.assertFalse(Job.objects.filter(task='movies.tasks.generate_image_variants').exists())
+        # ani úloha nevytváří varianty, které v úložišti už jsou
+        get_cache().clear()
+        tasks.generate_image_variants('movies.Film', film.pk, 'poster')
+        with open(variant, 'rb') as stream:
+            self.assertEqual(stream.read(), b'puvodni')
+
+    def test_backfill_command(self):
+        film = Film.objects.create(title='Vetřelec', release_date=datetime.date(1979, 5, 25),
+                                   poster=self.upload(400))
+        film.poster.storage.delete(images.variant_name(film.poster.name, 160, 'jpg'))
+        get_cache().clear()
+        call_command('generate_image_variants', stdout=io.StringIO())
+        self.assertTrue(film.poster.storage.exists(images.variant_name(film.poster.name, 160, 'jpg')))
+
+
+class AttachmentMetadataTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.film = Film.objects.create(title='Vetřelec', release_date=datetime.date(1979, 5, 25))
+
+    def test_metadata_is_captured_on_upload(self):
+        buffer = io.BytesIO()
+        PILImage.new('RGB', (40, 30), 'blue').save(buffer, 'PNG')
+        content = buffer.getvalue()
+        attachment = Attachment.objects.create(
+            title='Plakát', film=self.film, file=SimpleUploadedFile('plakat.png', content))
+        attachment.refresh_from_db()
+        self.assertEqual(attachment.size_bytes, len(content))
+        self.assertEqual(attachment.content_type, 'image/png')
+        self.assertEqual((attachment.width, attachment.height), (40, 30))
+        self.assertEqual(attachment.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(attachment.file.read(), content)
+
+    def test_filesize_does_not_touch_storage(self):
+        attachment = Attachment(title='Trailer', film=self.film, file='neexistuje.mp4', type='video')
+        for size, text in ((2048, '2.0 KB'), (5 * 1024 ** 2, '5.0 MB'), (3 * 1024 ** 3, '3.0 GB')):
+            attachment.size_bytes = size
+            self.assertEqual(attachment.filesize, text)
+
+    def test_backfill_command(self):
+        attachment = Attachment.objects.create(
+            title='Text', film=self.film, type='text', file=SimpleUploadedFile('popis.txt', b'abc'))
+        Attachment.objects.filter(pk=attachment.pk).update(size_bytes=None, sha256='')
+        call_command('backfill_attachment_metadata', stdout=io.StringIO())
+        attachment.refresh_from_db()
+        self.assertEqual(attachment.size_bytes, 3)
+        self.assertEqual(attachment.sha256, hashlib.sha256(b'abc').hexdigest())
+        # rozměry se zjišťují jen u obrázků
+        self.assertFalse(attachment.is_image)
+        self.assertEqual((attachment.width, attachment.height), (None, None))
+
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'heslo')
+        self.client.force_login(self.admin)
+        self.film = Film.objects.create(title='Vetřelec', release_date=datetime.date(1979, 5, 25))
+        self.content = os.urandom(2500)
+
+    def post_start(self, **data):
+        data = {'filename': 'trailer.mp4', 'size': len(self.content), 'title': 'Trailer',
+                'sha256': hashlib.sha256(self.content).hexdigest(), **data}
+        return self.client.post(reverse('upload-start', args=[self.film.pk]), json.dumps(data),
+                                content_type='application/json')
+
+    def start(self, **data):
+        response = self.post_start(**data)
+        self.assertEqual(response.status_code, 201)
+        return reverse('upload-chunk', args=[response.json()['id']])
+
+    def put(self, url, start, end):
+        return self.client.put(url, self.content[start:end + 1], content_type='application/octet-stream',
+                               HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{len(self.content)}')
+
+    def test_resumable_upload_creates_attachment(self):
+        url = self.start()
+        self.assertEqual(self.put(url, 0, 999).status_code, 202)
+        # část, která nenavazuje na přijatá data, se odmítne a klient se doptá, kde pokračovat
+        self.assertEqual(self.put(url, 1500, 2499).status_code, 409)
+        self.assertEqual(self.client.get(url).json()['received'], 1000)
+        self.assertEqual(self.put(url, 1000, 1999).status_code, 202)
+        response = self.put(url, 2000, 2499)
+        self.assertEqual(response.status_code, 201)
+        attachment = Attachment.objects.get(pk=response.json()['attachment'])
+        self.assertEqual(attachment.file.name, f'film/{self.film.pk}/attachments/trailer.mp4')
+        self.assertEqual(attachment.size_bytes, 2500)
+        self.assertEqual(attachment.content_type, 'video/mp4')
+        with attachment.file.open('rb') as stream:
+            self.assertEqual(stream.read(), self.content)
+        self.assertEqual(self.client.get(url).json()['attachment'], attachment.pk)
+        self.assertFalse(os.path.exists(attachment.file.path + '.part'))
+        self.assertEqual(self.put(url, 2000, 2499).status_code, 409)
+
+    @override_settings(MOVIES_JOBS_EAGER=False)
+    def test_checksum_is_verified_by_job(self):
+        url = self.start()
+        self.assertEqual(self.put(url, 0, 2499).status_code, 202)
+        self.assertEqual(self.client.get(url).json()['attachment'], None)
+        job = Job.objects.get(task='movies.uploads.verify')
+        uploads.verify(*job.args)
+        self.assertEqual(self.client.get(url).json()['attachment'], Attachment.objects.get().pk)
+
+    def test_checksum_mismatch_restarts_upload(self):
+        url = self.start(sha256='0' * 64)
+        self.assertEqual(self.put(url, 0, 2499).status_code, 422)
+        self.assertEqual(self.client.get(url).json()['received'], 0)
+        self.assertFalse(Attachment.objects.exists())
+        # otisk je povinný
+        self.assertEqual(self.post_start(sha256='').status_code, 400)
+        self.assertEqual(self.post_start(sha256=None).status_code, 400)
+
+    def test_range_is_claimed_before_writing(self):
+        url = self.start()
+        # souběžný požadavek už si rozsah zabral - tento do souboru nezapíše
+        AttachmentUpload.objects.update(received=1000)
+        self.assertEqual(self.put(url, 0, 999).status_code, 409)
+        self.assertEqual(os.path.getsize(os.path.join(self.media, AttachmentUpload.objects.get().part_name)), 0)
+
+    def test_names_do_not_collide_and_uploads_need_permission(self):
+        first, second = self.start(), self.start()
+        self.assertNotEqual(self.client.get(first).json()['name'], self.client.get(second).json()['name'])
+        self.assertEqual(self.client.delete(second).status_code, 204)
+        # cizí upload nelze číst, doplňovat ani smazat
+        self.client.force_login(User.objects.create_superuser('editor', 'editor@example.com', 'heslo'))
+        self.assertEqual(self.client.get(first).status_code, 404)
+        self.assertEqual(self.put(first, 0, 999).status_code, 404)
+        self.assertEqual(self.client.delete(first).status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.client.get(first).status_code, 403)
+
+
+class AdminChangelistQueryTests(TestCase):
+    """ Počet SQL dotazů výpisů v administraci nesmí záviset na počtu záznamů """
+
+    def setUp(self):
+        get_cache().clear()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'heslo'))
+
+    def fill(self, count):
+        offset = Genre.objects.count()
+        Genre.objects.bulk_create([Genre(name=f'žánr {offset + i}', slug=f'zanr-{offset + i}') for i in range(count)])
+        films = create_films(count, Genre.objects.all()[:1])
+        Attachment.objects.bulk_create([
+            Attachment(title=f'Příloha {film.pk}', film=film, file=f'film/{film.pk}/attachments/a.jpg',
+                       size_bytes=1024 * film.pk, _order=0)
+            for film in films
+        ])
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelists_have_constant_query_count(self):
+        urls = [reverse(f'admin:movies_{model}_changelist') for model in ('genre', 'film', 'attachment')]
+        urls += [reverse('admin:movies_attachment_changelist') + '?type__exact=image&o=3',
+                 reverse('admin:movies_film_changelist') + '?q=Film']
+        self.fill(10)
+        small = [self.count_queries(url) for url in urls]
+        self.fill(10000 - 10)
+        self.assertEqual([self.count_queries(url) for url in urls], small)
+
+
+class CatalogImportExportTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        self.scifi = Genre.objects.create(name='sci-fi')
+        self.film = Film.objects.create(title='Vetřelec', release_date=datetime.date(1979, 5, 25), rate=8.5)
+        self.film.genres.add(self.scifi)
+
+    def export(self, data_format):
+        path = os.path.join(tempfile.mkdtemp(), f'katalog.{data_format}')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        call_command('export_films', path, stderr=io.StringIO())
+        return path
+
+    def test_roundtrip_updates_by_natural_key(self):
+        for data_format in ('ndjson', 'csv'):
+            path = self.export(data_format)
+            Film.objects.filter(pk=self.film.pk).update(rate=1.0)
+            self.film.genres.clear()
+            call_command('import_films', path, batch_size=1, stdout=io.StringIO())
+            self.assertEqual(Film.objects.count(), 1)
+            film = Film.objects.get()
+            self.assertEqual(film.rate, 8.5)
+            self.assertEqual(list(film.genres.all()), [self.scifi])
+
+    def write_ndjson(self, lines):
+        path = os.path.join(tempfile.mkdtemp(), 'katalog.ndjson')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        with open(path, 'w', encoding='utf-8') as stream:
+            stream.writelines(json.dumps(line, ensure_ascii=False) + '\n' for line in lines)
+        return path
+
+    def test_import_creates_films_and_genres(self):
+        path = self.write_ndjson([
+            {'title': 'Pelíšky', 'release_date': '1999-04-01', 'runtime': 115, 'rate': 9.0,
+             'genres': ['komedie', 'drama']},
+            {'title': 'Vetřelec', 'release_date': '1979-05-25', 'rate': 9.1, 'genres': ['sci-fi', 'horor']},
+        ])
+        call_command('import_films', path, stdout=io.StringIO())
+        self.assertEqual(Film.objects.count(), 2)
+        self.assertEqual(Genre.objects.get(name='horor').num_films, 1)
+        self.assertEqual(Genre.objects.get(name='sci-fi').num_films, 1)
+        self.assertEqual(film_count(), 2)
+        self.assertEqual(Film.objects.leaderboard().first().title, 'Vetřelec')
+        self.assertEqual(search.SearchResults('pelisky').count(), 1)
+
+    def test_import_keeps_rate_computed_from_ratings(self):
+        Film.objects.filter(pk=self.film.pk).update(rating_count=2, rating_sum=18)
+        path = self.write_ndjson([{'title': 'Vetřelec', 'release_date': '1979-05-25', 'runtime': 117, 'rate': 1.0}])
+        call_command('import_films', path, stdout=io.StringIO())
+        film = Film.objects.get()
+        self.assertEqual((film.rate, film.runtime), (8.5, 117))
+
+    def test_failed_import_refreshes_imported_batches(self):
+        path = self.write_ndjson([
+            {'title': 'Pelíšky', 'release_date': '1999-04-01', 'genres': ['komedie']},
+            {'title': 'Rozbitý záznam', 'release_date': 'neznámé'},
+        ])
+        with self.assertRaises(CommandError):
+            call_command('import_films', path, batch_size=1, stdout=io.StringIO())
+        self.assertEqual(film_count(), 2)
+        self.assertEqual(Genre.objects.get(name='komedie').num_films, 1)
+        self.assertEqual(search.SearchResults('pelisky').count(), 1)
+
+
+class FilmApiTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.drama = Genre.objects.create(name='drama')
+        create_films(25, genres=[self.drama])
+        Genre.objects.update_film_counts()
+
+    def test_cursor_pages_cover_all_films(self):
+        url, titles = reverse('api-film-list') + '?page_size=10&ordering=rate&fields=id,title,rate', []
+        while url:
+            data = self.client.get(url).json()
+            self.assertEqual(set(data['results'][0]), {'id', 'title', 'rate'})
+            titles.extend(film['title'] for film in data['results'])
+            url = data['next']
+        self.assertEqual(len(titles), 25)
+        self.assertEqual(titles, list(Film.objects.order_by('-rate', 'id').values_list('title', flat=True)))
+
+    def test_genres_are_prefetched(self):
+        # žánr, stránka filmů, žánry filmů (prefetch)
+        with self.assertNumQueries(3):
+            data = self.client.get(reverse('api-film-list'), {'genre': 'drama', 'page_size': 50}).json()
+        self.assertEqual(data['count'], 25)
+        self.assertEqual(data['results'][0]['genres'], ['drama'])
+
+    def test_conditional_get(self):
+        url = reverse('api-film-detail', args=[Film.objects.first().pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('plot', response.json())
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        Film.objects.create(title='Nový film', release_date=datetime.date(2021, 1, 1))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get(reverse('api-film-list'), {'fields': 'heslo'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api-film-list'), {'cursor': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api-film-detail', args=[999])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api-genre-list')).json()['results'][0]['num_films'], 25)
+
+
+
+@override_settings(MOVIES_REQUEST_PROFILING=True, MOVIES_SLOW_REQUEST_MS=0)
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        create_films(5)
+
+    def test_server_timing_and_slow_log(self):
+        with self.assertLogs('movies.slow_requests', 'WARNING') as logs:
+            response = self.client.get(reverse('films'))
+        self.assertRegex(response['Server-Timing'], r'db;desc="SQL \(\d+\)";dur=[\d.]+, tpl;desc="Templates";dur=[\d.]+')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'films')
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+
+    def test_duplicate_queries_are_fingerprinted(self):
+        profile = profiling.RequestProfile()
+        token = profiling.current_profile.set(profile)
+        try:
+            with profiling.instrument_queries():
+                for pk in Film.objects.values_list('pk', flat=True):
+                    Film.objects.get(pk=pk)
+        finally:
+            profiling.current_profile.reset(token)
+        self.assertEqual(profile.queries, 6)
+        self.assertEqual(profile.duplicates()[0]['count'], 5)
+
+    @override_settings(MOVIES_REQUEST_PROFILING=False)
+    def test_disabled_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('films')))
+
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+
+    def test_generated_catalog(self):
+        benchmark_data.generate(films=60, genres=6, attachments=2, batch_size=25)
+        self.assertEqual(Film.objects.count(), 60)
+        self.assertEqual(Attachment.objects.count(), 120)
+        counts = list(Genre.objects.order_by('pk').values_list('num_films', flat=True))
+        # nejoblíbenější žánr má víc filmů než nejméně oblíbený
+        self.assertGreater(counts[0], counts[-1])
+        results = benchmark_runner.run(benchmark_scenarios.default_scenarios(variants=3), requests=2, warmup=1)
+        self.assertEqual(set(results), {'index', 'film-list', 'genre', 'browse', 'film-detail',
+                                        'admin-films', 'admin-attachments', 'admin-genres'})
+        # ETag, film, přílohy a podobné filmy
+        self.assertLessEqual(results['film-detail']['queries'], 4)
+        # úvodní stránka se měří bez cache, ne jako vrácení uložené stránky
+        self.assertGreater(results['index']['queries'], 0)
+
+    def test_baseline_comparison(self):
+        baseline = {'calibration_ms': 20.0, 'results': {'index': {'p50_ms': 10.0, 'queries': 3}}}
+        compare = benchmark_runner.compare
+        self.assertEqual(compare({'index': {'p50_ms': 14.0, 'queries': 3}}, baseline), [])
+        self.assertEqual(len(compare({'index': {'p50_ms': 16.0, 'queries': 4}}, baseline)), 2)
+        # na dvakrát pomalejším stroji se časy základní linie zdvojnásobí, počty dotazů ne
+        self.assertEqual(compare({'index': {'p50_ms': 28.0, 'queries': 3}}, baseline, calibration=40.0), [])
+        self.assertEqual(len(compare({'index': {'p50_ms': 28.0, 'queries': 4}}, baseline, calibration=40.0)), 1)
+        # u rychlých stránek rozhoduje nejmenší rozdíl MIN_DIFFERENCE_MS
+        fast = {'results': {'index': {'p50_ms': 1.0, 'queries': 0}}}
+        self.assertEqual(compare({'index': {'p50_ms': 2.5, 'queries': 0}}, fast), [])
+
+    def test_baseline_with_other_parameters_is_refused(self):
+        path = os.path.join(tempfile.mkdtemp(), 'baseline.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        benchmark_runner.save_baseline(path, {}, {'films': 200, 'genres': 25, 'attachments': 3, 'requests': 50,
+                                                  'warmup': 5, 'seed': 42}, 30.0)
+        with self.assertRaisesMessage(CommandError, 'jinými parametry'):
+            call_command('benchmark', baseline=path, films=5000, stdout=io.StringIO(), stderr=io.StringIO())
+
+
+
+class QueryPlanTests(TestCase):
+    """ Dotazy výpisových stránek musí procházet index v pořadí řazení, ne třídit dočasným B-stromem """
+
+    def setUp(self):
+        self.drama = Genre.objects.create(name='drama')
+        create_films(30, genres=[self.drama])
+        Attachment.objects.create(film=Film.objects.first(), title='Fotka')
+
+    def assertUsesIndex(self, queryset):
+        plan = queryset.explain()
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertRegex(plan, r'USING (COVERING )?INDEX|PRIMARY KEY')
+
+    def test_keyset_pages_use_indexes(self):
+        """ Stránky výpisů a API tak, jak je čte KeysetPaginator - první stránka, stránka za kurzorem
+            i stránka před kurzorem, celý katalog i žánr """
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plány dotazů se kontrolují pro SQLite')
+        for keyset in (RELEASE_KEYSET, NEWEST_KEYSET, RATE_KEYSET):
+            for queryset in (Film.objects.for_listing(), Film.objects.for_listing().in_genre(self.drama)):
+                paginator = KeysetPaginator(queryset, 3, keyset)
+                second = paginator.page(paginator.page().next_cursor)
+                for cursor in (None, second.next_cursor, second.previous_cursor):
+                    with CaptureQueriesContext(connection) as queries:
+                        paginator.page(cursor)
+                    # dotazy na filmy (bez načtení žánrů přes prefetch_related)
+                    selects = [query['sql'] for query in queries if 'FROM "movies_film" ' in query['sql']]
+                    self.assertTrue(selects)
+                    for sql in selects:
+                        with self.subTest(sql=sql):
+                            with connection.cursor() as db:
+                                db.execute('EXPLAIN QUERY PLAN ' + sql)
+                                plan = '\n'.join(row[-1] for row in db.fetchall())
+                            self.assertNotIn('TEMP B-TREE', plan)
+                            # index musí procházet tabulka filmů, ne jen poddotaz žánru
+                            self.assertRegex(plan, r'(SCAN|SEARCH) movies_film USING (COVERING )?INDEX')
+
+    def test_hot_querysets_use_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plány dotazů se kontrolují pro SQLite')
+        film = Film.objects.first()
+        for queryset in (
+            Film.objects.for_listing()[:3],
+            Film.objects.for_listing().in_genre(self.drama)[:3],
+            Film.objects.for_listing(plot=True).newest()[:2],
+            Film.objects.top_rated()[:20],
+            Film.objects.for_listing().leaderboard()[:10],
+            Film.objects.for_listing().leaderboard(self.drama)[:3],
+            film.attachment_set.all(),
+            Genre.objects.only('id', 'name'),
+        ):
+            with self.subTest(sql=str(queryset.query)):
+                self.assertUsesIndex(queryset)
+
+    def test_sqlite_pragmas(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Pouze pro SQLite')
+        # pragmy se nastavují jen při nasazení (HILDAWEB_SQLITE_TUNING), test je proto zapne sám;
+        # synchronous nelze měnit uvnitř transakce testu, ověřuje se cache_size
+        with override_settings(MOVIES_SQLITE_PRAGMAS={'cache_size': -4000}):
+            signals.tune_sqlite_connection(sender=None, connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], -4000)
+
+
+
+class FilmDetailConditionalTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.film = Film.objects.create(title='Vetřelec', release_date=datetime.date(1979, 5, 25), rate=9.1)
+        self.url = self.film.get_absolute_url()
+
+    def test_not_modified_costs_one_query(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage=60', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        with self.assertNumQueries(1):
+            cached = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertIn('public', cached['Cache-Control'])
+        cached = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_etag_changes_with_film_attachments_and_menu(self):
+        etags = [self.client.get(self.url)['ETag']]
+        self.film.rate = 8.0
+        self.film.save()
+        etags.append(self.client.get(self.url)['ETag'])
+        Attachment.objects.create(film=self.film, title='Plakát', file='film/1/attachments/plakat.jpg', size_bytes=1)
+        etags.append(self.client.get(self.url)['ETag'])
+        Genre.objects.create(name='horor')
+        etags.append(self.client.get(self.url)['ETag'])
+        self.assertEqual(len(set(etags)), 4)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etags[0]).status_code, 200)
+
+    def test_authenticated_pages_are_private(self):
+        anonymous_etag = self.client.get(self.url)['ETag']
+        self.client.force_login(User.objects.create_user('divak', password='heslo'))
+        response = self.client.get(self.url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotEqual(response['ETag'], anonymous_etag)
+        self.assertEqual(self.client.get(reverse('film-detail', args=[999])).status_code, 404)
+
+
+
+class FileServingTests(TestCase):
+    """ Produkční obsluha statických souborů a médií (hildaweb.serving, hildaweb.storage) """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        os.makedirs(os.path.join(self.root, 'css'))
+        with open(os.path.join(self.root, 'video.mp4'), 'wb') as stream:
+            stream.write(bytes(range(256)) * 4)
+        with open(os.path.join(self.root, 'css', 'styles.css'), 'w') as stream:
+            stream.write('body { margin: 0; }\n' * 200)
+
+    def get(self, view, path, **headers):
+        with override_settings(STATIC_ROOT=self.root, MEDIA_ROOT=self.root):
+            response = view(RequestFactory().get('/', **headers), path)
+        self.addCleanup(response.close)
+        return response
+
+    def test_range_requests(self):
+        response = self.get(serving.serve_media, 'video.mp4', HTTP_RANGE='bytes=256-511')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 256-511/1024')
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(256)))
+        response = self.get(serving.serve_media, 'video.mp4', HTTP_RANGE='bytes=-100')
+        self.assertEqual(len(b''.join(response.streaming_content)), 100)
+        response = self.get(serving.serve_media, 'video.mp4')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        with self.assertRaises(Http404):
+            self.get(serving.serve_media, '../etc/passwd')
+
+    @override_settings(SENDFILE_BACKEND='x-accel-redirect')
+    def test_offload_to_web_server(self):
+        response = self.get(serving.serve_media, 'video.mp4')
+        self.assertEqual(response['X-Accel-Redirect'], '/internal/media/video.mp4')
+        self.assertEqual(response.content, b'')
+        with override_settings(SENDFILE_BACKEND='x-sendfile'):
+            response = self.get(serving.serve_media, 'video.mp4')
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.root, 'video.mp4'))
+
+    def test_hashed_and_precompressed_static_files(self):
+        manifest = storage.CompressedManifestStaticFilesStorage(location=self.root)
+        list(manifest.post_process({'css/styles.css': (manifest, 'css/styles.css')}))
+        hashed = manifest.hashed_files['css/styles.css']
+        self.assertTrue(os.path.exists(os.path.join(self.root, hashed + '.gz')))
+        response = self.get(serving.serve_static, hashed, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        response = self.get(serving.serve_static, 'css/styles.css')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+
+class AsyncViewTests(TransactionTestCase):
+    """ Asynchronní view spouštějí dotazy v jiných vláknech, data proto musí být potvrzená (TransactionTestCase) """
+
+    def setUp(self):
+        get_cache().clear()
+        self.drama = Genre.objects.create(name='drama')
+        create_films(12, genres=[self.drama])
+        Genre.objects.update_film_counts()
+        leaderboards.rebuild_all()
+        search.rebuild()
+
+    def get(self, view, path, **kwargs):
+        request = RequestFactory().get(path)
+        request.user, request.session = AnonymousUser(), {}
+        return async_to_sync(view)(request, **kwargs)
+
+    def test_read_views_are_async(self):
+        for pattern in async_urls.urlpatterns:
+            if pattern.name in async_urls.ASYNC_VIEWS:
+                self.assertTrue(asyncio.iscoroutinefunction(pattern.callback), pattern.name)
+
+    def test_pages_render(self):
+        best = Film.objects.order_by('-rate', 'id').first()
+        content = self.get(async_views.index, '/movies/').content.decode()
+        self.assertIn(best.title, content)
+        self.assertIn('drama', content)
+        response = self.get(async_views.film_list, '/movies/films/genres/drama/?page=2', genre_slug='drama')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Žánr filmu: drama', response.content.decode())
+        film = Film.objects.first()
+        self.assertIn(film.plot, self.get(async_views.film_detail, '/', pk=film.pk).content.decode())
+        self.assertIn('Film 00003', self.get(async_views.film_search, '/movies/films/search/?q=3').content.decode())
+
+    def test_detail_conditional_get(self):
+        film = Film.objects.first()
+        response = self.get(async_views.film_detail, '/', pk=film.pk)
+        self.assertIn('public', response['Cache-Control'])
+        request = RequestFactory().get('/', HTTP_IF_NONE_MATCH=response['ETag'])
+        request.user, request.session = AnonymousUser(), {}
+        self.assertEqual(async_to_sync(async_views.film_detail)(request, pk=film.pk).status_code, 304)
+
+    def test_missing_pages(self):
+        with self.assertRaises(Http404):
+            self.get(async_views.film_detail, '/', pk=999)
+        with self.assertRaises(Http404):
+            self.get(async_views.film_search, '/movies/films/search/?q=film&page=9')
+
+
+@override_settings(MOVIES_READ_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """ Replika je v testech zrcadlem testovací databáze (TEST MIRROR), čte se z ní jiným připojením -
+        data proto musí být potvrzená (TransactionTestCase) """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        get_cache().clear()
+        self.film = Film.objects.create(title='Pelíšky', release_date=datetime.date(1999, 1, 1), rate=9.0)
+        self.user = User.objects.create_user('divak', password='heslo')
+
+    def get(self, url):
+        """ Vrací počet dotazů do hlavní databáze a do repliky během požadavku """
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(primary), len(replica)
+
+    def test_read_views_use_replica(self):
+        for url in (reverse('films'), self.film.get_absolute_url(), reverse('api-film-list')):
+            primary, replica = self.get(url)
+            self.assertGreater(replica, 0, url)
+        self.client.force_login(self.user)
+        self.assertEqual(self.get(reverse('film-create'))[1], 0)
+
+    def test_session_reads_primary_after_post(self):
+        self.client.force_login(self.user)
+        self.assertGreater(self.get(self.film.get_absolute_url())[1], 0)
+        self.client.post(reverse('film-rate', args=[self.film.pk]), {'score': 7})
+        self.assertEqual(self.get(self.film.get_absolute_url())[1], 0)
+        # po uplynutí doby připnutí se čte opět z repliky
+        session = self.client.session
+        session[routers.PIN_SESSION_KEY] = 0
+        session.save()
+        self.assertGreater(self.get(self.film.get_absolute_url())[1], 0)
+
+    def test_router(self):
+        router = routers.ReadReplicaRouter()
+        self.assertEqual(router.db_for_read(Film), 'default')
+        token = routers.current_routing.set(routers.RequestRouting())
+        try:
+            routers.current_routing.get().replica = 'replica'
+            self.assertEqual(router.db_for_read(Film), 'replica')
+            self.assertEqual(router.db_for_read(Session), 'default')
+            with routers.primary():
+                self.assertEqual(router.db_for_read(Film), 'default')
+            self.assertEqual(router.db_for_write(Film), 'default')
+            # po zápisu čte zbytek požadavku z hlavní databáze
+            self.assertEqual(router.db_for_read(Film), 'default')
+        finally:
+            routers.current_routing.reset(token)
+        self.assertFalse(router.allow_migrate('replica', 'movies'))
@@ -0,0 +1,236 @@
+""" Upload velkých příloh (videa, zvuk) po částech s možností navázat přerušený přenos.
+
+    1. POST /movies/films/<id>/uploads/ s JSON {"filename", "size", "title", "type", "sha256"}
+       (otisk SHA-256 celého souboru je povinný) založí upload a vyhradí cílový název souboru.
+       S uploadem dále může pracovat jen uživatel, který ho založil.
+    2. PUT /movies/uploads/<uuid>/ s hlavičkou Content-Range: bytes <od>-<do>/<celkem> zapíše část
+       přímo do cílového umístění (<soubor>.part) - bez dočasného souboru a bez kopírování.
+       Části se posílají postupně; část, která nenavazuje na přijatá data, se odmítne (409).
+    3. GET /movies/uploads/<uuid>/ vrátí počet přijatých bajtů - odtud klient po přerušení pokračuje.
+    Po přijetí posledního bajtu ověří otisk SHA-256 úloha ve frontě (movies/jobs.py) - čtení celého
+    souboru tak neprodlužuje požadavek s poslední částí. Úloha soubor přejmenuje a v jedné transakci
+    vytvoří záznam Attachment; klient se o výsledku dozví dotazem GET (položky attachment, error).
+    Každá část je samostatný krátký požadavek, upload tak nedrží worker webového serveru. """
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.files.images import get_image_dimensions
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods, require_POST
+
+from movies import jobs
+from movies.models import Attachment, AttachmentUpload, Film, attachment_path
+
+CONTENT_RANGE_PREFIX = 'bytes '
+BLOCK_SIZE = 1024 * 1024
+SHA256 = re.compile(r'[0-9a-f]{64}')
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def upload_view(view):
+    """ Přístup jen pro uživatele s oprávněním přidávat přílohy, chyby jako JSON """
+    def wrapper(request, *args, **kwargs):
+        if not request.user.has_perm('movies.add_attachment'):
+            return JsonResponse({'error': 'Nedostatečná oprávnění'}, status=403)
+        try:
+            return view(request, *args, **kwargs)
+        except UploadError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+    wrapper.__name__, wrapper.__doc__ = view.__name__, view.__doc__
+    return wrapper
+
+
+def upload_state(upload):
+    state = {'id': str(upload.id), 'name': upload.name, 'size': upload.size, 'received': upload.received,
+             'attachment': upload.attachment_id, 'error': upload.error}
+    if upload.attachment_id:
+        state['url'] = upload.attachment.file.url
+    return state
+
+
+def max_chunk_size():
+    return getattr(settings, 'MOVIES_UPLOAD_MAX_CHUNK', 64 * 1024 * 1024)
+
+
+@require_POST
+@upload_view
+def start_upload(request, pk):
+    """ Založí upload přílohy filmu """
+    film = get_object_or_404(Film, pk=pk)
+    try:
+        data = json.loads(request.body)
+        filename, size = os.path.basename(data['filename']), int(data['size'])
+        sha256 = str(data['sha256']).lower()
+    except (ValueError, KeyError, TypeError):
+        raise UploadError('Očekává se JSON s položkami filename, size a sha256')
+    if not filename or size <= 0:
+        raise UploadError('Neplatný název nebo velikost souboru')
+    if not SHA256.fullmatch(sha256):
+        raise UploadError('Otisk sha256 musí být 64 šestnáctkových číslic')
+    attachment_type = data.get('type', 'video')
+    if attachment_type not in dict(Attachment.TYPE_OF_ATTACHMENT):
+        raise UploadError('Neplatný typ přílohy')
+    upload = AttachmentUpload.objects.create(
+        film=film, title=data.get('title') or filename, type=attachment_type, name=reserve_name(film, filename), size=size,
+        sha256=sha256, created_by=request.user,
+    )
+    path = default_storage.path(upload.part_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    return JsonResponse(upload_state(upload), status=201)
+
+
+def reserve_name(film, filename):
+    """ Cílový název souboru se vyhradí hned při založení uploadu - části se zapisují přímo do jeho umístění.
+        Název nesmí kolidovat s existujícím souborem ani s jiným rozpracovaným uploadem. """
+    name = default_storage.get_available_name(attachment_path(Attachment(film=film), filename))
+    while AttachmentUpload.objects.filter(name=name).exists():
+        root, ext = os.path.splitext(name)
+        name = default_storage.get_available_name(default_storage.get_alternative_name(root, ext))
+    return name
+
+
+def parse_content_range(header, size):
+    if not header or not header.startswith(CONTENT_RANGE_PREFIX):
+        raise UploadError('Chybí hlavička Content-Range: bytes <od>-<do>/<celkem>')
+    try:
+        span, total = header[len(CONTENT_RANGE_PREFIX):].split('/')
+        start, end = (int(value) for value in span.split('-'))
+        total = int(total)
+    except ValueError:
+        raise UploadError('Neplatná hlavička Content-Range')
+    if total != size or start > end or end >= size:
+        raise UploadError('Rozsah neodpovídá velikosti souboru', status=416)
+    return start, end
+
+
+@require_http_methods(['GET', 'PUT', 'DELETE'])
+@upload_view
+def upload_chunk(request, upload_id):
+    """ Stav uploadu (GET), zápis další části (PUT), zrušení uploadu (DELETE) """
+    # cizí upload se chová jako neexistující
+    upload = get_object_or_404(AttachmentUpload, pk=upload_id, created_by=request.user)
+    if request.method == 'GET':
+        return JsonResponse(upload_state(upload))
+    if request.method == 'DELETE':
+        discard(upload)
+        return HttpResponse(status=204)
+
+    if upload.attachment_id:
+        raise UploadError('Upload je již dokončen', status=409)
+    start, end = parse_content_range(request.META.get('HTTP_CONTENT_RANGE'), upload.size)
+    length = end - start + 1
+    if length > max_chunk_size():
+        raise UploadError('Příliš velká část', status=413)
+    # rozsah se zabere podmíněnou změnou received ještě před zápisem - ze dvou souběžných
+    # požadavků se stejnou částí zapisuje do souboru jen jeden
+    if not AttachmentUpload.objects.filter(pk=upload.pk, received=start).update(
+            received=start + length, error='', updated_at=timezone.now()):
+        upload.refresh_from_db(fields=['received'])
+        raise UploadError(f'Část musí začínat na bajtu {upload.received}', status=409)
+    written = 0
+    try:
+        written = write_chunk(request, default_storage.path(upload.part_name), start, length)
+    finally:
+        if written != length:
+            # nezapsaná část se uvolní, klient ji pošle znovu
+            AttachmentUpload.objects.filter(pk=upload.pk, received=start + length).update(received=start)
+    if written != length:
+        raise UploadError(f'Přijato {written} z {length} bajtů části')
+    upload.received = start + length
+    if upload.received < upload.size:
+        return JsonResponse(upload_state(upload), status=202)
+    jobs.enqueue('movies.uploads.verify', str(upload.pk), key=f'upload:{upload.pk}')
+    upload.refresh_from_db()
+    if upload.attachment_id:
+        # úloha už proběhla (MOVIES_JOBS_EAGER)
+        return JsonResponse(upload_state(upload), status=201)
+    if upload.error:
+        return JsonResponse({'error': upload.error, **upload_state(upload)}, status=422)
+    return JsonResponse(upload_state(upload), status=202)
+
+
+def write_chunk(request, path, start, length):
+    """ Zapíše tělo požadavku do souboru od pozice start, čte se po blocích bez načtení celé části do paměti """
+    written = 0
+    with open(path, 'r+b') as stream:
+        stream.seek(start)
+        while written < length:
+            block = request.read(min(BLOCK_SIZE, length - written))
+            if not block:
+                break
+            stream.write(block)
+            written += len(block)
+    return written
+
+
+def verify(upload_id):
+    """ Úloha ve frontě: ověří otisk přijatého souboru, přejmenuje ho na cílový název a vytvoří přílohu """
+    upload = AttachmentUpload.objects.filter(pk=upload_id).select_related('film').first()
+    if upload is None or upload.attachment_id or upload.received < upload.size:
+        return
+    part_path, final_path = default_storage.path(upload.part_name), default_storage.path(upload.name)
+    digest = hashlib.sha256()
+    with open(part_path, 'rb') as stream:
+        for block in iter(lambda: stream.read(BLOCK_SIZE), b''):
+            digest.update(block)
+    if upload.sha256 != digest.hexdigest():
+        # poškozená data nelze navázat - upload začne znovu od začátku
+        open(part_path, 'wb').close()
+        AttachmentUpload.objects.filter(pk=upload.pk).update(
+            received=0, error='Otisk SHA-256 nesouhlasí, soubor je třeba nahrát znovu', updated_at=timezone.now())
+        return
+    finish(upload)
+
+
+def finish(upload):
+    """ Přejmenuje ověřený soubor na cílový název a vytvoří přílohu """
+    part_path, final_path = default_storage.path(upload.part_name), default_storage.path(upload.name)
+    attachment = Attachment(
+        film=upload.film, title=upload.title, type=upload.type, file=upload.name, size_bytes=upload.size,
+        content_type=mimetypes.guess_type(upload.name)[0] or '', sha256=upload.sha256,
+    )
+    if upload.type == 'image':
+        attachment.width, attachment.height = get_image_dimensions(part_path)
+    # přejmenování v rámci jednoho adresáře je atomické; soubor musí existovat už při uložení přílohy
+    # (signály z něj generují náhledy obrázků), při chybě uložení se vrátí zpět
+    os.replace(part_path, final_path)
+    try:
+        with transaction.atomic():
+            attachment.save()
+            # upload zůstane se záznamem o výsledku, dokud ho neuklidí purge_stale_uploads
+            AttachmentUpload.objects.filter(pk=upload.pk).update(attachment=attachment, updated_at=timezone.now())
+    except Exception:
+        os.replace(final_path, part_path)
+        raise
+    return attachment
+
+
+def discard(upload):
+    path = default_storage.path(upload.part_name)
+    if os.path.exists(path):
+        os.remove(path)
+    upload.delete()
+
+
+def purge_stale(max_age):
+    """ Smaže uploady, do kterých déle než max_age nic nepřišlo. Vrací jejich počet. """
+    stale = AttachmentUpload.objects.filter(updated_at__lt=timezone.now() - max_age)
+    count = 0
+    for upload in stale:
+        discard(upload)
+        count += 1
+    return count
@@ -1,15 +1,25 @@
 from django.urls import path, re_path
-from . import views
+from . import api, uploads, views
 
 # URL mapování - seznam URL adres pro aplikaci movies
 urlpatterns = [
     path('', views.index, name='index'),
     path('films/', views.FilmListView.as_view(), name='films'),
     #re_path(r'^films/genres/(?P<genre_name>[\w-]+)/:?(?P<order>[\w-]*)$', views.FilmListView.as_view(), name='film_genre'),
-    path('films/genres/<str:genre_name>/', views.FilmListView.as_view(), name='film-genre'),
+    path('films/genres/<str:genre_slug>/', views.FilmListView.as_view(), name='film-genre'),
+    path('films/browse/', views.FilmBrowseView.as_view(), name='film-browse'),
+    path('films/search/', views.FilmSearchView.as_view(), name='film-search'),
     path('films/<int:pk>/', views.FilmDetailView.as_view(), name='film-detail'),
+    path('films/<int:pk>/rate/', views.rate_film, name='film-rate'),
     path('films/create/', views.FilmCreate.as_view(), name='film-create'),
     path('films/<int:pk>/update/', views.FilmUpdate.as_view(), name='film-update'),
     path('films/<int:pk>/delete/', views.FilmDelete.as_view(), name='film-delete'),
     #path('films/<int:pk>/edit/', views.edit_film, name='film-edit'),
+    # Upload velkých příloh po částech
+    path('films/<int:pk>/uploads/', uploads.start_upload, name='upload-start'),
+    path('uploads/<uuid:upload_id>/', uploads.upload_chunk, name='upload-chunk'),
+    # JSON API (pouze pro čtení)
+    path('api/films/', api.film_list, name='api-film-list'),
+    path('api/films/<int:pk>/', api.film_detail, name='api-film-detail'),
+    path('api/genres/', api.genre_list, name='api-genre-list'),
 ]
@@ -1,64 +1,208 @@
+import datetime
+import hashlib
+from functools import wraps
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponsePermanentRedirect, HttpResponseRedirect
 from django.shortcuts import render, get_object_or_404
 from django.urls import reverse_lazy, reverse
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.core.paginator import Paginator
-
-from movies.forms import FilmModelForm
-from movies.models import Film, Genre, Attachment
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition, require_POST
+
+from movies import facets, ratings
+from movies.caching import (anonymous_page_cache, catalog_generation, film_count, genre_ids_by_slug,
+                            genre_menu_version)
+from movies.forms import FilmModelForm, RatingForm
+from movies.models import Film, Genre, Attachment, Rating
+from movies.pagination import (CountedPaginator, KeysetPaginationMixin, KeysetPaginator,
+                               NEWEST_KEYSET, RELEASE_KEYSET)
+from movies.search import SearchResults
 #from .forms import FilmForm
 
 
+@anonymous_page_cache(60 * 15)
 def index(request):
     """View function for home page of site."""
 
     # Generate counts of some of the main objects
-    num_films = Film.objects.all().count()
-    films = Film.objects.order_by('-rate')[:3]
+    num_films = film_count()
+    # QuerySety jsou líné - pokud šablona vezme blok z cache, dotaz se vůbec neprovede
+    new_films = Film.objects.for_listing(plot=True)[:3]
+    top_films = Film.objects.for_listing().leaderboard()[:10]
 
     context = {
         'num_films': num_films,
-        'films': films
+        'new_films': new_films,
+        'top_films': top_films,
+        'catalog_generation': catalog_generation(),
     }
 
     # Render the HTML template index.html with the data in the context variable
     return render(request, 'index.html', context=context)
 
 
-class FilmListView(ListView):
+class FilmListView(KeysetPaginationMixin, ListView):
     model = Film
 
     context_object_name = 'films_list'   # your own name for the list as a template variable
     template_name = 'film/list.html'  # Specify your own template name/location
     paginate_by = 3
+    paginator_class = CountedPaginator
+    keyset = RELEASE_KEYSET
+
+    def get_genre(self):
+        """ Žánr, jehož filmy se vypisují (None, pokud se vypisují všechny filmy nebo slug neexistuje).
+            Slug se na id převede mapou v paměti procesu, žánr se pak načte podle primárního klíče. """
+        if not hasattr(self, '_genre'):
+            self._genre = None
+            if 'genre_slug' in self.kwargs:
+                genre_id = genre_ids_by_slug().get(self.kwargs['genre_slug'])
+                if genre_id is not None:
+                    self._genre = Genre.objects.filter(pk=genre_id).first()
+        return self._genre
+
+    def get(self, request, *args, **kwargs):
+        if 'genre_slug' in kwargs and self.get_genre() is None:
+            return self.redirect_to_slug()
+        return super().get(request, *args, **kwargs)
+
+    def redirect_to_slug(self):
+        """ Starší adresy s názvem žánru (např. /films/genres/dobrodružný/) se trvale přesměrují na adresu se slugem """
+        genre = Genre.objects.filter(name=self.kwargs['genre_slug']).first()
+        if genre is None:
+            raise Http404('Žánr neexistuje')
+        url = genre.get_absolute_url()
+        if self.request.GET:
+            url += '?' + self.request.GET.urlencode()
+        return HttpResponsePermanentRedirect(url)
 
     def get_queryset(self):
-        if 'genre_name' in self.kwargs:
-            return Film.objects.filter(genres__name=self.kwargs['genre_name']).all() # Get 5 books containing the title war
+        if 'genre_slug' in self.kwargs:
+            return Film.objects.for_listing().in_genre(self.get_genre())
         else:
-            return Film.objects.all()
+            return Film.objects.for_listing()
+
+    def get_film_count(self):
+        """ Počet filmů výpisu se čte z udržovaných počítadel, nikoli dotazem COUNT(*) """
+        if 'genre_slug' in self.kwargs:
+            return film_count(self.get_genre())
+        return film_count()
+
+    def get_paginator(self, queryset, per_page, **kwargs):
+        return super().get_paginator(queryset, per_page, count=self.get_film_count(), **kwargs)
+
+    def get_keyset_paginator(self, queryset, per_page):
+        return KeysetPaginator(queryset, per_page, self.keyset, count=self.get_film_count())
 
     def get_context_data(self, **kwargs):
         # Call the base implementation first to get a context
         context = super().get_context_data(**kwargs)
-        # Add in a QuerySet of all the books
-        context['num_films'] = len(self.get_queryset())
-        if 'genre_name' in self.kwargs:
-            context['view_title'] = f"Žánr: {self.kwargs['genre_name']}"
-            context['view_head'] = f"Žánr filmu: {self.kwargs['genre_name']}"
-        else:
-            context['view_title'] = 'Filmy'
-            context['view_head'] = 'Přehled filmů'
+        # Počet filmů převezme šablona z paginatoru, který ho zná z počítadel
+        context['num_films'] = context['paginator'].count
+        if 'genre_slug' in self.kwargs:
+            # Nejlépe hodnocené filmy žánru z předpočítaného žebříčku
+            context['best_films'] = Film.objects.for_listing().leaderboard(self.get_genre())[:3]
+        context['view_title'], context['view_head'] = self.get_headings()
         return context
 
+    def get_headings(self):
+        """ Titulek stránky a nadpis výpisu """
+        if 'genre_slug' in self.kwargs:
+            genre = self.get_genre()
+            return f"Žánr: {genre.name}", f"Žánr filmu: {genre.name}"
+        return 'Filmy', 'Přehled filmů'
+
+
+def film_updated_at(request, pk):
+    """ Čas poslední změny filmu - jediný dotaz podle primárního klíče, v rámci požadavku se pamatuje """
+    if not hasattr(request, '_film_updated_at'):
+        request._film_updated_at = Film.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+    return request._film_updated_at
+
+
+def user_rating(request, pk):
+    """ Hlas přihlášeného uživatele pro film jako (hodnocení, čas změny), případně None; v rámci požadavku se pamatuje """
+    if not hasattr(request, '_user_rating'):
+        request._user_rating = None
+        if request.user.is_authenticated:
+            request._user_rating = Rating.objects.filter(film=pk, user=request.user) \
+                .values_list('score', 'updated_at').first()
+    return request._user_rating
+
+
+def film_detail_etag(request, pk):
+    updated_at = film_updated_at(request, pk)
+    if updated_at is None:
+        return None
+    # stránka obsahuje i menu žánrů a ovládací prvky a hlas podle přihlášeného uživatele
+    user = request.user.pk if request.user.is_authenticated else 0
+    rating = user_rating(request, pk)
+    voted = rating[1].timestamp() if rating else 0
+    return hashlib.md5(f'{pk}:{updated_at.timestamp()}:{genre_menu_version()}:{user}:{voted}'.encode()).hexdigest()
+
+
+def film_detail_last_modified(request, pk):
+    updated_at = film_updated_at(request, pk)
+    if updated_at is None:
+        return None
+    return max(updated_at, datetime.datetime.fromtimestamp(genre_menu_version(), tz=timezone.utc))
+
+
+def patch_film_detail_cache_control(request, response):
+    """ Nepřihlášeným smí detail uložit i sdílená cache (reverse proxy) na MOVIES_DETAIL_SHARED_MAX_AGE sekund,
+        prohlížeč se vždy ptá podmíněně (ETag). Přihlášeným se stránka ve sdílené cache neukládá. """
+    if response.status_code not in (200, 304):
+        return response
+    patch_vary_headers(response, ('Cookie',))
+    if request.user.is_authenticated:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        patch_cache_control(response, public=True, max_age=0, must_revalidate=True,
+                            s_maxage=getattr(settings, 'MOVIES_DETAIL_SHARED_MAX_AGE', 60))
+    return response
+
 
+def film_detail_cache_control(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        return patch_film_detail_cache_control(request, view(request, *args, **kwargs))
+    return wrapper
+
+
+# Na opakovaný dotaz s If-None-Match / If-Modified-Since se odpoví 304 ještě před načtením filmu a vykreslením šablony
+@method_decorator([film_detail_cache_control,
+                   condition(etag_func=film_detail_etag, last_modified_func=film_detail_last_modified)],
+                  name='dispatch')
 class FilmDetailView(DetailView):
     model = Film
 
     context_object_name = 'film_detail'   # your own name for the list as a template variable
     template_name = 'film/detail.html'  # Specify your own template name/location
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # předpočítané podobné filmy (movies/similarity.py) - jeden dotaz podle indexu
+        context['similar_films'] = Film.objects.similar_to(self.object).only('id', 'title', 'rate')
+        rating = user_rating(self.request, self.object.pk)
+        context['rating_form'] = RatingForm(initial={'score': rating[0] if rating else None})
+        return context
+
+
+@login_required
+@require_POST
+def rate_film(request, pk):
+    """ Hlas přihlášeného uživatele; souhrnné hodnocení filmu se aktualizuje dávkově (movies/ratings.py) """
+    film = get_object_or_404(Film.objects.only('pk'), pk=pk)
+    form = RatingForm(request.POST)
+    if form.is_valid():
+        ratings.vote(film.pk, request.user, form.cleaned_data['score'])
+    return HttpResponseRedirect(film.get_absolute_url())
+
 
 class GenreListView(ListView):
     model = Genre
@@ -71,15 +215,51 @@ class TopTenListView(ListView):
     model = Film
     template_name = 'blocks/top_ten.html'
     context_object_name = 'films'
-    queryset = Film.objects.order_by('-rate').all()[:10]
+    queryset = Film.objects.for_listing().leaderboard()[:10]
 
 
-class NewFilmListView(ListView):
+class NewFilmListView(KeysetPaginationMixin, ListView):
     model = Film
     template_name = 'blocks/new_films.html'
     context_object_name = 'films'
-    queryset = Film.objects.order_by('release_date').all()
+    queryset = Film.objects.for_listing(plot=True).newest()
     paginate_by = 2
+    keyset = NEWEST_KEYSET
+
+
+class FilmSearchView(ListView):
+    """ Výsledky fulltextového vyhledávání filmů (parametr q) """
+    template_name = 'film/search.html'
+    context_object_name = 'films_list'
+    paginate_by = 10
+
+    def get_queryset(self):
+        return SearchResults(self.request.GET.get('q', '').strip())
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['q'] = self.object_list.query
+        context['num_films'] = context['paginator'].count
+        return context
+
+
+class FilmBrowseView(ListView):
+    """ Fasetové procházení filmů - výběr a počty filmů se počítají v paměti (movies/facets.py),
+        z databáze se načítá jen zobrazená stránka filmů """
+    template_name = 'film/browse.html'
+    context_object_name = 'films_list'
+    paginate_by = 12
+
+    def get_queryset(self):
+        self.query = facets.FacetQuery.from_querydict(self.request.GET, genre_ids_by_slug())
+        return facets.search(self.query)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['facets'] = facets.facet_choices(self.object_list, self.query)
+        context['query'] = self.query
+        context['num_films'] = context['paginator'].count
+        return context
 
 
 class FilmCreate(CreateView):